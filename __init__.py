@@ -46,50 +46,159 @@ Command Line Usage:
 __version__ = "3.0.0"
 __author__ = "Mihir Patil @ https://github.com/mihir0209"
 
-# Import main components for easy access
-try:
-    from .ai_engine import AI_engine as AIEngine
-    from .config import AI_CONFIGS, ENGINE_SETTINGS
-
-    def get_ai_engine(verbose=True):
-        """
-        Factory function to get a configured AI Engine v3.0 instance
-
-        Args:
-            verbose (bool): Enable verbose logging output
-
-        Returns:
-            AI_engine: Configured AI Engine instance with all 22 providers
-        """
-        return AIEngine(verbose=verbose)
-
-    def get_available_providers():
-        """
-        Get list of all configured providers
-
-        Returns:
-            dict: Dictionary of provider configurations
-        """
-        return AI_CONFIGS
-
-    def get_engine_settings():
-        """
-        Get current engine settings
-
-        Returns:
-            dict: Engine configuration settings
-        """
-        return ENGINE_SETTINGS
-
-    __all__ = [
-        'AIEngine',
-        'get_ai_engine',
-        'get_available_providers',
-        'get_engine_settings',
-        'AI_CONFIGS',
-        'ENGINE_SETTINGS'
-    ]
-
-except ImportError as e:
-    print(f"Warning: AI Engine v3.0 components could not be imported: {e}")
-    __all__ = []
+import atexit
+import importlib
+import logging
+from types import MappingProxyType
+
+# Library default is silent; AI_engine(verbose=True) attaches a DEBUG stream handler
+logging.getLogger("AI_engine").addHandler(logging.NullHandler())
+
+# Public names resolved on first access (PEP 562) -> (module, attribute)
+_LAZY_ATTRS = {
+    'AIEngine': ('core.ai_engine', 'AI_engine'),
+    'AI_CONFIGS': ('core.config', 'AI_CONFIGS'),
+    'ENGINE_SETTINGS': ('core.config', 'ENGINE_SETTINGS'),
+    'BatchProcessor': ('core.batch', 'BatchProcessor'),
+    'count_tokens': ('core.tokenizer', 'count_tokens'),
+}
+
+_SHARED_SESSION = None
+_AI_CONFIGS_VIEW = None
+_ENGINE_SETTINGS_VIEW = None
+
+__all__ = (
+    'AIEngine',
+    'get_ai_engine',
+    'get_ai_engine_async',
+    'get_available_providers',
+    'get_engine_settings',
+    'BatchProcessor',
+    'count_tokens',
+    'AI_CONFIGS',
+    'ENGINE_SETTINGS',
+)
+
+
+def __dir__():
+    """Public API only, including names that are still lazily unresolved"""
+    return __all__ + ('__version__',)
+
+
+def __getattr__(name):
+    """Import heavy components only when first requested, then cache them on the module"""
+    try:
+        module_name, attr = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name), attr)
+    globals()[name] = value
+    return value
+
+
+@atexit.register
+def _close_shared_session():
+    """Release the process-wide connection pool at interpreter exit"""
+    global _SHARED_SESSION
+    if _SHARED_SESSION is not None:
+        _SHARED_SESSION.close()
+        _SHARED_SESSION = None
+
+
+def _get_shared_session():
+    """Build the process-wide keep-alive session on first use"""
+    global _SHARED_SESSION
+    if _SHARED_SESSION is None:
+        from core.ai_engine import build_http_session
+        _SHARED_SESSION = build_http_session(__getattr__('ENGINE_SETTINGS'))
+    return _SHARED_SESSION
+
+
+def get_ai_engine(verbose=True, prewarm=True):
+    """
+    Factory function to get a configured AI Engine v3.0 instance
+
+    Every engine returned here shares one process-wide requests.Session, so
+    TCP/TLS connections to providers are reused across engines. Pool sizes
+    come from ENGINE_SETTINGS["http_pool"]; the shared pool is closed at exit.
+
+    Example:
+        with get_ai_engine(verbose=False) as engine:
+            result = engine.chat_completion([{"role": "user", "content": "Hello!"}])
+
+            # Or print tokens as they arrive instead of waiting for the full reply
+            for text in engine.stream_chat_completion([{"role": "user", "content": "Hello!"}]):
+                print(text, end="", flush=True)
+
+    Args:
+        verbose (bool): Enable verbose logging output
+        prewarm (bool): Open provider connections in the background so the first
+            request skips the TLS handshake; only matters for long-lived processes
+
+    Returns:
+        AI_engine: Configured AI Engine instance with all 22 providers
+    """
+    return __getattr__('AIEngine')(verbose=verbose, session=_get_shared_session(), prewarm=prewarm)
+
+
+async def get_ai_engine_async(verbose=True, prewarm=True):
+    """
+    Async factory for use inside a running event loop
+
+    Engine construction reads statistics and config from disk, so it is
+    done in a worker thread to avoid blocking the loop.
+
+    Args:
+        verbose (bool): Enable verbose logging output
+        prewarm (bool): See get_ai_engine
+
+    Returns:
+        AI_engine: Configured AI Engine instance exposing chat_completion_async
+    """
+    import asyncio
+    return await asyncio.to_thread(get_ai_engine, verbose, prewarm)
+
+
+def get_available_providers(copy=False, frozen=False):
+    """
+    Get list of all configured providers
+
+    Args:
+        copy (bool): Return a mutable shallow copy instead of the read-only view
+        frozen (bool): Return a point-in-time snapshot of FrozenProviderConfig records
+
+    Returns:
+        Mapping: Read-only mapping of provider configurations (dict if copy=True)
+    """
+    global _AI_CONFIGS_VIEW
+    if frozen:
+        from core.config import freeze_provider_configs
+        return freeze_provider_configs()
+    if _AI_CONFIGS_VIEW is None:
+        # Live view, built once; it reflects runtime config merges
+        _AI_CONFIGS_VIEW = MappingProxyType(__getattr__('AI_CONFIGS'))
+    if copy:
+        return dict(_AI_CONFIGS_VIEW)
+    return _AI_CONFIGS_VIEW
+
+
+def get_engine_settings(copy=False, frozen=False):
+    """
+    Get current engine settings
+
+    Args:
+        copy (bool): Return a mutable shallow copy instead of the read-only view
+        frozen (bool): Return a point-in-time FrozenEngineSettings snapshot
+
+    Returns:
+        Mapping: Read-only mapping of engine settings (dict if copy=True)
+    """
+    global _ENGINE_SETTINGS_VIEW
+    if frozen:
+        from core.config import freeze_engine_settings
+        return freeze_engine_settings()
+    if _ENGINE_SETTINGS_VIEW is None:
+        _ENGINE_SETTINGS_VIEW = MappingProxyType(__getattr__('ENGINE_SETTINGS'))
+    if copy:
+        return dict(_ENGINE_SETTINGS_VIEW)
+    return _ENGINE_SETTINGS_VIEW
@@ -932,7 +932,7 @@ async def get_status():
         available_count = len(available_providers)
 
         # Get flagged providers (have keys but are failing)
-        flagged_providers = getattr(engine, 'flagged_keys', {})
+        flagged_providers = engine.get_flagged_providers()
         flagged_count = len(flagged_providers)
 
         # Build provider lists (show all, not limited)
@@ -1,21 +1,154 @@
 """
 Database models and operations for chat functionality
 """
+import os
 import sqlite3
-import json
 import logging
-from typing import List, Optional, Dict
+import re
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from core import fast_json
+from core.tokenizer import count_tokens
+
+try:
+    import msgpack
+except ImportError:  # optional: binary metadata storage
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 
+# Per-connection compiled-statement cache. It only hits when the SQL text repeats exactly,
+# so hot-path queries here are constant strings with every varying value bound as a parameter.
+# One-shot admin queries (stats, cleanup) run on short-lived connections and leave this cache alone.
+_STATEMENT_CACHE_SIZE = 512
+
+# Entries kept in each in-process result cache (get_chat, get_context_messages)
+_RESULT_CACHE_SIZE = 256
+
+# Connection-scoped tuning applied to every connection; WAL itself is persistent and set in init_db()
+_CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",  # safe under WAL: commits append to the log without an fsync each
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",  # ~20 MB page cache
+    "PRAGMA mmap_size = 268435456",
+)
+
+# Chat listing reads the trigger-maintained message_count / last_message_id columns.
+# Kept as two fixed statements so each gets its own plan and cached prepared statement.
+_CHAT_LIST_SQL = """
+    SELECT c.*, m.content AS last_message
+    FROM chats c
+    LEFT JOIN messages m ON m.id = c.last_message_id
+    {where}
+    ORDER BY c.updated_at DESC, c.id DESC
+    LIMIT ?
+"""
+_LIST_ALL_CHATS_SQL = _CHAT_LIST_SQL.format(where="")
+_LIST_PERMANENT_CHATS_SQL = _CHAT_LIST_SQL.format(where="WHERE c.is_temporary = 0")
+
+# FTS5 message search, best BM25 match first; one fixed statement per chat filter shape.
+_FTS_SEARCH_SQL = """
+    SELECT m.*, c.title as chat_title FROM messages_fts f
+    JOIN messages m ON m.id = f.rowid
+    JOIN chats c ON m.chat_id = c.id
+    WHERE messages_fts MATCH ? {where}
+    ORDER BY bm25(messages_fts) LIMIT ?
+"""
+_FTS_SEARCH_ALL_SQL = _FTS_SEARCH_SQL.format(where="")
+_FTS_SEARCH_CHAT_SQL = _FTS_SEARCH_SQL.format(where="AND m.chat_id = ?")
+
+_INSERT_MESSAGE_SQL = """
+    INSERT INTO messages (chat_id, role, content, metadata, tokens, response_to)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Text layout of CURRENT_TIMESTAMP (UTC), used when binding timestamps computed in Python
+_SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# update_chat: one fixed statement for any subset of fields. Each column takes a (set?, value)
+# pair, so unset columns keep their value while an explicit None still clears a column.
+_UPDATABLE_CHAT_FIELDS = ('title', 'model', 'provider', 'system_prompt', 'context_mode', 'summary', 'force_provider')
+_UPDATE_CHAT_SQL = (
+    "UPDATE chats SET "
+    + ", ".join(f"{field} = CASE WHEN ? THEN ? ELSE {field} END" for field in _UPDATABLE_CHAT_FIELDS)
+    + ", updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+)
+
+# Word runs as the FTS5 unicode61 tokenizer sees them; each becomes a quoted prefix term
+_FTS_TERM = re.compile(r"\w+")
+
+
+def _fts_query(query: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression, or None if it has no searchable terms"""
+    terms = _FTS_TERM.findall(query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _decode_metadata(raw: Union[str, bytes, None]) -> Dict:
+    """Decode stored metadata: JSON text, or a msgpack BLOB written with binary_metadata"""
+    if not raw:
+        return {}
+    try:
+        if isinstance(raw, bytes):
+            return msgpack.unpackb(raw, raw=False) if msgpack is not None else {}
+        return fast_json.loads(raw)
+    except ValueError:  # covers JSONDecodeError and msgpack's unpack errors
+        return {}
+
+
+def _fetch_dicts(conn: sqlite3.Connection, sql: str, params=()) -> List[Dict]:
+    """Run a read and build each row's dict in one pass from plain tuples.
+
+    Skips the sqlite3.Row object the connection would otherwise create per row before dict() copies it.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(sql, params).fetchall()
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _decode_messages(messages: List[Dict], parse_metadata: bool = True) -> List[Dict]:
+    """Decode metadata in place; it stays as stored unless parse_metadata"""
+    if parse_metadata:
+        for msg in messages:
+            msg['metadata'] = _decode_metadata(msg['metadata'])
+    return messages
+
+
 class ChatDB:
-    def __init__(self, db_path: str = "chat_data.db"):
-        self.db_path = db_path
+    def __init__(self, db_path: Optional[str] = None, binary_metadata: bool = False):
+        if binary_metadata and msgpack is None:
+            raise ImportError('binary_metadata requires msgpack: pip install "ai-synapse[fast]"')
+        self.db_path = db_path or os.getenv("CHAT_DB_PATH", "chat_data.db")
+        # New metadata is written as msgpack BLOBs when set; existing JSON rows stay readable either way
+        self.binary_metadata = binary_metadata
+        # One long-lived connection per thread (see _conn); all are closed by close()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.fts_enabled = False
+        # LRU result caches; chat rows and chat listings are dropped by this ChatDB's writes, and
+        # context entries are checked against the chat's (last_message_id, message_count) before reuse
+        self._chat_cache: "OrderedDict[int, Dict]" = OrderedDict()
+        self._chat_list_cache: "OrderedDict[Tuple[bool, int], List[Dict]]" = OrderedDict()
+        self._context_cache: "OrderedDict[Tuple[int, int], Tuple[Tuple, List[Dict]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
         self.init_db()
 
     def init_db(self):
         """Initialize database with required tables"""
         with sqlite3.connect(self.db_path) as conn:
+            # WAL lets readers run alongside the writer and turns each commit into a log append
+            conn.execute("PRAGMA journal_mode = WAL")
             conn.execute("PRAGMA foreign_keys = ON")
 
             # Create chats table
@@ -78,59 +211,215 @@ class ChatDB:
                 conn.execute("ALTER TABLE messages ADD COLUMN is_active BOOLEAN DEFAULT 1")
                 logger.info("Added branching columns to messages table")
 
+            # Denormalized per-chat message stats, kept in step by the triggers below (migration)
+            try:
+                conn.execute("SELECT message_count, last_message_id FROM chats LIMIT 1")
+            except sqlite3.OperationalError:
+                conn.execute("ALTER TABLE chats ADD COLUMN last_message_id INTEGER")
+                conn.execute("ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+                conn.execute("""
+                    UPDATE chats SET
+                        message_count = (SELECT COUNT(*) FROM messages WHERE chat_id = chats.id),
+                        last_message_id = (SELECT MAX(id) FROM messages WHERE chat_id = chats.id)
+                """)
+                logger.info("Added message_count/last_message_id columns to chats table")
+
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chats_msg_ai AFTER INSERT ON messages BEGIN
+                    UPDATE chats
+                    SET last_message_id = new.id, message_count = message_count + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = new.chat_id;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS chats_msg_ad AFTER DELETE ON messages BEGIN
+                    UPDATE chats
+                    SET message_count = message_count - 1,
+                        last_message_id = CASE WHEN last_message_id = old.id
+                            THEN (SELECT MAX(id) FROM messages WHERE chat_id = old.chat_id)
+                            ELSE last_message_id END
+                    WHERE id = old.chat_id;
+                END
+            """)
+
+            # Store the ~4 characters per token estimate on rows saved before tokens were counted,
+            # so context budgeting can read tokens from an index alone (one-time, tracked by user_version)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                conn.execute("UPDATE messages SET tokens = length(content) / 4 WHERE tokens IS NULL OR tokens = 0")
+                conn.execute("PRAGMA user_version = 1")
+
             # Create indexes for performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages(chat_id, created_at)")
+            # Messages are listed in id order (monotonic, unlike second-resolution created_at); tokens
+            # rides along so get_context_messages can walk a chat newest-first from the index alone
+            for superseded in ("idx_messages_chat_created", "idx_messages_chat_id", "idx_messages_ctx",
+                               "idx_messages_role"):
+                conn.execute(f"DROP INDEX IF EXISTS {superseded}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_tokens ON messages(chat_id, id, tokens)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_branch ON messages(chat_id, branch_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_updated ON chats(updated_at DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_temp_updated ON chats(is_temporary, updated_at DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_temp_created ON chats(created_at) WHERE is_temporary = 1")
+
+            self.fts_enabled = self._init_fts(conn)
+
+            # Give the planner statistics for the indexes above; later drift is handled by optimize()
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            ).fetchone():
+                conn.execute("ANALYZE")
 
             conn.commit()
             logger.info("Chat database initialized")
 
-    def get_connection(self):
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
+    @staticmethod
+    def _init_fts(conn: sqlite3.Connection) -> bool:
+        """Create the FTS5 index over message content; returns False if this SQLite lacks FTS5"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content, content='messages', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, message search will scan with LIKE: {e}")
+            return False
+
+        # Keep the external-content index in step with messages
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+
+        if not exists:
+            # Index messages written before the FTS table existed
+            conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+            logger.info("Built full-text index for existing messages")
+        return True
+
+    def _encode_metadata(self, metadata: Optional[Dict]) -> Union[str, bytes]:
+        """Encode metadata for the messages.metadata column"""
+        if self.binary_metadata:
+            return msgpack.packb(metadata or {}, use_bin_type=True)
+        return fast_json.dumps(metadata or {})
+
+    def get_connection(self, check_same_thread: bool = True):
+        """Get a new database connection with row factory; the caller owns and closes it"""
+        conn = sqlite3.connect(self.db_path, cached_statements=_STATEMENT_CACHE_SIZE,
+                               check_same_thread=check_same_thread)
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
 
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's long-lived connection, so repeated queries reuse its prepared statements"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only this thread queries it; close() may run elsewhere, hence check_same_thread=False
+            conn = self._local.conn = self.get_connection(check_same_thread=False)
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Close every connection opened by this ChatDB"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                # Recommended before closing: refreshes statistics the connection's queries relied on
+                conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.debug(f"PRAGMA optimize skipped on close: {e}")
+            conn.close()
+        self._local = threading.local()
+
+    def optimize(self):
+        """Run PRAGMA optimize so planner statistics keep up with growth; cheap when nothing changed"""
+        with closing(self.get_connection()) as conn:
+            conn.execute("PRAGMA optimize")
+
+    def _cache_get(self, cache: OrderedDict, key):
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, cache: OrderedDict, key, value):
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > _RESULT_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    def _invalidate_chat(self, chat_id: Optional[int] = None):
+        """Drop a cached chat row, or every cached chat when chat_id is None, and all chat listings"""
+        with self._cache_lock:
+            self._chat_list_cache.clear()
+            if chat_id is None:
+                self._chat_cache.clear()
+            else:
+                self._chat_cache.pop(chat_id, None)
+
     def create_chat(self, title: str, model: str = None, provider: str = None,
                    system_prompt: str = None, is_temporary: bool = False, force_provider: bool = False,
                    temporary_timer_minutes: int = 5) -> int:
         """Create a new chat and return chat ID"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             cursor = conn.execute("""
                 INSERT INTO chats (title, model, provider, system_prompt, is_temporary, force_provider, temporary_timer_minutes, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
             """, (title, model, provider, system_prompt, is_temporary, force_provider, temporary_timer_minutes))
             chat_id = cursor.lastrowid
             conn.commit()
-            logger.info(f"Created chat {chat_id}: {title} (temporary: {is_temporary}, timer: {temporary_timer_minutes} min)")
-            return chat_id
+        self._invalidate_chat(chat_id)
+        logger.info(f"Created chat {chat_id}: {title} (temporary: {is_temporary}, timer: {temporary_timer_minutes} min)")
+        return chat_id
 
     def get_chat(self, chat_id: int) -> Optional[Dict]:
         """Get chat by ID"""
-        with self.get_connection() as conn:
-            row = conn.execute("SELECT * FROM chats WHERE id = ?", (chat_id,)).fetchone()
-            return dict(row) if row else None
+        cached = self._cache_get(self._chat_cache, chat_id)
+        if cached is not None:
+            return dict(cached)
+        with self._conn() as conn:
+            rows = _fetch_dicts(conn, "SELECT * FROM chats WHERE id = ?", (chat_id,))
+        if not rows:
+            return None
+        self._cache_put(self._chat_cache, chat_id, rows[0])
+        return dict(rows[0])
 
     def get_chats(self, include_temporary: bool = False, limit: int = 50) -> List[Dict]:
         """Get list of chats"""
-        with self.get_connection() as conn:
-            query = """
-                SELECT c.*,
-                       (SELECT content FROM messages WHERE chat_id = c.id ORDER BY created_at DESC LIMIT 1) as last_message,
-                       (SELECT COUNT(*) FROM messages WHERE chat_id = c.id) as message_count
-                FROM chats c
-                WHERE (? OR is_temporary = 0)
-                ORDER BY updated_at DESC
-                LIMIT ?
-            """
-            rows = conn.execute(query, (include_temporary, limit)).fetchall()
-            return [dict(row) for row in rows]
+        key = (bool(include_temporary), limit)
+        cached = self._cache_get(self._chat_list_cache, key)
+        if cached is not None:
+            return [dict(chat) for chat in cached]
+        query = _LIST_ALL_CHATS_SQL if include_temporary else _LIST_PERMANENT_CHATS_SQL
+        with self._conn() as conn:
+            chats = _fetch_dicts(conn, query, (limit,))
+        self._cache_put(self._chat_list_cache, key, chats)
+        return [dict(chat) for chat in chats]
 
     def get_expired_temporary_chats(self) -> List[Dict]:
         """Get temporary chats that have exceeded their timer"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             query = """
                 SELECT id, title, created_at, temporary_timer_minutes
                 FROM chats
@@ -138,32 +427,33 @@ class ChatDB:
                 AND datetime(created_at, '+' || temporary_timer_minutes || ' minutes') < datetime('now')
                 ORDER BY created_at ASC
             """
-            rows = conn.execute(query).fetchall()
-            return [dict(row) for row in rows]
+            return _fetch_dicts(conn, query)
 
     def add_message(self, chat_id: int, role: str, content: str,
                    metadata: Dict = None, tokens: int = 0, response_to: int = None) -> int:
         """Add message to chat"""
         if metadata is None:
             metadata = {}
+        if not tokens:
+            # Stored once so context budgeting never re-tokenizes history
+            tokens = count_tokens(content)
 
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             # First check if the chat exists
             chat_check = conn.execute("SELECT id FROM chats WHERE id = ?", (chat_id,)).fetchone()
             if not chat_check:
                 raise ValueError(f"Chat {chat_id} does not exist")
 
             try:
-                cursor = conn.execute("""
-                    INSERT INTO messages (chat_id, role, content, metadata, tokens, response_to)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (chat_id, role, content, json.dumps(metadata), tokens, response_to))
+                cursor = conn.execute(
+                    _INSERT_MESSAGE_SQL,
+                    (chat_id, role, content, self._encode_metadata(metadata), tokens, response_to)
+                )
 
                 message_id = cursor.lastrowid
-
-                # Update chat timestamp
-                conn.execute("UPDATE chats SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (chat_id,))
+                # chats.updated_at / last_message_id / message_count are updated by the chats_msg_ai trigger
                 conn.commit()
+                self._invalidate_chat(chat_id)
 
                 logger.debug(f"Added message {message_id} to chat {chat_id}: {role}")
                 return message_id
@@ -172,151 +462,208 @@ class ChatDB:
                     raise ValueError(f"Chat {chat_id} was deleted while adding message")
                 raise
 
-    def get_messages(self, chat_id: int, limit: int = 100, after_id: int = None) -> List[Dict]:
-        """Get messages for a chat"""
-        with self.get_connection() as conn:
+    def add_messages(self, chat_id: int, rows: Iterable[Tuple]) -> int:
+        """Add several messages in one commit; rows are (role, content, metadata, tokens, response_to).
+
+        Returns the number of messages inserted.
+        """
+        with self._conn() as conn:
+            if not conn.execute("SELECT id FROM chats WHERE id = ?", (chat_id,)).fetchone():
+                raise ValueError(f"Chat {chat_id} does not exist")
+
+            try:
+                cursor = conn.executemany(_INSERT_MESSAGE_SQL, self._message_params(chat_id, rows))
+                inserted = cursor.rowcount
+                conn.commit()
+                self._invalidate_chat(chat_id)
+
+                logger.debug(f"Added {inserted} messages to chat {chat_id}")
+                return inserted
+            except sqlite3.IntegrityError as e:
+                if "FOREIGN KEY constraint failed" in str(e):
+                    raise ValueError(f"Chat {chat_id} was deleted while adding messages")
+                raise
+
+    def add_messages_returning(self, chat_id: int, rows: Iterable[Tuple]) -> List[int]:
+        """Like add_messages, but returns the new message IDs in row order"""
+        with self._conn() as conn:
+            if not conn.execute("SELECT id FROM chats WHERE id = ?", (chat_id,)).fetchone():
+                raise ValueError(f"Chat {chat_id} does not exist")
+
+            try:
+                # Still a single commit; lastrowid gives each ID without a RETURNING (SQLite 3.35+) dependency
+                ids = [conn.execute(_INSERT_MESSAGE_SQL, params).lastrowid
+                       for params in self._message_params(chat_id, rows)]
+                conn.commit()
+                self._invalidate_chat(chat_id)
+                return ids
+            except sqlite3.IntegrityError as e:
+                if "FOREIGN KEY constraint failed" in str(e):
+                    raise ValueError(f"Chat {chat_id} was deleted while adding messages")
+                raise
+
+    def _message_params(self, chat_id: int, rows: Iterable[Tuple]) -> Iterable[Tuple]:
+        """Insert parameters for (role, content, metadata, tokens, response_to) rows"""
+        for role, content, metadata, tokens, response_to in rows:
+            yield (chat_id, role, content, self._encode_metadata(metadata),
+                   tokens or count_tokens(content), response_to)
+
+    def get_messages(self, chat_id: int, limit: int = 100, after_id: int = None,
+                     parse_metadata: bool = True) -> List[Dict]:
+        """Get messages for a chat; pass parse_metadata=False to skip decoding metadata"""
+        with self._conn() as conn:
             if after_id:
                 query = """
                     SELECT * FROM messages
                     WHERE chat_id = ? AND id > ?
-                    ORDER BY created_at ASC
+                    ORDER BY id ASC
                     LIMIT ?"""
-                rows = conn.execute(query, (chat_id, after_id, limit)).fetchall()
+                rows = _fetch_dicts(conn, query, (chat_id, after_id, limit))
             else:
                 query = """
                     SELECT * FROM messages
                     WHERE chat_id = ?
-                    ORDER BY created_at ASC
+                    ORDER BY id ASC
                     LIMIT ?"""
-                rows = conn.execute(query, (chat_id, limit)).fetchall()
+                rows = _fetch_dicts(conn, query, (chat_id, limit))
 
-            messages = []
-            for row in rows:
-                msg = dict(row)
-                try:
-                    msg['metadata'] = json.loads(msg['metadata']) if msg['metadata'] else {}
-                except json.JSONDecodeError:
-                    msg['metadata'] = {}
-                messages.append(msg)
-
-            return messages
+            return _decode_messages(rows, parse_metadata)
 
     def edit_message(self, message_id: int, content: str) -> bool:
         """Edit a message's content"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             cursor = conn.execute(
                 "UPDATE messages SET content = ? WHERE id = ?",
                 (content, message_id)
             )
             conn.commit()
-            return cursor.rowcount > 0
+        # Edits leave the context cache's version key unchanged, so drop it outright; listings
+        # carry each chat's last message text
+        with self._cache_lock:
+            self._context_cache.clear()
+            self._chat_list_cache.clear()
+        return cursor.rowcount > 0
 
     def get_message(self, message_id: int) -> Optional[Dict]:
         """Get a single message by ID"""
-        with self.get_connection() as conn:
-            row = conn.execute("SELECT * FROM messages WHERE id = ?", (message_id,)).fetchone()
-            if row:
-                msg = dict(row)
-                try:
-                    msg['metadata'] = json.loads(msg['metadata']) if msg['metadata'] else {}
-                except json.JSONDecodeError:
-                    msg['metadata'] = {}
-                return msg
-            return None
+        with self._conn() as conn:
+            rows = _fetch_dicts(conn, "SELECT * FROM messages WHERE id = ?", (message_id,))
+            return _decode_messages(rows)[0] if rows else None
 
     def delete_messages_after(self, chat_id: int, message_id: int) -> int:
         """Delete all messages after a given message ID (for regeneration)"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             cursor = conn.execute(
                 "DELETE FROM messages WHERE chat_id = ? AND id > ?",
                 (chat_id, message_id)
             )
             conn.commit()
-            return cursor.rowcount
+        self._invalidate_chat(chat_id)
+        return cursor.rowcount
 
     def search_messages(self, query: str, chat_id: int = None, limit: int = 50) -> List[Dict]:
-        """Search messages by content"""
+        """Search messages by content, best BM25 match first when FTS5 is available"""
+        match = _fts_query(query) if self.fts_enabled else None
+
+        with self._conn() as conn:
+            if match is not None and chat_id is not None:
+                rows = _fetch_dicts(conn, _FTS_SEARCH_CHAT_SQL, (match, chat_id, limit))
+            elif match is not None:
+                rows = _fetch_dicts(conn, _FTS_SEARCH_ALL_SQL, (match, limit))
+            else:
+                rows = self._search_messages_like(conn, query, chat_id, limit)
+
+            return _decode_messages(rows)
+
+    @staticmethod
+    def _search_messages_like(conn: sqlite3.Connection, query: str, chat_id: Optional[int], limit: int) -> List[Dict]:
+        """Substring scan used without FTS5 or for queries with no word characters"""
         # Security: escape LIKE special characters
         safe_query = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
-        with self.get_connection() as conn:
-            if chat_id:
-                sql = """
-                    SELECT m.*, c.title as chat_title FROM messages m
-                    JOIN chats c ON m.chat_id = c.id
-                    WHERE m.chat_id = ? AND m.content LIKE ? ESCAPE '\\'
-                    ORDER BY m.created_at DESC LIMIT ?
-                """
-                rows = conn.execute(sql, (chat_id, f"%{safe_query}%", limit)).fetchall()
-            else:
-                sql = """
-                    SELECT m.*, c.title as chat_title FROM messages m
-                    JOIN chats c ON m.chat_id = c.id
-                    WHERE m.content LIKE ? ESCAPE '\\'
-                    ORDER BY m.created_at DESC LIMIT ?
-                """
-                rows = conn.execute(sql, (f"%{safe_query}%", limit)).fetchall()
-
-            messages = []
-            for row in rows:
-                msg = dict(row)
-                try:
-                    msg['metadata'] = json.loads(msg['metadata']) if msg['metadata'] else {}
-                except json.JSONDecodeError:
-                    msg['metadata'] = {}
-                messages.append(msg)
-            return messages
+        if chat_id:
+            sql = """
+                SELECT m.*, c.title as chat_title FROM messages m
+                JOIN chats c ON m.chat_id = c.id
+                WHERE m.chat_id = ? AND m.content LIKE ? ESCAPE '\\'
+                ORDER BY m.id DESC LIMIT ?
+            """
+            return _fetch_dicts(conn, sql, (chat_id, f"%{safe_query}%", limit))
+        sql = """
+            SELECT m.*, c.title as chat_title FROM messages m
+            JOIN chats c ON m.chat_id = c.id
+            WHERE m.content LIKE ? ESCAPE '\\'
+            ORDER BY m.id DESC LIMIT ?
+        """
+        return _fetch_dicts(conn, sql, (f"%{safe_query}%", limit))
 
     def get_context_messages(self, chat_id: int, max_tokens: int = 4000) -> List[Dict]:
-        """Get messages for context with token budgeting"""
-        messages = self.get_messages(chat_id)
-
-        # Simple token budgeting - include newest messages that fit
-        context_messages = []
-        total_tokens = 0
-
-        # Add messages in reverse order (newest first) until token limit
-        for msg in reversed(messages):
-            msg_tokens = msg['tokens'] or len(msg['content']) // 4  # Rough estimate
-            if total_tokens + msg_tokens <= max_tokens:
-                context_messages.append(msg)
-                total_tokens += msg_tokens
-            else:
-                break
-
-        # Reverse to restore chronological order (O(1) per element)
-        context_messages.reverse()
-
-        return context_messages
+        """Get messages for context with token budgeting; metadata is left undecoded"""
+        with self._conn() as conn:
+            version = conn.execute(
+                "SELECT last_message_id, message_count FROM chats WHERE id = ?", (chat_id,)
+            ).fetchone()
+            version = tuple(version) if version else None
+            cached = self._cache_get(self._context_cache, (chat_id, max_tokens))
+            if cached is not None and cached[0] == version:
+                return [dict(m) for m in cached[1]]
+
+            # Walk newest-first and stop at the first message that does not fit;
+            # older history is never read
+            newest_id = oldest_id = None
+            total_tokens = 0
+            with closing(self._iter_message_tokens_reverse(conn, chat_id)) as scan:
+                for msg_id, tokens in scan:
+                    if total_tokens + tokens > max_tokens:
+                        break
+                    total_tokens += tokens
+                    newest_id = newest_id or msg_id
+                    oldest_id = msg_id
+
+            rows = []
+            if oldest_id is not None:
+                rows = _fetch_dicts(conn, """
+                    SELECT * FROM messages
+                    WHERE chat_id = ? AND id BETWEEN ? AND ?
+                    ORDER BY id ASC
+                """, (chat_id, oldest_id, newest_id))
+        messages = _decode_messages(rows, parse_metadata=False)
+        self._cache_put(self._context_cache, (chat_id, max_tokens), (version, messages))
+        return [dict(m) for m in messages]
+
+    @staticmethod
+    def _iter_message_tokens_reverse(conn: sqlite3.Connection, chat_id: int) -> Iterable[Tuple[int, int]]:
+        """Yield (id, tokens) newest first, stepping the index scan lazily"""
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        try:
+            for msg_id, tokens in cursor.execute(
+                "SELECT id, tokens FROM messages WHERE chat_id = ? ORDER BY id DESC", (chat_id,)
+            ):
+                yield msg_id, tokens or 0
+        finally:
+            # Abandons the rest of the scan when the caller stops early
+            cursor.close()
 
     def update_chat(self, chat_id: int, **kwargs) -> bool:
         """Update chat properties"""
-        if not kwargs:
+        if not any(key in kwargs for key in _UPDATABLE_CHAT_FIELDS):
             return False
 
-        # Build dynamic update query
-        fields = []
-        values = []
-        for key, value in kwargs.items():
-            if key in ['title', 'model', 'provider', 'system_prompt', 'context_mode', 'summary', 'force_provider']:
-                fields.append(f"{key} = ?")
-                values.append(value)
-
-        if not fields:
-            return False
+        params = []
+        for field in _UPDATABLE_CHAT_FIELDS:
+            params.extend((field in kwargs, kwargs.get(field)))
+        params.append(chat_id)
 
-        fields.append("updated_at = CURRENT_TIMESTAMP")
-        values.append(chat_id)
-
-        with self.get_connection() as conn:
-            query = f"UPDATE chats SET {', '.join(fields)} WHERE id = ?"
-            conn.execute(query, values)
+        with self._conn() as conn:
+            conn.execute(_UPDATE_CHAT_SQL, params)
             conn.commit()
-            return True
+        self._invalidate_chat(chat_id)
+        return True
 
     def convert_chat_to_permanent(self, chat_id: int, new_title: str = None) -> bool:
         """Convert a temporary chat to permanent"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             # First check if the chat exists and is temporary
             result = conn.execute("SELECT is_temporary, title FROM chats WHERE id = ?", (chat_id,)).fetchone()
             if not result:
@@ -334,53 +681,65 @@ class ChatDB:
                 WHERE id = ?
             """, (title_to_use, chat_id))
             conn.commit()
+            self._invalidate_chat(chat_id)
             logger.info(f"Converted temporary chat {chat_id} to permanent with title: {title_to_use}")
             return True
 
     def delete_chat(self, chat_id: int) -> bool:
         """Delete chat and all its messages"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             cursor = conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
             deleted = cursor.rowcount > 0
             conn.commit()
+            self._invalidate_chat(chat_id)
             if deleted:
                 logger.info(f"Deleted chat {chat_id}")
             return deleted
 
-    def cleanup_temporary_chats(self, max_age_hours: int = 24):
+    def cleanup_temporary_chats(self, max_age_hours: float = 24):
         """Clean up old temporary chats"""
-        with self.get_connection() as conn:
+        with closing(self.get_connection()) as conn:
+            # Plain range on the idx_chats_temp_created partial index; the cutoff uses
+            # CURRENT_TIMESTAMP's UTC text format, which sorts chronologically
+            cutoff = datetime.now(timezone.utc) - timedelta(hours=float(max_age_hours))
             cursor = conn.execute("""
                 DELETE FROM chats
                 WHERE is_temporary = 1
-                AND created_at < datetime('now', '-' || ? || ' hours')
-            """, (str(max_age_hours),))
+                AND created_at < ?
+            """, (cutoff.strftime(_SQLITE_TIMESTAMP_FORMAT),))
             deleted = cursor.rowcount
             conn.commit()
             if deleted > 0:
+                self._invalidate_chat()
                 logger.info(f"Cleaned up {deleted} temporary chats")
             return deleted
 
     def get_chat_stats(self) -> Dict:
         """Get database statistics"""
-        with self.get_connection() as conn:
-            stats = {}
-
-            # Chat counts
-            stats['total_chats'] = conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
-            stats['permanent_chats'] = conn.execute("SELECT COUNT(*) FROM chats WHERE is_temporary = 0").fetchone()[0]
-            stats['temporary_chats'] = conn.execute("SELECT COUNT(*) FROM chats WHERE is_temporary = 1").fetchone()[0]
-
-            # Message counts
-            stats['total_messages'] = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
-            stats['user_messages'] = conn.execute("SELECT COUNT(*) FROM messages WHERE role = 'user'").fetchone()[0]
-            stats['assistant_messages'] = conn.execute("SELECT COUNT(*) FROM messages WHERE role = 'assistant'").fetchone()[0]
+        with closing(self.get_connection()) as conn:
+            # One pass per table; COALESCE covers SUM() over an empty table
+            chats = conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(is_temporary = 0), 0), COALESCE(SUM(is_temporary = 1), 0)
+                FROM chats
+            """).fetchone()
+            # Stats are an occasional read; a table scan beats taxing every insert with a role index
+            messages = conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(role = 'user'), 0), COALESCE(SUM(role = 'assistant'), 0)
+                FROM messages
+            """).fetchone()
 
-            return stats
+            return {
+                'total_chats': chats[0],
+                'permanent_chats': chats[1],
+                'temporary_chats': chats[2],
+                'total_messages': messages[0],
+                'user_messages': messages[1],
+                'assistant_messages': messages[2],
+            }
 
     def get_max_branch_id(self, chat_id: int) -> int:
         """Get the maximum branch_id for a chat"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             result = conn.execute(
                 "SELECT COALESCE(MAX(branch_id), 0) FROM messages WHERE chat_id = ?",
                 (chat_id,)
@@ -389,7 +748,7 @@ class ChatDB:
 
     def create_branch(self, chat_id: int, from_message_id: int) -> int:
         """Create a new branch from a specific message, returns new branch_id"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             # Get current max branch_id
             max_branch = self.get_max_branch_id(chat_id)
             new_branch_id = max_branch + 1
@@ -410,32 +769,24 @@ class ChatDB:
             """, (new_branch_id, chat_id, from_message_id))
 
             conn.commit()
+            self._invalidate_chat(chat_id)
             logger.info(f"Created branch {new_branch_id} from message {from_message_id} in chat {chat_id}")
             return new_branch_id
 
     def get_branch_messages(self, chat_id: int, branch_id: int, limit: int = 100) -> List[Dict]:
         """Get messages for a specific branch"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             query = """
                 SELECT * FROM messages
                 WHERE chat_id = ? AND branch_id = ? AND is_active = 1
-                ORDER BY created_at ASC
+                ORDER BY id ASC
                 LIMIT ?
             """
-            rows = conn.execute(query, (chat_id, branch_id, limit)).fetchall()
-            messages = []
-            for row in rows:
-                msg = dict(row)
-                try:
-                    msg['metadata'] = json.loads(msg['metadata']) if msg['metadata'] else {}
-                except json.JSONDecodeError:
-                    msg['metadata'] = {}
-                messages.append(msg)
-            return messages
+            return _decode_messages(_fetch_dicts(conn, query, (chat_id, branch_id, limit)))
 
     def switch_branch(self, chat_id: int, branch_id: int) -> bool:
         """Switch active branch (deactivate old branch messages, activate new branch)"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             # Deactivate all messages in this chat
             conn.execute("UPDATE messages SET is_active = 0 WHERE chat_id = ?", (chat_id,))
 
@@ -450,7 +801,7 @@ class ChatDB:
 
     def get_branches(self, chat_id: int) -> List[Dict]:
         """Get all branches for a chat"""
-        with self.get_connection() as conn:
+        with self._conn() as conn:
             rows = conn.execute("""
                 SELECT branch_id, COUNT(*) as message_count,
                        MIN(created_at) as created_at
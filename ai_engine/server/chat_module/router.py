@@ -3,7 +3,6 @@ FastAPI router for chat functionality
 """
 import asyncio
 import base64
-import json
 import logging
 import time
 import hashlib
@@ -16,10 +15,25 @@ from pydantic import BaseModel, Field
 
 from .db import ChatDB
 from .websocket_manager import WebSocketManager
+from core import fast_json
 from core.config import verbose_print
 
 logger = logging.getLogger(__name__)
 
+# Constant WebSocket frames, encoded once
+_PONG_FRAME = fast_json.dumps({"type": "pong"})
+_FINAL_CHUNK_FRAME = fast_json.dumps({"type": "ai_chunk", "content": "", "is_final": True})
+_AUTO_THINKING_FRAME = fast_json.dumps({"type": "ai_thinking", "provider": None, "model": None})
+_KEEPALIVE_FRAME = fast_json.dumps({"type": "ai_typing_keepalive"})
+
+# WebSocket responses: typing keepalive cadence and overall budget for the AI call (seconds)
+_KEEPALIVE_INTERVAL = 5
+_AI_RESPONSE_TIMEOUT = 300
+
+# Completed responses are replayed to the client in about this many ai_chunk frames
+_STREAM_CHUNKS_PER_RESPONSE = 32
+_MIN_STREAM_CHUNK_CHARS = 64
+
 IMAGE_REF_PATTERN = r'!\[([^\]]*)\]\(([^)]+)\)'
 FILE_REF_PATTERN = r'\[File: ([^\]]+)\]\(([^)]+)\)'
 
@@ -37,14 +51,36 @@ def set_global_engine(engine):
     _global_engine = engine
 
 def get_global_engine():
+    """Engine set by the server, or one built on first use when the router runs standalone"""
     global _global_engine
-    if _global_engine is not None:
-        return _global_engine
-    import sys
-    import os
-    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-    from core.ai_engine import AI_engine
-    return AI_engine()
+    if _global_engine is None:
+        from core.ai_engine import AI_engine
+        _global_engine = AI_engine()
+    return _global_engine
+
+# Identical completions already in flight share one engine call, keyed by _completion_key()
+_inflight_completions: Dict[str, asyncio.Future] = {}
+
+def _completion_key(messages: List[Dict[str, Any]], **kwargs) -> str:
+    payload = fast_json.dumps([sorted(kwargs.items()), [(m["role"], m["content"]) for m in messages]])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+async def _shared_chat_completion(ai, messages: List[Dict[str, Any]], **kwargs):
+    """Run ai.chat_completion in a worker thread, joining an identical call if one is running"""
+    key = _completion_key(messages, **kwargs)
+    task = _inflight_completions.get(key)
+    if task is None:
+        task = asyncio.ensure_future(asyncio.to_thread(ai.chat_completion, messages=messages, **kwargs))
+        _inflight_completions[key] = task
+
+        def _done(t: asyncio.Future):
+            _inflight_completions.pop(key, None)
+            if not t.cancelled():
+                t.exception()  # waiters may all have timed out; don't log "never retrieved"
+
+        task.add_done_callback(_done)
+    # Shielded so one caller's timeout doesn't cancel the call for the others
+    return await asyncio.shield(task)
 
 # Initialize components
 chat_db = ChatDB()
@@ -215,15 +251,30 @@ class MessageResponse(BaseModel):
     created_at: str
     response_to: Optional[int]
 
+
+# Rows from ChatDB are already well-typed, so responses skip per-field validation;
+# only SQLite's 0/1 flags need converting to real booleans.
+def _chat_response(chat: Dict[str, Any]) -> ChatResponse:
+    return ChatResponse.model_construct(
+        **{**chat, "is_temporary": bool(chat["is_temporary"]), "force_provider": bool(chat["force_provider"])}
+    )
+
 # Background task for cleaning up temporary chats
 _cleanup_running = True
+# The same loop refreshes SQLite planner statistics this often
+_DB_OPTIMIZE_INTERVAL = 3600
 
 async def cleanup_expired_temporary_chats():
     """Background task to delete temporary chats after their configured timer expires"""
     global _cleanup_running
+    last_optimize = time.monotonic()
     while _cleanup_running:
         try:
-            expired_chats = chat_db.get_expired_temporary_chats()
+            if time.monotonic() - last_optimize >= _DB_OPTIMIZE_INTERVAL:
+                last_optimize = time.monotonic()
+                await asyncio.to_thread(chat_db.optimize)
+
+            expired_chats = await asyncio.to_thread(chat_db.get_expired_temporary_chats)
 
             for chat in expired_chats:
                 chat_id = chat['id']
@@ -231,7 +282,7 @@ async def cleanup_expired_temporary_chats():
                 verbose_print(f"Auto-deleting expired temporary chat {chat_id} (timer: {timer_minutes} minutes)")
 
                 # Delete the chat from database
-                success = chat_db.delete_chat(chat_id)
+                success = await asyncio.to_thread(chat_db.delete_chat, chat_id)
 
                 if success:
                     # Notify all connected clients via WebSocket
@@ -323,8 +374,8 @@ router = APIRouter(prefix="/api/chat", tags=["Chat"])
 async def get_chats(include_temporary: bool = False, limit: int = 50):
     """Get list of chats"""
     try:
-        chats = chat_db.get_chats(include_temporary=include_temporary, limit=limit)
-        return [ChatResponse(**chat) for chat in chats]
+        chats = await asyncio.to_thread(chat_db.get_chats, include_temporary=include_temporary, limit=limit)
+        return [_chat_response(chat) for chat in chats]
     except Exception as e:
         logger.error(f"Error getting chats: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve chats")
@@ -333,7 +384,7 @@ async def get_chats(include_temporary: bool = False, limit: int = 50):
 async def create_chat(request: CreateChatRequest):
     """Create a new chat"""
     try:
-        chat_id = chat_db.create_chat(
+        chat_id = await asyncio.to_thread(chat_db.create_chat,
             title=request.title,
             model=request.model,
             provider=request.provider,
@@ -343,11 +394,11 @@ async def create_chat(request: CreateChatRequest):
             temporary_timer_minutes=request.temporary_timer_minutes
         )
 
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         return {
             "success": True,
             "chat_id": chat_id,
-            "chat": ChatResponse(**chat)
+            "chat": _chat_response(chat)
         }
     except Exception as e:
         logger.error(f"Error creating chat: {e}")
@@ -357,15 +408,15 @@ async def create_chat(request: CreateChatRequest):
 async def get_chat(chat_id: int, limit: int = 100):
     """Get chat with messages"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        messages = chat_db.get_messages(chat_id, limit=limit)
+        messages = await asyncio.to_thread(chat_db.get_messages, chat_id, limit=limit)
 
         return {
-            "chat": ChatResponse(**chat),
-            "messages": [MessageResponse(**msg) for msg in messages]
+            "chat": _chat_response(chat),
+            "messages": [MessageResponse.model_construct(**msg) for msg in messages]
         }
     except HTTPException:
         raise
@@ -378,12 +429,12 @@ async def send_message(chat_id: int, request: SendMessageRequest, background_tas
     """Send a message to a chat"""
     try:
         # Verify chat exists
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
         # Add user message immediately
-        message_id = chat_db.add_message(
+        message_id = await asyncio.to_thread(chat_db.add_message,
             chat_id=chat_id,
             role=request.role,
             content=request.content,
@@ -397,7 +448,8 @@ async def send_message(chat_id: int, request: SendMessageRequest, background_tas
                 chat_id=chat_id,
                 user_message_id=message_id,
                 model=chat.get('model'),
-                provider=chat.get('provider')
+                provider=chat.get('provider'),
+                chat=chat
             )
 
         return {
@@ -417,7 +469,7 @@ async def update_chat(chat_id: int, request: UpdateChatRequest):
     """Update chat properties"""
     try:
         # Verify chat exists
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -425,14 +477,14 @@ async def update_chat(chat_id: int, request: UpdateChatRequest):
         update_data = {k: v for k, v in request.model_dump().items() if v is not None}
 
         if update_data:
-            success = chat_db.update_chat(chat_id, **update_data)
+            success = await asyncio.to_thread(chat_db.update_chat, chat_id, **update_data)
             if not success:
                 raise HTTPException(status_code=400, detail="No valid fields to update")
 
-        updated_chat = chat_db.get_chat(chat_id)
+        updated_chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         return {
             "success": True,
-            "chat": ChatResponse(**updated_chat)
+            "chat": _chat_response(updated_chat)
         }
 
     except HTTPException:
@@ -446,7 +498,7 @@ async def convert_chat_to_permanent(chat_id: int, new_title: Optional[str] = Non
     """Convert a temporary chat to permanent"""
     try:
         # Verify chat exists and is temporary
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -454,16 +506,16 @@ async def convert_chat_to_permanent(chat_id: int, new_title: Optional[str] = Non
             raise HTTPException(status_code=400, detail="Chat is already permanent")
 
         # Convert to permanent
-        success = chat_db.convert_chat_to_permanent(chat_id, new_title)
+        success = await asyncio.to_thread(chat_db.convert_chat_to_permanent, chat_id, new_title)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to convert chat")
 
         # Get updated chat
-        updated_chat = chat_db.get_chat(chat_id)
+        updated_chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         return {
             "success": True,
             "message": "Chat converted to permanent",
-            "chat": ChatResponse(**updated_chat)
+            "chat": _chat_response(updated_chat)
         }
 
     except HTTPException:
@@ -476,7 +528,7 @@ async def convert_chat_to_permanent(chat_id: int, new_title: Optional[str] = Non
 async def delete_chat(chat_id: int):
     """Delete a chat"""
     try:
-        success = chat_db.delete_chat(chat_id)
+        success = await asyncio.to_thread(chat_db.delete_chat, chat_id)
         if not success:
             raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -493,12 +545,12 @@ async def get_messages(chat_id: int, limit: int = 100, after_id: Optional[int] =
     """Get messages for a chat"""
     try:
         # Verify chat exists
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        messages = chat_db.get_messages(chat_id, limit=limit, after_id=after_id)
-        return [MessageResponse(**msg) for msg in messages]
+        messages = await asyncio.to_thread(chat_db.get_messages, chat_id, limit=limit, after_id=after_id)
+        return [MessageResponse.model_construct(**msg) for msg in messages]
 
     except HTTPException:
         raise
@@ -510,7 +562,7 @@ async def get_messages(chat_id: int, limit: int = 100, after_id: Optional[int] =
 async def get_stats():
     """Get chat statistics"""
     try:
-        stats = chat_db.get_chat_stats()
+        stats = await asyncio.to_thread(chat_db.get_chat_stats)
         return {"success": True, "stats": stats}
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
@@ -520,16 +572,16 @@ async def get_stats():
 async def edit_message(message_id: int, request: EditMessageRequest):
     """Edit a message's content"""
     try:
-        message = chat_db.get_message(message_id)
+        message = await asyncio.to_thread(chat_db.get_message, message_id)
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
 
-        success = chat_db.edit_message(message_id, request.content)
+        success = await asyncio.to_thread(chat_db.edit_message, message_id, request.content)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to edit message")
 
-        updated_message = chat_db.get_message(message_id)
-        return {"success": True, "message": MessageResponse(**updated_message)}
+        updated_message = await asyncio.to_thread(chat_db.get_message, message_id)
+        return {"success": True, "message": MessageResponse.model_construct(**updated_message)}
 
     except HTTPException:
         raise
@@ -541,11 +593,11 @@ async def edit_message(message_id: int, request: EditMessageRequest):
 async def regenerate_response(chat_id: int, message_id: int, background_tasks: BackgroundTasks):
     """Regenerate assistant response from a specific user message"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        message = chat_db.get_message(message_id)
+        message = await asyncio.to_thread(chat_db.get_message, message_id)
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
 
@@ -553,7 +605,7 @@ async def regenerate_response(chat_id: int, message_id: int, background_tasks: B
             raise HTTPException(status_code=400, detail="Can only regenerate from user messages")
 
         # Delete messages after this one
-        deleted_count = chat_db.delete_messages_after(chat_id, message_id)
+        deleted_count = await asyncio.to_thread(chat_db.delete_messages_after, chat_id, message_id)
 
         # Trigger new AI response
         background_tasks.add_task(
@@ -561,7 +613,8 @@ async def regenerate_response(chat_id: int, message_id: int, background_tasks: B
             chat_id=chat_id,
             user_message_id=message_id,
             model=chat.get('model'),
-            provider=chat.get('provider')
+            provider=chat.get('provider'),
+            chat=chat
         )
 
         return {
@@ -580,7 +633,7 @@ async def regenerate_response(chat_id: int, message_id: int, background_tasks: B
 async def search_messages(request: SearchRequest):
     """Search messages across chats"""
     try:
-        messages = chat_db.search_messages(
+        messages = await asyncio.to_thread(chat_db.search_messages,
             query=request.query,
             chat_id=request.chat_id,
             limit=request.limit
@@ -588,7 +641,7 @@ async def search_messages(request: SearchRequest):
         return {
             "success": True,
             "query": request.query,
-            "results": [MessageResponse(**msg) for msg in messages],
+            "results": [MessageResponse.model_construct(**msg) for msg in messages],
             "total": len(messages)
         }
     except Exception as e:
@@ -647,7 +700,7 @@ async def upload_file(file: UploadFile = File(...), chat_id: Optional[int] = Non
 
         # If chat_id provided, add file reference as message
         if chat_id:
-            chat = chat_db.get_chat(chat_id)
+            chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
             if chat:
                 file_url = f"/uploads/{safe_filename}"
                 file_ref = f"[File: {file.filename}]({file_url})"
@@ -663,7 +716,7 @@ async def upload_file(file: UploadFile = File(...), chat_id: Optional[int] = Non
                     "file_size": len(content)
                 }
 
-                msg_id = chat_db.add_message(
+                msg_id = await asyncio.to_thread(chat_db.add_message,
                     chat_id=chat_id,
                     role="user",
                     content=file_ref,
@@ -709,11 +762,11 @@ async def get_upload(filename: str):
 async def create_branch(chat_id: int, message_id: int):
     """Create a new branch from a specific message"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        new_branch_id = chat_db.create_branch(chat_id, message_id)
+        new_branch_id = await asyncio.to_thread(chat_db.create_branch, chat_id, message_id)
 
         return {
             "success": True,
@@ -731,11 +784,11 @@ async def create_branch(chat_id: int, message_id: int):
 async def get_branches(chat_id: int):
     """Get all branches for a chat"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        branches = chat_db.get_branches(chat_id)
+        branches = await asyncio.to_thread(chat_db.get_branches, chat_id)
         return {"success": True, "branches": branches}
 
     except HTTPException:
@@ -748,12 +801,12 @@ async def get_branches(chat_id: int):
 async def get_branch_messages(chat_id: int, branch_id: int):
     """Get messages for a specific branch"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        messages = chat_db.get_branch_messages(chat_id, branch_id)
-        return {"success": True, "branch_id": branch_id, "messages": [MessageResponse(**msg) for msg in messages]}
+        messages = await asyncio.to_thread(chat_db.get_branch_messages, chat_id, branch_id)
+        return {"success": True, "branch_id": branch_id, "messages": [MessageResponse.model_construct(**msg) for msg in messages]}
 
     except HTTPException:
         raise
@@ -765,11 +818,11 @@ async def get_branch_messages(chat_id: int, branch_id: int):
 async def switch_branch(chat_id: int, branch_id: int):
     """Switch to a different branch"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        success = chat_db.switch_branch(chat_id, branch_id)
+        success = await asyncio.to_thread(chat_db.switch_branch, chat_id, branch_id)
         return {"success": success, "message": f"Switched to branch {branch_id}"}
 
     except HTTPException:
@@ -782,11 +835,11 @@ async def switch_branch(chat_id: int, branch_id: int):
 async def export_chat(chat_id: int, format: str = "markdown"):
     """Export chat conversation in Markdown or JSON format"""
     try:
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
 
-        messages = chat_db.get_messages(chat_id, limit=1000)
+        messages = await asyncio.to_thread(chat_db.get_messages, chat_id, limit=1000)
 
         if format == "json":
             return {
@@ -835,18 +888,18 @@ async def websocket_endpoint(websocket: WebSocket, chat_id: int):
         while True:
             # Receive message from client
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = fast_json.loads(data)
 
             if message_data.get("type") == "user_message":
                 await handle_websocket_message(websocket, chat_id, message_data)
             elif message_data.get("type") == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                await websocket.send_text(_PONG_FRAME)
 
     except WebSocketDisconnect:
         websocket_manager.disconnect(websocket, chat_id)
     except Exception as e:
         logger.error(f"WebSocket error for chat {chat_id}: {e}")
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(fast_json.dumps({
             "type": "error",
             "message": str(e)
         }))
@@ -856,9 +909,9 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: int, message_d
     """Handle incoming WebSocket message"""
     try:
         # Verify chat exists
-        chat = chat_db.get_chat(chat_id)
+        chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
         if not chat:
-            await websocket.send_text(json.dumps({
+            await websocket.send_text(fast_json.dumps({
                 "type": "chat_deleted",
                 "message": "Chat no longer exists"
             }))
@@ -867,7 +920,7 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: int, message_d
 
         # Add user message
         try:
-            user_message_id = chat_db.add_message(
+            user_message_id = await asyncio.to_thread(chat_db.add_message,
                 chat_id=chat_id,
                 role="user",
                 content=message_data["content"],
@@ -875,7 +928,7 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: int, message_d
             )
         except ValueError as e:
             if "does not exist" in str(e) or "was deleted" in str(e):
-                await websocket.send_text(json.dumps({
+                await websocket.send_text(fast_json.dumps({
                     "type": "chat_deleted",
                     "message": "Chat was deleted while sending message"
                 }))
@@ -884,7 +937,7 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: int, message_d
             raise
 
         # Send confirmation
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(fast_json.dumps({
             "type": "message_saved",
             "message_id": user_message_id
         }))
@@ -895,25 +948,24 @@ async def handle_websocket_message(websocket: WebSocket, chat_id: int, message_d
             chat_id=chat_id,
             user_message_id=user_message_id,
             model=message_data.get('model') or chat.get('model'),
-            provider=message_data.get('provider') or chat.get('provider')
+            provider=message_data.get('provider') or chat.get('provider'),
+            chat=chat
         )
 
     except Exception as e:
         logger.error(f"Error handling WebSocket message: {e}")
-        await websocket.send_text(json.dumps({
+        await websocket.send_text(fast_json.dumps({
             "type": "error",
             "message": str(e)
         }))
 
-async def process_ai_response(chat_id: int, user_message_id: int, model: str = None, provider: str = None):
+async def process_ai_response(chat_id: int, user_message_id: int, model: str = None, provider: str = None,
+                              chat: Optional[Dict[str, Any]] = None):
     """Process AI response in background (for REST API)"""
     try:
-        import sys
-        import os
-        sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-
-        chat = chat_db.get_chat(chat_id)
-        context_messages = chat_db.get_context_messages(chat_id)
+        if chat is None:
+            chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
+        context_messages = await asyncio.to_thread(chat_db.get_context_messages, chat_id)
 
         formatted_messages = []
         if chat and chat.get('system_prompt'):
@@ -977,7 +1029,7 @@ async def process_ai_response(chat_id: int, user_message_id: int, model: str = N
                     force_provider_flag = False
                     use_autodecide = True
 
-        result = await asyncio.to_thread(ai.chat_completion,
+        result = await _shared_chat_completion(ai,
             messages=formatted_messages,
             model=effective_model,
             autodecide=use_autodecide,
@@ -1000,17 +1052,16 @@ async def process_ai_response(chat_id: int, user_message_id: int, model: str = N
             }
             if vision_warning:
                 metadata["vision_warning"] = vision_warning
-            chat_db.add_message(
+            await asyncio.to_thread(chat_db.add_message,
                 chat_id=chat_id,
                 role="assistant",
                 content=result.content,
                 metadata=metadata,
-                tokens=len(result.content) // 4,
                 response_to=user_message_id
             )
         else:
             # Save error message
-            chat_db.add_message(
+            await asyncio.to_thread(chat_db.add_message,
                 chat_id=chat_id,
                 role="assistant",
                 content=f"Error: {result.error_message or 'Unknown error occurred'}",
@@ -1029,7 +1080,7 @@ async def process_ai_response(chat_id: int, user_message_id: int, model: str = N
 
     except Exception as e:
         logger.error(f"Error processing AI response for chat {chat_id}: {e}")
-        chat_db.add_message(
+        await asyncio.to_thread(chat_db.add_message,
             chat_id=chat_id,
             role="assistant",
             content=f"System Error: {str(e)}",
@@ -1037,8 +1088,20 @@ async def process_ai_response(chat_id: int, user_message_id: int, model: str = N
             response_to=user_message_id
         )
 
+async def _send_keepalives(websocket: WebSocket, interval: float):
+    """Send a typing keepalive every interval until cancelled or the socket goes away"""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await websocket.send_text(_KEEPALIVE_FRAME)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        return
+
 async def process_ai_response_stream(websocket: WebSocket, chat_id: int, user_message_id: int,
-                                     model: str = None, provider: str = None):
+                                     model: str = None, provider: str = None,
+                                     chat: Optional[Dict[str, Any]] = None):
     """Process AI response with streaming (for WebSocket).
 
     Offloads the AI call to a thread, sends periodic typing keepalives so the client
@@ -1046,12 +1109,9 @@ async def process_ai_response_stream(websocket: WebSocket, chat_id: int, user_me
     persists the assistant message.
     """
     try:
-        import sys
-        import os
-        sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-
-        context_messages = chat_db.get_context_messages(chat_id)
-        chat = chat_db.get_chat(chat_id)
+        context_messages = await asyncio.to_thread(chat_db.get_context_messages, chat_id)
+        if chat is None:
+            chat = await asyncio.to_thread(chat_db.get_chat, chat_id)
 
         formatted_messages = []
         if chat and chat.get('system_prompt'):
@@ -1065,9 +1125,12 @@ async def process_ai_response_stream(websocket: WebSocket, chat_id: int, user_me
         force_provider_setting = chat.get('force_provider', False) if chat else False
 
         if vision_warning and not force_vision_routing:
-            await websocket.send_text(json.dumps({"type": "vision_warning", "message": vision_warning}))
+            await websocket.send_text(fast_json.dumps({"type": "vision_warning", "message": vision_warning}))
 
-        await websocket.send_text(json.dumps({"type": "ai_thinking", "provider": provider, "model": model}))
+        if provider is None and model is None:
+            await websocket.send_text(_AUTO_THINKING_FRAME)
+        else:
+            await websocket.send_text(fast_json.dumps({"type": "ai_thinking", "provider": provider, "model": model}))
 
         ai = get_global_engine()
         verbose_print(f"Starting AI call for chat={chat_id} user_msg={user_message_id} provider={provider} model={model} force={force_provider_setting}")
@@ -1124,22 +1187,27 @@ async def process_ai_response_stream(websocket: WebSocket, chat_id: int, user_me
                     force_provider_flag = False
                     use_autodecide = True
 
+        keepalive_task = asyncio.create_task(_send_keepalives(websocket, _KEEPALIVE_INTERVAL))
         try:
-            result = await asyncio.to_thread(ai.chat_completion,
+            result = await asyncio.wait_for(_shared_chat_completion(ai,
                 messages=formatted_messages,
                 model=effective_model,
                 autodecide=use_autodecide,
                 preferred_provider=effective_provider,
                 force_provider=force_provider_flag
-            )
+            ), timeout=_AI_RESPONSE_TIMEOUT)
         except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = TimeoutError(f"AI response timed out after {_AI_RESPONSE_TIMEOUT}s")
             logger.exception(f"AI call exception for chat {chat_id}: {e}")
             try:
-                await websocket.send_text(json.dumps({"type": "ai_error", "content": str(e)}))
+                await websocket.send_text(fast_json.dumps({"type": "ai_error", "content": str(e)}))
             except Exception:
                 pass
-            chat_db.add_message(chat_id=chat_id, role="assistant", content=f"System Error: {str(e)}", metadata={"error": True})
+            await asyncio.to_thread(chat_db.add_message, chat_id=chat_id, role="assistant", content=f"System Error: {str(e)}", metadata={"error": True})
             return
+        finally:
+            keepalive_task.cancel()
 
         response_time = time.time() - start_time
 
@@ -1148,43 +1216,51 @@ async def process_ai_response_stream(websocket: WebSocket, chat_id: int, user_me
             provider_used = getattr(result, 'provider_used', provider)
             model_used = getattr(result, 'model_used', model)
 
-            # Stream content word by word for real-time feel
-            words = response_content.split(' ')
-            buffer = ""
-            for word in words:
-                buffer += (" " if buffer else "") + word
-                await websocket.send_text(json.dumps({"type": "ai_chunk", "content": buffer + " ", "is_final": False}))
-                buffer = ""
-                await asyncio.sleep(0.01)
+            # Persist while the response is replayed; the client reloads messages on ai_complete,
+            # so that frame still waits for the row
+            persist_task = asyncio.ensure_future(asyncio.to_thread(chat_db.add_message,
+                chat_id=chat_id,
+                role="assistant",
+                content=response_content,
+                metadata={
+                    "provider": provider_used,
+                    "model": model_used,
+                    "requested_model": model,
+                    "effective_model": effective_model if effective_model != model else None,
+                    "requested_provider": provider,
+                    "has_images": has_images,
+                    "force_vision_routing": force_vision_routing,
+                    "response_time": round(response_time, 3),
+                    "timestamp": datetime.now().isoformat()
+                },
+                response_to=user_message_id
+            ))
 
-            # Send final empty chunk to signal completion
-            await websocket.send_text(json.dumps({"type": "ai_chunk", "content": "", "is_final": True}))
+            try:
+                # The full response is already here: send it in ~32 frames rather than one per word,
+                # yielding between frames instead of sleeping
+                chunk_size = max(_MIN_STREAM_CHUNK_CHARS, len(response_content) // _STREAM_CHUNKS_PER_RESPONSE)
+                for start in range(0, len(response_content), chunk_size):
+                    await websocket.send_text(fast_json.dumps(
+                        {"type": "ai_chunk", "content": response_content[start:start + chunk_size], "is_final": False}
+                    ))
+                    await asyncio.sleep(0)
+
+                # Send final empty chunk to signal completion
+                await websocket.send_text(_FINAL_CHUNK_FRAME)
+            except Exception as e:
+                # The reply is being stored regardless; the client sees it when it reloads the chat
+                await asyncio.gather(persist_task, return_exceptions=True)
+                logger.warning(f"Client for chat {chat_id} went away during response replay: {e}")
+                return
 
-            # Persist assistant message
             try:
-                assistant_message_id = chat_db.add_message(
-                    chat_id=chat_id,
-                    role="assistant",
-                    content=response_content,
-                    metadata={
-                        "provider": provider_used,
-                        "model": model_used,
-                        "requested_model": model,
-                        "effective_model": effective_model if effective_model != model else None,
-                        "requested_provider": provider,
-                        "has_images": has_images,
-                        "force_vision_routing": force_vision_routing,
-                        "response_time": round(response_time, 3),
-                        "timestamp": datetime.now().isoformat()
-                    },
-                    tokens=(len(response_content) // 4) if response_content else 0,
-                    response_to=user_message_id
-                )
-                await websocket.send_text(json.dumps({"type": "ai_complete", "message_id": assistant_message_id, "provider": provider_used, "model": model_used, "response_time": response_time}))
+                assistant_message_id = await persist_task
+                await websocket.send_text(fast_json.dumps({"type": "ai_complete", "message_id": assistant_message_id, "provider": provider_used, "model": model_used, "response_time": response_time}))
             except ValueError as e:
                 if "does not exist" in str(e) or "was deleted" in str(e):
                     logger.warning(f"Chat {chat_id} was deleted while processing AI response")
-                    await websocket.send_text(json.dumps({"type": "chat_deleted", "message": "Chat was deleted"}))
+                    await websocket.send_text(fast_json.dumps({"type": "chat_deleted", "message": "Chat was deleted"}))
                     await websocket.close()
                     return
                 raise
@@ -1192,15 +1268,15 @@ async def process_ai_response_stream(websocket: WebSocket, chat_id: int, user_me
             error_msg = getattr(result, 'error_message', 'No response from provider') if result else 'No response from provider'
             logger.error(f"AI error for chat {chat_id}: {error_msg}")
             try:
-                await websocket.send_text(json.dumps({"type": "ai_error", "content": f"Error: {error_msg}"}))
+                await websocket.send_text(fast_json.dumps({"type": "ai_error", "content": f"Error: {error_msg}"}))
             except Exception:
                 pass
-            chat_db.add_message(chat_id=chat_id, role="assistant", content=f"Error: {error_msg}", metadata={"error": True}, response_to=user_message_id)
+            await asyncio.to_thread(chat_db.add_message, chat_id=chat_id, role="assistant", content=f"Error: {error_msg}", metadata={"error": True}, response_to=user_message_id)
 
     except Exception as e:
         logger.exception(f"Error processing AI response stream for chat {chat_id}: {e}")
         try:
-            await websocket.send_text(json.dumps({"type": "ai_error", "content": f"System Error: {str(e)}"}))
+            await websocket.send_text(fast_json.dumps({"type": "ai_error", "content": f"System Error: {str(e)}"}))
         except Exception:
             pass
-        chat_db.add_message(chat_id=chat_id, role="assistant", content=f"System Error: {str(e)}", metadata={"error": True, "system_error": True}, response_to=user_message_id)
+        await asyncio.to_thread(chat_db.add_message, chat_id=chat_id, role="assistant", content=f"System Error: {str(e)}", metadata={"error": True, "system_error": True}, response_to=user_message_id)
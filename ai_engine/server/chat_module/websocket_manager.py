@@ -1,11 +1,12 @@
 """
 WebSocket connection manager for chat functionality
 """
-import json
 import logging
 from typing import Dict, List
 from fastapi import WebSocket
 
+from core import fast_json
+
 logger = logging.getLogger(__name__)
 
 class WebSocketManager:
@@ -59,7 +60,7 @@ class WebSocketManager:
 
     async def send_typing_indicator(self, chat_id: int, is_typing: bool = True):
         """Send typing indicator to chat room"""
-        message = json.dumps({
+        message = fast_json.dumps({
             "type": "typing_indicator",
             "is_typing": is_typing
         })
@@ -72,7 +73,7 @@ class WebSocketManager:
             connections = self.active_connections[chat_id].copy()  # Copy to avoid modification during iteration
             for connection in connections:
                 try:
-                    await connection.send_text(json.dumps({
+                    await connection.send_text(fast_json.dumps({
                         "type": "chat_deleted",
                         "chat_id": chat_id,
                         "message": "This chat has been automatically deleted"
@@ -87,7 +88,7 @@ class WebSocketManager:
             logger.info(f"Closed all WebSocket connections for deleted chat {chat_id}")
 
         # Broadcast to all other clients to update their chat lists
-        message = json.dumps({
+        message = fast_json.dumps({
             "type": "chat_deleted",
             "chat_id": chat_id
         })
@@ -4,41 +4,49 @@ import asyncio
 import aiohttp
 import requests
 import re
-from typing import Dict, List, Any, Optional, Tuple
+import json
+import hashlib
+import heapq
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import logging
 import concurrent.futures
 import threading
+from collections import deque
+from dataclasses import asdict, dataclass, replace
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:  # optional: vectorized key scoring for providers with many keys
+    np = None
+
 # Import configuration from external config file
 try:
     from core.config import AI_CONFIGS, ENGINE_SETTINGS, AUTODECIDE_CONFIG, verbose_print
     from core.model_cache import shared_model_cache
-    from core.health_monitor import health_monitor
+    from core.health_monitor import health_monitor, health_cache
     from core.latency_tracker import latency_tracker
     from core.rate_limit_manager import rate_limit_manager
     from core.usage_tracker import usage_tracker
     from core.provider_requests import ProviderRequestMixin, RequestResult
     from core.streaming import StreamingMixin
-    from core.provider_reliability import (
-        backoff_tracker,
-    )
+    from core.provider_reliability import backoff_tracker
     from core.stress_test import StressTestMixin
+    from core.caching import AdvancedCache
 except ImportError:
     try:
         from config import AI_CONFIGS, ENGINE_SETTINGS, AUTODECIDE_CONFIG, verbose_print
         from core.model_cache import shared_model_cache
-        from core.health_monitor import health_monitor
+        from core.health_monitor import health_monitor, health_cache
         from core.latency_tracker import latency_tracker
         from core.rate_limit_manager import rate_limit_manager
         from core.usage_tracker import usage_tracker
         from core.provider_requests import ProviderRequestMixin, RequestResult
         from core.streaming import StreamingMixin
-        from core.provider_reliability import (
-            backoff_tracker,
-        )
+        from core.provider_reliability import backoff_tracker
         from core.stress_test import StressTestMixin
+        from core.caching import AdvancedCache
     except ImportError as e:
         print(f"Failed to import from config: {e}")
         print("Falling back to inline configuration...")
@@ -66,11 +74,142 @@ except ImportError as e:
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger("AI_engine")
+logger.addHandler(logging.NullHandler())
+
+# Safety cap on the per-key request timestamp log (entries normally expire after 60s)
+_REQUEST_LOG_MAXLEN = 10_000
+
+@dataclass(slots=True)
+class KeyStats:
+    """In-memory usage counters for one API key (last_used is a monotonic timestamp)"""
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    last_used: Optional[float] = None
+    rate_limited: bool = False
+    weight: float = 1.0
+
+
+# Shared read-only default for keys with no stats entry yet
+_UNUSED_KEY_STATS = KeyStats()
+
+# Providers with at least this many keys score them in one NumPy pass when numpy is installed
+_VECTOR_SCORE_MIN_KEYS = 32
+
+# Load-score penalty for keys that have used their whole per-key RPM in the last minute
+_SATURATED_KEY_PENALTY = 1_000_000.0
+
+# Shared constant failure (RequestResult is frozen)
+_NO_PROVIDERS_RESULT = RequestResult(success=False, error_message="No available providers", error_type="no_providers")
+
 _CHAT_ROUTING_KWARGS = frozenset({"provider", "force_provider", "use_cache", "preferred_provider"})
 
+# Error-text signatures per category, kept as module constants so nothing is rebuilt per call
+_RATE_LIMIT_PATTERNS = (
+    "rate limit", "too many requests", "quota exceeded", "requests per minute",
+    "rpm exceeded", "rate limited", "throttled", "429", "rate_limit_exceeded",
+    "requests_per_minute_limit_exceeded", "rate_limit_reached",
+)
+_AUTH_ERROR_PATTERNS = (
+    "invalid key", "unauthorized", "forbidden", "api key", "invalid_api_key",
+    "authentication failed", "invalid token", "access denied", "invalid_request_error",
+    "incorrect api key", "api_key_invalid", "authentication_error",
+)
+_QUOTA_PATTERNS = (
+    "daily limit", "monthly quota", "usage limit", "quota_exceeded", "insufficient_quota",
+    "billing_hard_limit_reached", "usage_limit_exceeded", "credit limit", "balance insufficient",
+)
+_SERVICE_PATTERNS = (
+    "model not found", "service unavailable", "model_not_found", "invalid_model",
+    "model temporarily unavailable", "service_unavailable", "model_overloaded",
+    "engine_overloaded", "server_overloaded",
+)
+_NETWORK_PATTERNS = (
+    "timeout", "connection error", "network error", "connection timeout",
+    "read timeout", "connect timeout", "connection refused", "network_error",
+)
+_BAD_REQUEST_PATTERNS = ("invalid request", "bad request")
+
+# _classify_error checks categories in this order
+_ERROR_SIGNATURES = (
+    ("rate_limit", _RATE_LIMIT_PATTERNS),
+    ("auth_error", _AUTH_ERROR_PATTERNS),
+    ("quota_exceeded", _QUOTA_PATTERNS),
+    ("service_unavailable", _SERVICE_PATTERNS),
+    ("network_error", _NETWORK_PATTERNS),
+    ("bad_request", _BAD_REQUEST_PATTERNS),
+)
+
+# Status codes that decide a category on their own; other 5xx codes map to "server_error"
+_STATUS_CLASS = {
+    400: "bad_request",
+    401: "auth_error",
+    403: "auth_error",
+    429: "rate_limit",
+    503: "service_unavailable",
+}
+
+# Error classes that point at the key (rotate it) vs. the provider (route around it)
+_KEY_ERRORS = frozenset({"rate_limit", "auth_error", "quota_exceeded"})
+_PROVIDER_ERRORS = frozenset({"service_unavailable", "server_error", "network_error"})
+
+# One compiled, case-insensitive alternation per category, built once at import
+_ERROR_RES = {
+    category: re.compile("|".join(re.escape(p) for p in patterns), re.IGNORECASE)
+    for category, patterns in _ERROR_SIGNATURES
+}
+
+# _classify_error precedence; server_error is status-only and sits between service and network errors
+_CLASSIFY_ORDER = (
+    ("rate_limit", _ERROR_RES["rate_limit"]),
+    ("auth_error", _ERROR_RES["auth_error"]),
+    ("quota_exceeded", _ERROR_RES["quota_exceeded"]),
+    ("service_unavailable", _ERROR_RES["service_unavailable"]),
+    ("server_error", None),
+    ("network_error", _ERROR_RES["network_error"]),
+    ("bad_request", _ERROR_RES["bad_request"]),
+)
+
 _ENGINE_MODE = os.getenv("AI_ENGINE_MODE", "all").lower()
 
 
+def build_http_session(settings: Dict[str, Any] = None) -> requests.Session:
+    """Create a keep-alive requests.Session with pool sizes from ENGINE_SETTINGS["http_pool"]
+
+    Gateway errors (ENGINE_SETTINGS["retry"]["retry_statuses"]) and failed connects are
+    retried inside urllib3 on the warm pool, so a momentary 502/503 does not cost a
+    provider failover. 429 is left to key rotation. Read timeouts are not retried: the
+    provider may already be generating, and failover should see the Timeout at once.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    settings = settings or ENGINE_SETTINGS
+    pool = settings.get("http_pool", {})
+    retry_cfg = settings.get("retry", {})
+    retries = Retry(
+        total=pool.get("transport_retries", 2),
+        read=False,  # re-raise as-is so requests reports a Timeout, not ConnectionError
+        other=0,
+        backoff_factor=retry_cfg.get("base", 0.25),
+        status_forcelist=tuple(retry_cfg.get("retry_statuses", (502, 503, 504))),
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool.get("pool_connections", 22),
+        pool_maxsize=pool.get("pool_maxsize", 64),
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({'User-Agent': 'AI-Engine/3.0'})
+    return session
+
+
 class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
     """
     AI Engine v3.0 - Multi-provider AI gateway with intelligent routing
@@ -93,11 +232,20 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         >>> print(result.content)
     """
 
-    def __init__(self, verbose: bool = None):
+    def __init__(self, verbose: bool = None, session: Optional[requests.Session] = None, prewarm: bool = False,
+                 validate: bool = False, json_loads: Optional[Callable[[Any], Any]] = None, json_dumps: Optional[Callable[[Any], bytes]] = None):
         """Initialize the AI Engine v3.0
 
         Args:
             verbose: Enable verbose logging. If None, uses ENGINE_SETTINGS default.
+            session: Shared requests.Session to reuse. The engine never closes a
+                session it did not create.
+            prewarm: Open keep-alive connections to every provider host in the
+                background. Only worthwhile for long-lived processes.
+            validate: Probe every provider's models endpoint in parallel at startup;
+                providers that fail are taken out of rotation (see validate_providers).
+            json_loads / json_dumps: Override the JSON codec used on the request path
+                (defaults to orjson when installed, else the stdlib).
         """
         # Set verbose mode: instance override > global config > default False
         if verbose is not None:
@@ -120,17 +268,41 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         # Thread safety locks for shared mutable state
         self._flagged_keys_lock = threading.Lock()
+        self._unflag_heap: List[Tuple[float, str]] = []  # (flag_until, provider); see _expire_flags()
         self._usage_stats_lock = threading.Lock()
         self._key_rotation_lock = threading.Lock()
+        self._async_semaphore = None  # Created lazily inside the running event loop
+        self._aio_session: Optional[aiohttp.ClientSession] = None  # See _get_session()
+        self._aio_session_loop = None
+        self._provider_ok: Dict[str, bool] = {}  # Filled by validate_providers()
+
+        if json_loads is not None:
+            self._json_loads = json_loads
+        if json_dumps is not None:
+            self._json_dumps = json_dumps
 
         # Connection pooling - shared session for HTTP requests
-        self._http_session = requests.Session()
-        self._http_session.headers.update({'User-Agent': 'AI-Engine/3.0'})
+        self._owns_session = session is None
+        self._http_session = session if session is not None else build_http_session(ENGINE_SETTINGS)
+
+        # Internal timers are monotonic floats; wall-clock datetimes only at the reporting boundary
+        self._now = time.monotonic
+        self._clock_origin = (time.monotonic(), datetime.now())
 
         # Enhanced tracking for intelligent key rotation
-        self.key_usage_stats = {}  # Track usage per key
+        self.key_usage_stats: Dict[str, Dict[int, KeyStats]] = {}  # Track usage per key
         self.key_last_used = {}    # Track last usage time per key
         self.key_request_count = {} # Track requests per key per minute
+        self._valid_key_cache: Dict[str, Tuple[list, int, Tuple[int, ...]]] = {}  # See _valid_key_indices()
+        self._priority_order_cache = None  # See _providers_by_priority()
+        self._provider_slots: Dict[str, threading.BoundedSemaphore] = {}  # See _provider_slot()
+        self._request_templates: Dict[Tuple[str, Optional[str]], tuple] = {}  # See _request_template()
+
+        # In-process LRU of deterministic (temperature == 0) chat results; see _result_cache_key()
+        self._result_cache = AdvancedCache(
+            max_size=ENGINE_SETTINGS.get("result_cache_size", 1024),
+            default_ttl=ENGINE_SETTINGS.get("result_cache_ttl", 3600),
+        )
 
         # Initialize Statistics Manager
         self.stats_manager = get_stats_manager()
@@ -161,43 +333,40 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             valid_keys = [key for key in api_keys if key is not None]
 
             if valid_keys:
+                self._valid_key_indices(provider_name, api_keys)
                 self.key_usage_stats[provider_name] = {}
                 self.key_last_used[provider_name] = {}
                 self.key_request_count[provider_name] = {}
 
                 for i, key in enumerate(api_keys):
                     if key is not None:
-                        key_id = f"key_{i}"
-
-                        # Load persistent statistics for this key from StatisticsManager
-                        persistent_key_stats = self.stats_manager.get_statistics(provider_name, key_id) if self.stats_manager else None
+                        # In-memory tracking is keyed by the integer key index; "key_<i>" is
+                        # only the persisted StatisticsManager id
+                        persistent_key_stats = self.stats_manager.get_statistics(provider_name, f"key_{i}") if self.stats_manager else None
 
                         if persistent_key_stats:
                             # Use persistent data
-                            self.key_usage_stats[provider_name][key_id] = {
-                                'requests': persistent_key_stats.requests,
-                                'successes': persistent_key_stats.successes,
-                                'failures': persistent_key_stats.failures,
-                                'last_used': persistent_key_stats.last_used,
-                                'rate_limited': persistent_key_stats.rate_limited,
-                                'weight': persistent_key_stats.weight,
-                                'requests_this_minute': 0
-                            }
-                            self.key_last_used[provider_name][key_id] = persistent_key_stats.last_used
+                            self.key_usage_stats[provider_name][i] = KeyStats(
+                                requests=persistent_key_stats.requests,
+                                successes=persistent_key_stats.successes,
+                                failures=persistent_key_stats.failures,
+                                last_used=self._monotonic_from_wall(persistent_key_stats.last_used),
+                                rate_limited=persistent_key_stats.rate_limited,
+                                weight=persistent_key_stats.weight,
+                            )
+                            self.key_last_used[provider_name][i] = persistent_key_stats.last_used
                         else:
                             # Initialize with defaults
-                            self.key_usage_stats[provider_name][key_id] = {
-                                'requests': 0,
-                                'successes': 0,
-                                'failures': 0,
-                                'last_used': None,
-                                'rate_limited': False,
-                                'weight': 1.0,
-                                'requests_this_minute': 0
-                            }
-                            self.key_last_used[provider_name][key_id] = None
-
-                        self.key_request_count[provider_name][key_id] = []
+                            self.key_usage_stats[provider_name][i] = KeyStats()
+                            self.key_last_used[provider_name][i] = None
+
+                        self.key_request_count[provider_name][i] = deque(maxlen=_REQUEST_LOG_MAXLEN)
+
+        if validate:
+            self.validate_providers()
+
+        if prewarm:
+            threading.Thread(target=self.prewarm_connections, name="ai-engine-prewarm", daemon=True).start()
 
         if self.verbose:
             verbose_print(f"🚀 AI Engine v3.0 initialized with {len(self.providers)} providers", self.verbose)
@@ -227,10 +396,12 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             if config.get("enabled", True):
                 # Check if provider needs API keys
                 if config.get("auth_type") and config.get("api_keys"):
-                    # Filter out None values from api_keys
-                    valid_keys = [key for key in config["api_keys"] if key is not None]
+                    # Filter out None values from api_keys; a clean list is kept as-is, not copied
+                    api_keys = config["api_keys"]
+                    valid_keys = api_keys if None not in api_keys else [key for key in api_keys if key is not None]
                     if valid_keys:
-                        config["api_keys"] = valid_keys
+                        if valid_keys is not api_keys:
+                            config["api_keys"] = valid_keys
                         enabled_providers[name] = config
                     else:
                         if self.verbose:
@@ -254,6 +425,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             verbose (bool): Enable or disable verbose output
         """
         self.verbose = verbose
+        self._setup_logging()
         verbose_print(f"🔧 AI Engine verbose mode: {'Enabled' if verbose else 'Disabled'}", self.verbose)
 
     def get_verbose(self) -> bool:
@@ -285,37 +457,100 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         return ENGINE_SETTINGS.get("verbose_mode", False)
 
     def _setup_logging(self) -> logging.Logger:
-        """Setup logging configuration"""
-        logger = logging.getLogger('AI_engine')
-        logger.setLevel(logging.INFO)
-
-        if not logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
+        """Route verbose output through the shared 'AI_engine' logger; silent by default"""
+        if self.verbose:
+            logger.setLevel(logging.DEBUG)
+            if not any(isinstance(h, logging.StreamHandler) for h in logger.handlers):
+                handler = logging.StreamHandler()
+                formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+                handler.setFormatter(formatter)
+                logger.addHandler(handler)
 
         return logger
 
-    def _is_key_flagged(self, provider_name: str) -> bool:
+    def _wall_from_monotonic(self, timestamp: Optional[float]) -> Optional[datetime]:
+        """Convert an internal monotonic timestamp to a wall-clock datetime"""
+        if timestamp is None:
+            return None
+        mono_origin, wall_origin = self._clock_origin
+        return wall_origin + timedelta(seconds=timestamp - mono_origin)
+
+    def _monotonic_from_wall(self, moment: Optional[datetime]) -> Optional[float]:
+        """Convert a wall-clock datetime (e.g. from persisted stats) to the monotonic timeline"""
+        if moment is None:
+            return None
+        mono_origin, wall_origin = self._clock_origin
+        return mono_origin + (moment - wall_origin).total_seconds()
+
+    def _is_key_flagged(self, provider_name: str, *, now: Optional[float] = None) -> bool:
         """Check if a provider's key is currently flagged"""
+        # Unflagged providers (the common case) cost one dict lookup and no clock read
+        if provider_name not in self.flagged_keys:
+            return False
+
+        if now is None:
+            now = self._now()
+        self._expire_flags(now)
         with self._flagged_keys_lock:
-            if provider_name not in self.flagged_keys:
+            flag_info = self.flagged_keys.get(provider_name)
+            if flag_info is None:
                 return False
 
-            flag_info = self.flagged_keys[provider_name]
-            current_time = datetime.now()
-
-            # Check if enough time has passed since flagging
-            if current_time > flag_info['flag_until']:
-                # Remove the flag
+            # Flags written directly into flagged_keys have no heap entry; expire them here
+            if now > flag_info['flag_until']:
                 del self.flagged_keys[provider_name]
                 if self.verbose:
-                    verbose_print(f"🟢 {provider_name} key unflagged - retry available", self.verbose)
+                    logger.debug("🟢 %s key unflagged - retry available", provider_name)
                 return False
 
             return True
 
+    def _schedule_unflag(self, provider_name: str, flag_until: float):
+        """Record when a flag lapses; caller holds _flagged_keys_lock"""
+        heapq.heappush(self._unflag_heap, (flag_until, provider_name))
+
+    def _expire_flags(self, now: Optional[float] = None):
+        """Drop every flag whose scheduled unflag time has passed"""
+        heap = self._unflag_heap
+        if not heap:
+            return
+        if now is None:
+            now = self._now()
+        if heap[0][0] >= now:
+            return
+
+        with self._flagged_keys_lock:
+            while heap and heap[0][0] < now:
+                _, provider_name = heapq.heappop(heap)
+                flag_info = self.flagged_keys.get(provider_name)
+                # Stale entry if the provider was unflagged or re-flagged for longer since
+                if flag_info is not None and flag_info['flag_until'] < now:
+                    del self.flagged_keys[provider_name]
+                    if self.verbose:
+                        logger.debug("🟢 %s key unflagged - retry available", provider_name)
+
+    def _valid_key_indices(self, provider_name: str, api_keys: list) -> Tuple[int, ...]:
+        """Indices of the non-None keys, cached until the provider's key list is replaced"""
+        cached = self._valid_key_cache.get(provider_name)
+        if cached is not None and cached[0] is api_keys and cached[1] == len(api_keys):
+            return cached[2]
+        indices = tuple(i for i, key in enumerate(api_keys) if key is not None)
+        self._valid_key_cache[provider_name] = (api_keys, len(api_keys), indices)
+        return indices
+
+    @staticmethod
+    def _result_cache_key(messages: List[Dict[str, str]], model: Optional[str],
+                          preferred_provider: Optional[str], request_kwargs: Dict[str, Any]) -> Optional[str]:
+        """Stable key for a deterministic chat call, or None when the call must not be cached"""
+        if request_kwargs.get("temperature") != 0 or request_kwargs.get("stream"):
+            return None
+        payload = json.dumps([model, preferred_provider, messages, request_kwargs], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def cache_stats(self) -> Dict:
+        """Hit/miss statistics for the deterministic result cache"""
+        return self._result_cache.get_stats()
+
     def _get_current_api_key(self, provider_name: str) -> Optional[str]:
         """Get the optimal API key for a provider using intelligent load balancing"""
         config = self.providers.get(provider_name)
@@ -323,11 +558,11 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             return None
 
         api_keys = config['api_keys']
-        if not api_keys or all(key is None for key in api_keys):
+        if not self._valid_key_indices(provider_name, api_keys):
             return None
 
         # Get the best available key using intelligent selection
-        selected_index = self._select_optimal_key(provider_name)
+        selected_index = self._select_optimal_key(provider_name, config)
         if selected_index is None:
             return None
 
@@ -337,110 +572,156 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         return api_keys[selected_index]
 
-    def _select_optimal_key(self, provider_name: str) -> Optional[int]:
-        """Select the optimal API key based on load balancing and rate limiting"""
-        config = self.providers.get(provider_name)
+    def _select_optimal_key(self, provider_name: str, config: Optional[Dict] = None) -> Optional[int]:
+        """Select the optimal API key based on load balancing and rate limiting
+
+        Callers that already hold the provider's config pass it to skip the lookup.
+        """
+        if config is None:
+            config = self.providers.get(provider_name)
         if not config or not config.get('api_keys'):
             return None
 
-        api_keys = config['api_keys']
-        valid_keys = [(i, key) for i, key in enumerate(api_keys) if key is not None]
+        valid_indices = self._valid_key_indices(provider_name, config['api_keys'])
 
-        if not valid_keys:
+        if not valid_indices:
             return None
 
-        if len(valid_keys) == 1:
-            return valid_keys[0][0]
+        if len(valid_indices) == 1:
+            return valid_indices[0]
 
         # Clean up old request counts (remove requests older than 1 minute)
         self._cleanup_request_counts(provider_name)
 
-        current_time = datetime.now()
-        best_key_index = None
-        best_score = float('inf')
-
-        for key_index, _ in valid_keys:
-            key_id = f"key_{key_index}"
-
-            # Skip if key is rate limited
-            if provider_name in self.key_usage_stats:
-                key_stats = self.key_usage_stats[provider_name].get(key_id, {})
-                if key_stats.get('rate_limited', False):
+        current_time = self._now()
+        if np is not None and len(valid_indices) >= _VECTOR_SCORE_MIN_KEYS:
+            best_key_index, best_score = self._select_key_vectorized(
+                provider_name, valid_indices, current_time, config.get('key_rpm_limit')
+            )
+        else:
+            provider_key_stats = self.key_usage_stats.get(provider_name, {})
+            best_key_index = None
+            best_score = float('inf')
+
+            for key_index in valid_indices:
+                # Skip if key is rate limited
+                key_stats = provider_key_stats.get(key_index)
+                if key_stats is not None and key_stats.rate_limited:
                     # Check if rate limit cooldown has passed
-                    last_used = key_stats.get('last_used')
-                    if last_used and (current_time - last_used).total_seconds() < 60:
+                    last_used = key_stats.last_used
+                    if last_used is not None and current_time - last_used < 60:
                         continue
                     else:
                         # Reset rate limit flag
-                        key_stats['rate_limited'] = False
+                        key_stats.rate_limited = False
 
-            # Calculate load score for this key
-            score = self._calculate_key_load_score(provider_name, key_index)
+                # Calculate load score for this key
+                score = self._calculate_key_load_score(provider_name, key_index, now=current_time, provider_config=config)
 
-            if score < best_score:
-                best_score = score
-                best_key_index = key_index
+                if score < best_score:
+                    best_score = score
+                    best_key_index = key_index
 
         if best_key_index is not None and self.verbose:
-            verbose_print(f"🔑 Selected key #{best_key_index + 1} for {provider_name} (load score: {best_score:.2f})", self.verbose)
+            logger.debug("🔑 Selected key #%s for %s (load score: %.2f)", best_key_index + 1, provider_name, best_score)
 
         return best_key_index
 
-    def _calculate_key_load_score(self, provider_name: str, key_index: int) -> float:
+    def _select_key_vectorized(self, provider_name: str, valid_indices: Tuple[int, ...],
+                               current_time: float, key_rpm_limit: Optional[int] = None) -> Tuple[Optional[int], float]:
+        """NumPy version of the _select_optimal_key scan; same scores as _calculate_key_load_score"""
+        provider_key_stats = self.key_usage_stats.get(provider_name)
+        if provider_key_stats is None:
+            return valid_indices[0], 0.0
+
+        request_logs = self.key_request_count[provider_name]
+        candidates = []
+        rows = []
+        for key_index in valid_indices:
+            key_stats = provider_key_stats.get(key_index) or _UNUSED_KEY_STATS
+            if key_stats.rate_limited:
+                if key_stats.last_used is not None and current_time - key_stats.last_used < 60:
+                    continue
+                key_stats.rate_limited = False
+            candidates.append(key_index)
+            rows.append((
+                len(request_logs.get(key_index, ())),
+                key_stats.weight,
+                key_stats.requests,
+                key_stats.successes,
+                np.nan if key_stats.last_used is None else key_stats.last_used,
+            ))
+
+        if not candidates:
+            return None, float('inf')
+
+        rpm, weight, requests_, successes, last_used = np.array(rows, dtype=np.float64).T
+        time_bonus = np.where(np.isnan(last_used), 1.0, np.minimum((current_time - last_used) / 60, 1.0))
+        success_bonus = np.where(requests_ > 0, successes / np.maximum(requests_, 1.0), 1.0)
+        scores = rpm * weight - (time_bonus + success_bonus)
+
+        if key_rpm_limit:
+            scores = np.where(rpm >= key_rpm_limit, scores + _SATURATED_KEY_PENALTY, scores)
+
+        scores = np.maximum(scores, 0.0)
+        best = int(scores.argmin())
+        return candidates[best], float(scores[best])
+
+    def _calculate_key_load_score(self, provider_name: str, key_index: int, *, now: Optional[float] = None,
+                                  provider_config: Optional[Dict] = None) -> float:
         """Calculate load score for a key (lower = better)"""
-        key_id = f"key_{key_index}"
-        current_time = datetime.now()
+        current_time = self._now() if now is None else now
 
         if provider_name not in self.key_usage_stats:
             return 0.0
 
-        key_stats = self.key_usage_stats[provider_name].get(key_id, {})
+        key_stats = self.key_usage_stats[provider_name].get(key_index) or _UNUSED_KEY_STATS
 
         # Base score from recent usage
-        requests_this_minute = len(self.key_request_count[provider_name].get(key_id, []))
+        requests_this_minute = len(self.key_request_count[provider_name].get(key_index, ()))
 
         # Time since last use (encourage spreading load)
-        last_used = key_stats.get('last_used')
-        time_bonus = 0
-        if last_used:
-            seconds_since_use = (current_time - last_used).total_seconds()
-            time_bonus = min(seconds_since_use / 60, 1.0)  # Max bonus of 1.0
+        last_used = key_stats.last_used
+        if last_used is not None:
+            time_bonus = min((current_time - last_used) / 60, 1.0)  # Max bonus of 1.0
         else:
             time_bonus = 1.0  # Unused key gets full bonus
 
-        # Success rate factor
-        total_requests = key_stats.get('requests', 0)
-        successes = key_stats.get('successes', 0)
-        if total_requests > 0:
-            success_rate = successes / total_requests
-            success_bonus = success_rate
-        else:
-            success_bonus = 1.0  # Unused key gets benefit of doubt
+        # Success rate factor; an unused key gets the benefit of the doubt
+        total_requests = key_stats.requests
+        success_bonus = key_stats.successes / total_requests if total_requests > 0 else 1.0
 
         # Weight factor from previous performance
-        weight = key_stats.get('weight', 1.0)
+        weight = key_stats.weight
 
         # Calculate final score (lower is better)
         load_score = (requests_this_minute * weight) - (time_bonus + success_bonus)
 
+        # A key at its per-key RPM ceiling is only picked once every other key is saturated too
+        if provider_config is None:
+            provider_config = self.providers.get(provider_name, {})
+        key_rpm_limit = provider_config.get('key_rpm_limit')
+        if key_rpm_limit and requests_this_minute >= key_rpm_limit:
+            load_score += _SATURATED_KEY_PENALTY
+
         return max(0, load_score)
 
     def _track_key_usage(self, provider_name: str, key_index: int):
         """Track usage of a specific key and update persistent storage"""
-        key_id = f"key_{key_index}"
-        current_time = datetime.now()
+        current_time = self._now()
 
         with self._key_rotation_lock:
             # Update request count tracking
             if provider_name in self.key_request_count:
-                if key_id not in self.key_request_count[provider_name]:
-                    self.key_request_count[provider_name][key_id] = []
-                self.key_request_count[provider_name][key_id].append(current_time)
+                if key_index not in self.key_request_count[provider_name]:
+                    self.key_request_count[provider_name][key_index] = deque(maxlen=_REQUEST_LOG_MAXLEN)
+                self.key_request_count[provider_name][key_index].append(current_time)
 
             # Update usage stats
-            if provider_name in self.key_usage_stats and key_id in self.key_usage_stats[provider_name]:
-                self.key_usage_stats[provider_name][key_id]['requests'] += 1
-                self.key_usage_stats[provider_name][key_id]['last_used'] = current_time
+            if provider_name in self.key_usage_stats and key_index in self.key_usage_stats[provider_name]:
+                key_stats = self.key_usage_stats[provider_name][key_index]
+                key_stats.requests += 1
+                key_stats.last_used = current_time
 
             # Update StatisticsManager (this handles persistence automatically)
             # Note: We don't update success/failure here, that's done in _update_key_stats
@@ -450,52 +731,58 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         if provider_name not in self.key_request_count:
             return
 
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(minutes=1)
+        cutoff_time = self._now() - 60.0
 
-        for key_id in self.key_request_count[provider_name]:
-            self.key_request_count[provider_name][key_id] = [
-                timestamp for timestamp in self.key_request_count[provider_name][key_id]
-                if timestamp > cutoff_time
-            ]
+        # Timestamps are appended in order, so expired entries are always at the left
+        for timestamps in self.key_request_count[provider_name].values():
+            while timestamps and timestamps[0] <= cutoff_time:
+                timestamps.popleft()
 
-    def _update_key_stats(self, provider_name: str, key_index: int, success: bool, response_time: float = 0):
+    def _update_key_stats(self, provider_name: str, key_index: int, success: bool, response_time: float = 0,
+                          *, now: Optional[float] = None):
         """Update statistics for a specific key in both memory and persistent storage"""
-        key_id = f"key_{key_index}"
-
-        if provider_name in self.key_usage_stats and key_id in self.key_usage_stats[provider_name]:
-            key_stats = self.key_usage_stats[provider_name][key_id]
+        if provider_name in self.key_usage_stats and key_index in self.key_usage_stats[provider_name]:
+            key_stats = self.key_usage_stats[provider_name][key_index]
 
             if success:
-                key_stats['successes'] += 1
+                key_stats.successes += 1
                 # Improve weight for successful keys
-                key_stats['weight'] = max(0.5, key_stats['weight'] * 0.95)
-                key_stats['rate_limited'] = False
+                key_stats.weight = max(0.5, key_stats.weight * 0.95)
+                key_stats.rate_limited = False
             else:
-                key_stats['failures'] += 1
+                key_stats.failures += 1
                 # Increase weight (penalty) for failing keys
-                key_stats['weight'] = min(2.0, key_stats['weight'] * 1.1)
+                key_stats.weight = min(2.0, key_stats.weight * 1.1)
 
-            key_stats['last_used'] = datetime.now()
+            key_stats.last_used = self._now() if now is None else now
 
             # Update StatisticsManager with the results
             if self.stats_manager:
-                self.stats_manager.update_statistics(provider_name, key_id, success, response_time)
+                self.stats_manager.update_statistics(provider_name, f"key_{key_index}", success, response_time)
 
     def _mark_key_rate_limited(self, provider_name: str, key_index: int):
         """Mark a specific key as rate limited and update persistent storage"""
-        key_id = f"key_{key_index}"
-
-        if provider_name in self.key_usage_stats and key_id in self.key_usage_stats[provider_name]:
-            self.key_usage_stats[provider_name][key_id]['rate_limited'] = True
-            self.key_usage_stats[provider_name][key_id]['weight'] = 2.0  # Heavy penalty
+        if provider_name in self.key_usage_stats and key_index in self.key_usage_stats[provider_name]:
+            key_stats = self.key_usage_stats[provider_name][key_index]
+            key_stats.rate_limited = True
+            key_stats.weight = 2.0  # Heavy penalty
 
             # Update StatisticsManager
             if self.stats_manager:
-                self.stats_manager.mark_rate_limited(provider_name, key_id)
+                self.stats_manager.mark_rate_limited(provider_name, f"key_{key_index}")
 
             if self.verbose:
-                verbose_print(f"🔴 Key #{key_index + 1} for {provider_name} marked as rate limited", self.verbose)
+                logger.debug("🔴 Key #%s for %s marked as rate limited", key_index + 1, provider_name)
+
+    def get_flagged_providers(self) -> Dict[str, Dict]:
+        """Copy of flagged_keys with flagged_at/flag_until as wall-clock datetimes"""
+        with self._flagged_keys_lock:
+            flagged = {name: dict(info) for name, info in self.flagged_keys.items()}
+        for info in flagged.values():
+            for field in ('flagged_at', 'flag_until'):
+                if isinstance(info.get(field), float):
+                    info[field] = self._wall_from_monotonic(info[field])
+        return flagged
 
     def get_key_usage_report(self, provider_name: str) -> Dict:
         """Get detailed usage report for all keys of a provider using persistent statistics"""
@@ -508,11 +795,11 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         for i, key in enumerate(api_keys):
             if key is not None:
-                key_id = f"key_{i}"
 
                 # Get statistics from StatisticsManager
-                persistent_stats = self.stats_manager.get_statistics(provider_name, key_id) if self.stats_manager else None
-                memory_stats = self.key_usage_stats.get(provider_name, {}).get(key_id, {})
+                persistent_stats = self.stats_manager.get_statistics(provider_name, f"key_{i}") if self.stats_manager else None
+                key_stats = self.key_usage_stats.get(provider_name, {}).get(i)
+                memory_stats = asdict(key_stats) if key_stats is not None else {}
 
                 if persistent_stats:
                     # Use persistent data as base, merge with memory data
@@ -530,7 +817,8 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                     # Fall back to memory stats only
                     stats = memory_stats.copy()
 
-                requests_this_minute = len(self.key_request_count.get(provider_name, {}).get(key_id, []))
+                requests_this_minute = len(self.key_request_count.get(provider_name, {}).get(i, ()))
+                last_used = stats.get('last_used')
 
                 report[f"Key #{i + 1}"] = {
                     'total_requests': stats.get('total_requests', stats.get('requests', 0)),
@@ -539,7 +827,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                     'requests_this_minute': requests_this_minute,
                     'rate_limited': stats.get('rate_limited', False),
                     'weight': stats.get('weight', 1.0),
-                    'last_used': stats.get('last_used'),
+                    'last_used': self._wall_from_monotonic(last_used) if isinstance(last_used, float) else last_used,
                     'success_rate': (stats.get('successes', 0) / max(1, stats.get('total_requests', stats.get('requests', 1)))) * 100
                 }
 
@@ -555,12 +843,12 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             return None
 
         api_keys = config['api_keys']
-        valid_keys = [key for key in api_keys if key is not None]
+        valid_indices = self._valid_key_indices(provider_name, api_keys)
 
-        if not valid_keys:
+        if not valid_indices:
             return None
 
-        if len(valid_keys) <= 1:
+        if len(valid_indices) <= 1:
             # Only one key available, can't rotate
             return self._get_current_api_key(provider_name)
 
@@ -569,21 +857,28 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         self._mark_key_rate_limited(provider_name, current_index)
 
         # Get the best available key (excluding rate limited ones)
-        selected_index = self._select_optimal_key(provider_name)
+        selected_index = self._select_optimal_key(provider_name, config)
 
         if selected_index is not None:
             self.provider_key_rotation[provider_name] = selected_index
             if self.verbose:
-                verbose_print(f"🔄 Intelligently rotated {provider_name} to key #{selected_index + 1}", self.verbose)
+                logger.debug("🔄 Intelligently rotated %s to key #%s", provider_name, selected_index + 1)
             return api_keys[selected_index]
 
         return None
 
-    def _handle_provider_failure(self, provider_name: str, error_message: str, status_code: int = 0, response_json: dict = None):
+    def _handle_provider_failure(self, provider_name: str, error_message: str, status_code: int = 0,
+                                 response_json: dict = None, *, now: Optional[float] = None) -> str:
         """
         Enhanced provider failure handling with smart error-based responses
         Triggers different actions based on the type of error detected
+
+        ``now`` is the caller's monotonic timestamp, reused for every flag set here.
+        Returns the error classification.
         """
+        if now is None:
+            now = self._now()
+
         # Classify the error to determine appropriate response
         error_type = self._classify_error(error_message, status_code, response_json)
 
@@ -606,10 +901,10 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 self.usage_stats[provider_name]['last_failure'] = datetime.now()
 
         if self.verbose:
-            verbose_print(f"🔍 {provider_name} error classified as: {error_type}", self.verbose)
+            logger.debug("🔍 %s error classified as: %s", provider_name, error_type)
 
         # Handle different error types with specific actions
-        if error_type in ["rate_limit", "auth_error", "quota_exceeded"]:
+        if error_type in _KEY_ERRORS:
             # Mark as rate limited for automatic recovery
             rate_limit_manager.mark_rate_limited(provider_name, retry_after=60)
 
@@ -617,31 +912,33 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             if self.engine_settings.get('key_rotation_enabled', True):
                 rotated_key = self._rotate_api_key(provider_name)
                 if rotated_key and self.verbose:
-                    verbose_print(f"🔑 Rotated {provider_name} API key due to {error_type}", self.verbose)
+                    logger.debug("🔑 Rotated %s API key due to %s", provider_name, error_type)
                 # Flag the specific key temporarily
-                self._flag_key(provider_name, error_type)
+                self._flag_key(provider_name, error_type, now=now)
             else:
                 # If key rotation disabled, flag provider temporarily
-                self._flag_provider(provider_name, duration_minutes=15)
+                self._flag_provider(provider_name, duration_minutes=15, now=now)
 
-        elif error_type in ["service_unavailable", "server_error", "network_error"]:
+        elif error_type in _PROVIDER_ERRORS:
             # These errors suggest provider-level issues - flag provider temporarily
-            self._flag_provider(provider_name, duration_minutes=10)
+            self._flag_provider(provider_name, duration_minutes=10, now=now)
             if self.verbose:
-                verbose_print(f"🚫 {provider_name} temporarily flagged due to {error_type}", self.verbose)
+                logger.debug("🚫 %s temporarily flagged due to %s", provider_name, error_type)
 
         # Check if we should flag the provider due to too many consecutive failures
         failure_limit = self.engine_settings.get('consecutive_failure_limit', 5)
         if consecutive_count >= failure_limit:
-            self._flag_provider(provider_name, duration_minutes=30)
+            self._flag_provider(provider_name, duration_minutes=30, now=now)
             if self.verbose:
-                verbose_print(f"⚠️  {provider_name} flagged for 30min after {consecutive_count} consecutive failures", self.verbose)
+                logger.debug("⚠️  %s flagged for 30min after %s consecutive failures", provider_name, consecutive_count)
 
         # Try key rotation for other types of failures after 2 attempts
         elif error_type == "unknown" and self.engine_settings.get('key_rotation_enabled', True) and consecutive_count >= 2:
             rotated_key = self._rotate_api_key(provider_name)
             if rotated_key and self.verbose:
-                verbose_print(f"� Rotated {provider_name} API key after {consecutive_count} unknown failures", self.verbose)
+                logger.debug("🔄 Rotated %s API key after %s unknown failures", provider_name, consecutive_count)
+
+        return error_type
 
     def _handle_provider_success(self, provider_name: str, response_time: float):
         """Handle successful provider response"""
@@ -667,7 +964,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             if provider_name in self.flagged_keys:
                 del self.flagged_keys[provider_name]
                 if self.verbose:
-                    verbose_print(f"🟢 {provider_name} unflagged after successful response", self.verbose)
+                    logger.debug("🟢 %s unflagged after successful response", provider_name)
 
         # Reset any rate-limited keys for this provider since it's working
         self._reset_rate_limited_keys(provider_name)
@@ -676,78 +973,107 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         """Reset rate limited status for provider keys after successful request"""
         if provider_name in self.key_usage_stats:
             reset_count = 0
-            for key_id, stats in self.key_usage_stats[provider_name].items():
-                if stats.get('rate_limited', False):
-                    stats['rate_limited'] = False
+            for stats in self.key_usage_stats[provider_name].values():
+                if stats.rate_limited:
+                    stats.rate_limited = False
                     reset_count += 1
 
             if reset_count > 0 and self.verbose:
-                verbose_print(f"🔄 Reset rate limit status for {reset_count} keys in {provider_name}", self.verbose)
+                logger.debug("🔄 Reset rate limit status for %s keys in %s", reset_count, provider_name)
 
     def _check_provider_recovery(self, provider_name: str) -> bool:
         """Check if a provider should be tried (recovery check). Always returns True
         so all providers stay in rotation. Health monitor handles actual blocking."""
         return True
 
+    def _providers_by_priority(self) -> Tuple[str, ...]:
+        """Provider names sorted by static priority, cached until the provider table changes"""
+        providers = self.providers
+        cached = self._priority_order_cache
+        if cached is None or cached[0] is not providers or cached[1] != len(providers):
+            order = tuple(sorted(providers, key=lambda p: providers[p].get('priority', 999)))
+            cached = self._priority_order_cache = (providers, len(providers), order)
+        return cached[2]
+
+    def _invalidate_provider_order(self):
+        """Drop the cached priority order after priorities are edited in place"""
+        self._priority_order_cache = None
+
     def _get_preferred_provider_order(self, preferred_provider: str = None) -> List[str]:
         """
         Get provider order prioritizing preferred provider and recovery checks
         """
-        available_providers = []
+        providers = self.providers
+        preferred_ok = False
 
-        # First, add preferred provider if specified and available
-        if preferred_provider and preferred_provider in self.providers:
-            if self.providers[preferred_provider].get('enabled', True):
+        # First, check the preferred provider if specified and available
+        if preferred_provider and preferred_provider in providers:
+            if providers[preferred_provider].get('enabled', True):
                 if self._check_provider_recovery(preferred_provider):
-                    available_providers.append(preferred_provider)
+                    preferred_ok = True
                     if self.verbose:
-                        verbose_print(f"🎯 Prioritizing recovered preferred provider: {preferred_provider}", self.verbose)
-
-        # Then add other providers based on priority and recovery status
-        for provider_name, config in self.providers.items():
-            if provider_name == preferred_provider:
-                continue  # Already handled above
-
-            if not config.get('enabled', True):
-                continue
+                        logger.debug("🎯 Prioritizing recovered preferred provider: %s", preferred_provider)
+
+        # Then add other providers in (presorted) priority order
+        available_providers = [
+            provider_name for provider_name in self._providers_by_priority()
+            if provider_name != preferred_provider
+            and providers[provider_name].get('enabled', True)
+            and self._check_provider_recovery(provider_name)
+        ]
 
-            if self._check_provider_recovery(provider_name):
-                available_providers.append(provider_name)
+        if preferred_ok:
+            # Preferred provider goes ahead of others with the same priority
+            priority = providers[preferred_provider].get('priority', 999)
+            position = next(
+                (i for i, p in enumerate(available_providers) if providers[p].get('priority', 999) >= priority),
+                len(available_providers),
+            )
+            available_providers.insert(position, preferred_provider)
 
-        # Sort by priority (lower number = higher priority, used first)
-        available_providers.sort(key=lambda p: self.providers[p].get('priority', 999))
+        if self.engine_settings.get("routing") == "latency_ewma":
+            # Fastest first by EWMA latency (failures count as 10s); untried providers score 0
+            # so they get explored, with static priority breaking ties
+            def ewma_key(p):
+                ewma = latency_tracker.get_ewma_latency(p)
+                return (ewma or 0.0, self.providers[p].get('priority', 999))
+            available_providers.sort(key=ewma_key)
 
         return available_providers
 
-    def _flag_provider(self, provider_name: str, duration_minutes: int = 30):
+    def _flag_provider(self, provider_name: str, duration_minutes: int = 30, *, now: Optional[float] = None):
         """Flag a provider temporarily due to consecutive failures"""
-        flag_until = datetime.now() + timedelta(minutes=duration_minutes)
+        if now is None:
+            now = self._now()
+        flag_until = now + duration_minutes * 60
         with self._flagged_keys_lock:
             self.flagged_keys[provider_name] = {
-                'flagged_at': datetime.now(),
+                'flagged_at': now,
                 'flag_until': flag_until,
                 'reason': 'consecutive_failures'
             }
+            self._schedule_unflag(provider_name, flag_until)
 
         # Mark provider as flagged in usage stats
         with self._usage_stats_lock:
             if provider_name in self.usage_stats:
                 self.usage_stats[provider_name]['flagged'] = True
 
-    def _flag_key(self, provider_name: str, error_type: str = "unknown"):
+    def _flag_key(self, provider_name: str, error_type: str = "unknown", *, now: Optional[float] = None):
         """Flag a provider's key based on error type"""
-        current_time = datetime.now()
+        current_time = self._now() if now is None else now
 
-        if error_type in ["rate_limit", "auth_error"]:
+        if error_type in ("rate_limit", "auth_error"):
             # Flag for 1 hour for rate limits and auth errors
-            flag_until = current_time + timedelta(hours=1)
+            flag_until = current_time + 3600
         elif error_type == "daily_limit":
             # Flag until midnight for daily limits
-            tomorrow = current_time.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-            flag_until = tomorrow
+            wall_now = datetime.now()
+            tomorrow = wall_now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            flag_until = current_time + (tomorrow - wall_now).total_seconds()
         else:
             # Default: flag for 30 minutes
-            flag_until = current_time + timedelta(minutes=30)
+            flag_until = current_time + 1800
 
         with self._flagged_keys_lock:
             self.flagged_keys[provider_name] = {
@@ -756,75 +1082,42 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 'error_type': error_type,
                 'consecutive_failures': self.usage_stats.get(provider_name, {}).get('consecutive_failures', 0)
             }
+            self._schedule_unflag(provider_name, flag_until)
 
         if self.verbose:
-            duration = (flag_until - current_time).total_seconds() / 60
-            verbose_print(f"🔴 {provider_name} key flagged for {duration:.0f} minutes due to {error_type}", self.verbose)
+            duration = (flag_until - current_time) / 60
+            logger.debug("🔴 %s key flagged for %.0f minutes due to %s", provider_name, duration, error_type)
 
     def _classify_error(self, error_message: str, status_code: int, response_json: dict = None) -> str:
         """
         Enhanced error classification based on actual server responses
         Detects specific error types from API responses to trigger appropriate actions
         """
-        error_lower = error_message.lower()
-
-        # Parse JSON response for specific error details
-        error_details = ""
-        if response_json and isinstance(response_json, dict):
-            error_details = str(response_json).lower()
-
-        combined_text = f"{error_lower} {error_details}"
-
-        # Rate limiting detection (triggers key rotation)
-        rate_limit_patterns = [
-            "rate limit", "too many requests", "quota exceeded", "requests per minute",
-            "rpm exceeded", "rate limited", "throttled", "429", "rate_limit_exceeded",
-            "requests_per_minute_limit_exceeded", "rate_limit_reached"
-        ]
-        if any(pattern in combined_text for pattern in rate_limit_patterns) or status_code == 429:
+        # 429 is decided before any string work; rate limiting outranks every other category
+        if status_code == 429:
             return "rate_limit"
 
-        # Authentication errors (triggers key rotation)
-        auth_error_patterns = [
-            "invalid key", "unauthorized", "forbidden", "api key", "invalid_api_key",
-            "authentication failed", "invalid token", "access denied", "invalid_request_error",
-            "incorrect api key", "invalid_api_key", "api_key_invalid", "authentication_error"
-        ]
-        if any(pattern in combined_text for pattern in auth_error_patterns) or status_code in [401, 403]:
-            return "auth_error"
-
-        # Quota/limit errors (triggers key rotation or provider flagging)
-        quota_patterns = [
-            "daily limit", "monthly quota", "usage limit", "quota_exceeded", "insufficient_quota",
-            "billing_hard_limit_reached", "usage_limit_exceeded", "credit limit", "balance insufficient"
-        ]
-        if any(pattern in combined_text for pattern in quota_patterns):
-            return "quota_exceeded"
-
-        # Model/service unavailable (triggers provider rotation)
-        service_patterns = [
-            "model not found", "service unavailable", "model_not_found", "invalid_model",
-            "model temporarily unavailable", "service_unavailable", "model_overloaded",
-            "engine_overloaded", "server_overloaded"
-        ]
-        if any(pattern in combined_text for pattern in service_patterns) or status_code == 503:
-            return "service_unavailable"
-
-        # Server errors (triggers provider rotation)
-        if 500 <= status_code < 600:
-            return "server_error"
-
-        # Network/timeout errors (triggers provider rotation)
-        network_patterns = [
-            "timeout", "connection error", "network error", "connection timeout",
-            "read timeout", "connect timeout", "connection refused", "network_error"
-        ]
-        if any(pattern in combined_text for pattern in network_patterns):
-            return "network_error"
+        details = response_json if response_json and isinstance(response_json, dict) else None
+        details_text = None
 
-        # Bad request (do not retry or route around malformed caller input)
-        if status_code == 400 or "invalid request" in combined_text or "bad request" in combined_text:
-            return "bad_request"
+        def matches(pattern: "re.Pattern[str]") -> bool:
+            # The JSON body is stringified only if the message alone does not match
+            nonlocal details_text
+            if pattern.search(error_message):
+                return True
+            if details is None:
+                return False
+            if details_text is None:
+                details_text = str(details)
+            return pattern.search(details_text) is not None
+
+        # Walk the categories in priority order; a category wins on its status code or its first regex hit
+        status_class = _STATUS_CLASS.get(status_code)
+        if status_class is None and 500 <= status_code < 600:
+            status_class = "server_error"
+        for category, pattern in _CLASSIFY_ORDER:
+            if category == status_class or (pattern is not None and matches(pattern)):
+                return category
 
         return "unknown"
 
@@ -832,38 +1125,43 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         """Get list of available providers sorted by priority, health, and recovery status"""
         provider_order = self._get_preferred_provider_order(preferred_provider)
 
+        # Bind lookups once; this loop runs for every provider on every request
+        providers = self.providers
+        is_healthy = health_cache.is_healthy
+        is_available = rate_limit_manager.is_available
+        verbose = self.verbose
+
         available = []
+        enabled = []
         for provider_name in provider_order:
-            if provider_name in self.providers:
-                config = self.providers[provider_name]
-                if config.get('enabled', True):
-                    # Check health monitor status
-                    if not health_monitor.is_provider_healthy(provider_name):
-                        if self.verbose:
-                            verbose_print(f"⚠️ Skipping {provider_name} - unhealthy", self.verbose)
-                        continue
+            config = providers.get(provider_name)
+            if config is None or not config.get('enabled', True):
+                continue
+            enabled.append((provider_name, config))
 
-                    # Check rate limit status
-                    if not rate_limit_manager.is_available(provider_name):
-                        if self.verbose:
-                            verbose_print(f"⚠️ Skipping {provider_name} - rate limited", self.verbose)
-                        continue
+            # Check health status (short-TTL cache; a new check invalidates it)
+            if not is_healthy(provider_name):
+                if verbose:
+                    logger.debug("⚠️ Skipping %s - unhealthy", provider_name)
+                continue
+
+            # Check rate limit status
+            if not is_available(provider_name):
+                if verbose:
+                    logger.debug("⚠️ Skipping %s - rate limited", provider_name)
+                continue
 
-                    available.append((provider_name, config))
+            available.append((provider_name, config))
 
         # If all providers are unavailable, try anyway (last resort - try all enabled providers)
         if not available:
-            for provider_name in provider_order:
-                if provider_name in self.providers:
-                    config = self.providers[provider_name]
-                    if config.get('enabled', True):
-                        available.append((provider_name, config))
-            if available and self.verbose:
-                verbose_print(f"⚠️ All providers unavailable, trying {len(available)} as last resort", self.verbose)
+            available = enabled
+            if available and verbose:
+                logger.debug("⚠️ All providers unavailable, trying %s as last resort", len(available))
 
         return available
 
-    def _update_stats(self, provider_name: str, success: bool, response_time: float):
+    def _update_stats(self, provider_name: str, success: bool, response_time: float, *, now: Optional[float] = None):
         """Update usage statistics for a provider and current key"""
         stats = self.usage_stats[provider_name]
         stats['requests'] += 1
@@ -872,7 +1170,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         # Update key-specific stats
         current_key_index = self.provider_key_rotation.get(provider_name, 0)
-        self._update_key_stats(provider_name, current_key_index, success, response_time)
+        self._update_key_stats(provider_name, current_key_index, success, response_time, now=now)
 
         if success:
             stats['successes'] += 1
@@ -883,7 +1181,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
             # Auto-flag after 5 consecutive failures (don't auto-disable — keep available)
             if stats['consecutive_failures'] >= 5:
-                self._flag_key(provider_name, "consecutive_failures")
+                self._flag_key(provider_name, "consecutive_failures", now=now)
 
     # =============================================
     # AUTODECIDE FEATURE METHODS
@@ -1042,7 +1340,8 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
     def _discover_model_providers(self, requested_model: str) -> List[Tuple[str, str]]:
         """Discover which providers have the requested model using shared cache"""
-        verbose_print(f"🔍 Discovering providers for model: {requested_model}", self.verbose)
+        if self.verbose:
+            verbose_print(f"🔍 Discovering providers for model: {requested_model}", self.verbose)
 
         # Store the requested model for discovery function
         self._current_requested_model = requested_model
@@ -1053,7 +1352,8 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         if shared_model_cache.is_cache_valid():
             providers_with_model = shared_model_cache.find_providers_for_model(requested_model)
-            verbose_print(f"� Found {len(providers_with_model)} providers for {requested_model} from shared cache", self.verbose)
+            if self.verbose:
+                verbose_print(f"📦 Found {len(providers_with_model)} providers for {requested_model} from shared cache", self.verbose)
             return providers_with_model
 
         # Fallback to manual discovery if no shared cache
@@ -1072,9 +1372,12 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 result = loop.run_until_complete(self._discover_and_cache_models())
                 return result
             finally:
+                # The aiohttp session is bound to this loop; release it before the loop closes
+                loop.run_until_complete(self._close_aio_session())
                 loop.close()
         except Exception as e:
-            verbose_print(f"❌ Error in model discovery: {e}", self.verbose)
+            if self.verbose:
+                verbose_print(f"❌ Error in model discovery: {e}", self.verbose)
             return []
 
     async def _discover_and_cache_models(self) -> List[Tuple[str, str]]:
@@ -1087,85 +1390,50 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 verbose_print("❌ No enabled providers found for model discovery", self.verbose)
                 return []
 
-            verbose_print(f"🔍 Discovering models from {len(enabled_providers)} providers...", self.verbose)
-
-            def discover_provider_models_sync(provider_name):
-                """Synchronous wrapper for provider model discovery"""
-                try:
-                    config = enabled_providers[provider_name]
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        models_response = loop.run_until_complete(self._discover_provider_models_internal(provider_name, config))
-                        return models_response
-                    finally:
-                        loop.close()
-                except Exception as e:
-                    verbose_print(f"❌ Error discovering models for {provider_name}: {e}", self.verbose)
-                    return None
+            if self.verbose:
+                verbose_print(f"🔍 Discovering models from {len(enabled_providers)} providers...", self.verbose)
 
-            # Use threading for faster model discovery
-            max_workers = min(len(enabled_providers), 8)
+            # Add providers without model discovery immediately
+            discoverable = []
+            for provider_name, config in enabled_providers.items():
+                if config.get('model_endpoint'):
+                    discoverable.append((provider_name, config))
+                else:
+                    current_model = config.get('model', 'unknown')
+                    all_models.append(f"{provider_name}|{current_model}")
+
+            # All providers share one pooled session and run concurrently on this loop
+            session = await self._get_session()
+            responses = await asyncio.gather(
+                *(self._discover_provider_models_internal(name, config, session=session) for name, config in discoverable),
+                return_exceptions=True,
+            )
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all discovery tasks
-                future_to_provider = {
-                    executor.submit(discover_provider_models_sync, provider_name): (provider_name, config)
-                    for provider_name, config in enabled_providers.items()
-                    if config.get('model_endpoint')  # Only for providers with model discovery
-                }
+            from core.model_cache import format_cache_entry
 
-                # Add providers without model discovery immediately
-                for provider_name, config in enabled_providers.items():
-                    if not config.get('model_endpoint'):
-                        current_model = config.get('model', 'unknown')
-                        all_models.append(f"{provider_name}|{current_model}")
+            for (provider_name, config), models_response in zip(discoverable, responses):
+                if isinstance(models_response, BaseException):
+                    if self.verbose:
+                        verbose_print(f"❌ Error processing {provider_name}: {models_response}", self.verbose)
+                    models_response = None
+
+                if models_response and 'models' in models_response:
+                    provider_models = models_response['models']
+                    for model in provider_models:
+                        entry = format_cache_entry(provider_name, model)
+                        if entry:
+                            all_models.append(entry)
+                    if self.verbose:
+                        verbose_print(f"✅ {provider_name}: discovered {len(provider_models)} models", self.verbose)
+                else:
+                    # Fallback to current configured model if discovery fails
+                    current_model = config.get('model', 'unknown')
+                    all_models.append(f"{provider_name}|{current_model}")
+                    if self.verbose:
+                        verbose_print(f"⚠️ {provider_name}: fallback to default model", self.verbose)
 
-                # Collect results with timeout handling
-                try:
-                    for future in concurrent.futures.as_completed(future_to_provider, timeout=60):
-                        provider_name, config = future_to_provider[future]
-                        try:
-                            models_response = future.result(timeout=20)
-
-                            if models_response and 'models' in models_response:
-                                provider_models = models_response['models']
-
-                                # Add models to the response
-                                from core.model_cache import format_cache_entry
-
-                                for model in provider_models:
-                                    entry = format_cache_entry(provider_name, model)
-                                    if entry:
-                                        all_models.append(entry)
-                                verbose_print(f"✅ {provider_name}: discovered {len(provider_models)} models", self.verbose)
-                            else:
-                                # Fallback to current configured model if discovery fails
-                                current_model = config.get('model', 'unknown')
-                                all_models.append(f"{provider_name}|{current_model}")
-                                verbose_print(f"⚠️ {provider_name}: fallback to default model", self.verbose)
-
-                        except Exception as e:
-                            verbose_print(f"❌ Error processing {provider_name}: {e}", self.verbose)
-                            # Fallback to current model
-                            current_model = config.get('model', 'unknown')
-                            all_models.append(f"{provider_name}|{current_model}")
-
-                except concurrent.futures.TimeoutError:
-                    # Handle unfinished futures
-                    unfinished_count = 0
-                    for future in future_to_provider:
-                        if not future.done():
-                            provider_name, config = future_to_provider[future]
-                            verbose_print(f"⏰ Timeout: {provider_name} - using fallback", self.verbose)
-                            # Cancel and add fallback
-                            future.cancel()
-                            current_model = config.get('model', 'unknown')
-                            all_models.append(f"{provider_name}|{current_model}")
-                            unfinished_count += 1
-                    verbose_print(f"⚠️ {unfinished_count} providers timed out, used fallbacks", self.verbose)
-
-            verbose_print(f"✅ Model discovery completed. Found {len(all_models)} models total.", self.verbose)
+            if self.verbose:
+                verbose_print(f"✅ Model discovery completed. Found {len(all_models)} models total.", self.verbose)
 
             # Cache the discovered models
             shared_model_cache.save_cache(all_models)
@@ -1178,10 +1446,12 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             return []
 
         except Exception as e:
-            verbose_print(f"❌ Error in model discovery: {e}", self.verbose)
+            if self.verbose:
+                verbose_print(f"❌ Error in model discovery: {e}", self.verbose)
             return []
 
-    async def _discover_provider_models_internal(self, provider_name: str, config: Dict[str, Any]) -> Optional[Dict]:
+    async def _discover_provider_models_internal(self, provider_name: str, config: Dict[str, Any],
+                                                 session: Optional[aiohttp.ClientSession] = None) -> Optional[Dict]:
         """Internal method to discover models from a specific provider"""
         model_endpoint = config.get('model_endpoint')
         if not model_endpoint:
@@ -1214,37 +1484,40 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         try:
             timeout = aiohttp.ClientTimeout(total=min(config.get('timeout', 60), 20))
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(request_url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-
-                        raw_models: list = []
-                        if isinstance(data, dict):
-                            if 'data' in data and isinstance(data['data'], list):
-                                raw_models = data['data']
-                            elif 'models' in data and isinstance(data['models'], list):
-                                raw_models = data['models']
-                            else:
-                                raw_models = []
-                        elif isinstance(data, list):
-                            raw_models = data
-
-                        from core.model_cache import normalize_discovered_model_id
-
-                        clean_models: list[str] = []
-                        for model in raw_models:
-                            model_id = normalize_discovered_model_id(model)
-                            if model_id and model_id not in clean_models:
-                                clean_models.append(model_id)
-
-                        return {"models": clean_models}
-                    else:
+            if session is None:
+                session = await self._get_session()
+            async with session.get(request_url, headers=headers, timeout=timeout) as response:
+                if response.status == 200:
+                    data = await response.json()
+
+                    raw_models: list = []
+                    if isinstance(data, dict):
+                        if 'data' in data and isinstance(data['data'], list):
+                            raw_models = data['data']
+                        elif 'models' in data and isinstance(data['models'], list):
+                            raw_models = data['models']
+                        else:
+                            raw_models = []
+                    elif isinstance(data, list):
+                        raw_models = data
+
+                    from core.model_cache import normalize_discovered_model_id
+
+                    clean_models: list[str] = []
+                    for model in raw_models:
+                        model_id = normalize_discovered_model_id(model)
+                        if model_id and model_id not in clean_models:
+                            clean_models.append(model_id)
+
+                    return {"models": clean_models}
+                else:
+                    if self.verbose:
                         verbose_print(f"❌ {provider_name}: HTTP {response.status}", self.verbose)
-                        return None
+                    return None
 
         except Exception as e:
-            verbose_print(f"❌ {provider_name}: {str(e)}", self.verbose)
+            if self.verbose:
+                verbose_print(f"❌ {provider_name}: {str(e)}", self.verbose)
             return None
 
     def _select_best_provider(self, available_providers: List[Tuple[str, str]]) -> Tuple[str, str]:
@@ -1253,14 +1526,16 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             return None, None
 
         # Filter out flagged providers first
+        now = self._now()
+        self._expire_flags(now)
         working_providers = [
             (provider_name, model_name) for provider_name, model_name in available_providers
-            if not self._is_key_flagged(provider_name)
+            if not self._is_key_flagged(provider_name, now=now)
         ]
 
         if not working_providers:
             if self.verbose:
-                verbose_print("⚠️ All providers are flagged, falling back to any available provider", self.verbose)
+                logger.debug("⚠️ All providers are flagged, falling back to any available provider")
             working_providers = available_providers
 
         # Sort by multiple criteria:
@@ -1312,13 +1587,13 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         if self.verbose:
             health_data = health_monitor.get_provider_health(best_provider_name)
-            verbose_print(f"🎯 Selected {best_provider_name} (health: {health_data.get('status', 'unknown')}, uptime: {health_data.get('uptime_percent', 0):.1f}%)", self.verbose)
+            logger.debug("🎯 Selected %s (health: %s, uptime: %.1f%%)", best_provider_name, health_data.get('status', 'unknown'), health_data.get('uptime_percent', 0))
 
             # Show alternatives if there are any
             if len(sorted_providers) > 1:
                 alternatives = sorted_providers[1:4]
                 alt_info = ", ".join([f"{p}" for p, m in alternatives])
-                verbose_print(f"🔄 Alternatives: {alt_info}", self.verbose)
+                logger.debug("🔄 Alternatives: %s", alt_info)
 
         return best_provider_name, best_model_name
 
@@ -1334,47 +1609,85 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         """Make a provider request, rotating API keys on auth/rate-limit failures with exponential backoff."""
         from core.provider_reliability import get_retry_policy
 
-        api_keys = provider_config.get("api_keys", [])
-        valid_keys = [key for key in api_keys if key is not None]
+        valid_indices = self._valid_key_indices(provider_name, provider_config.get("api_keys") or [])
         policy = get_retry_policy(provider_name)
         if max_attempts is None:
-            max_attempts = max(1, min(len(valid_keys), policy.retries))
+            max_attempts = max(1, min(len(valid_indices), policy.retries))
 
+        # Cap in-flight requests per provider so concurrent callers queue locally instead of tripping 429s
+        max_wait = self.engine_settings.get("rate_limit_max_wait", 5.0)
+        slot = self._provider_slot(provider_name, provider_config)
+        if not slot.acquire(timeout=max_wait):
+            return RequestResult(
+                success=False,
+                error_message=f"Too many in-flight requests to {provider_name}",
+                error_type="rate_limit",
+                provider_used=provider_name,
+            )
+        try:
+            # Shape to the provider's documented RPM before sending rather than learning from a 429
+            if not rate_limit_manager.acquire(provider_name, provider_config.get("rpm_limit"), timeout=max_wait):
+                return RequestResult(
+                    success=False,
+                    error_message=f"Local RPM budget for {provider_name} exhausted",
+                    error_type="rate_limit",
+                    provider_used=provider_name,
+                )
+            return self._attempt_with_backoff(provider_name, provider_config, messages, model, max_attempts, policy, **kwargs)
+        finally:
+            slot.release()
+
+    def _provider_slot(self, provider_name: str, provider_config: Dict) -> threading.BoundedSemaphore:
+        """Per-provider concurrency limiter sized from the provider's max_concurrent setting"""
+        slot = self._provider_slots.get(provider_name)
+        if slot is None:
+            with self._key_rotation_lock:
+                slot = self._provider_slots.get(provider_name)
+                if slot is None:
+                    limit = provider_config.get("max_concurrent") or self.engine_settings.get("provider_max_concurrent", 32)
+                    slot = self._provider_slots[provider_name] = threading.BoundedSemaphore(max(1, int(limit)))
+        return slot
+
+    def _attempt_with_backoff(self, provider_name: str, provider_config: Dict, messages: List[Dict[str, str]],
+                              model: Optional[str], max_attempts: int, policy, **kwargs) -> RequestResult:
+        """Attempt loop of _request_with_key_rotation; runs while holding the provider slot"""
         last_result = None
         for attempt in range(max_attempts):
             if attempt > 0:
                 delay = policy.compute_delay(attempt - 1)
                 if self.verbose:
-                    verbose_print(f"⏳ Backoff {delay:.1f}s before retry #{attempt} for {provider_name}", self.verbose)
+                    logger.debug("⏳ Backoff %.1fs before retry #%s for %s", delay, attempt, provider_name)
                 time.sleep(delay)
 
-            start_time = time.time()
+            # One clock read after the response is shared by the stats and failure bookkeeping below
+            start_time = self._now()
             try:
                 result = self._make_request(provider_name, provider_config, messages, model, **kwargs)
-                response_time = time.time() - start_time
-                self._update_stats(provider_name, result.success, response_time)
+                now = self._now()
+                response_time = now - start_time
+                self._update_stats(provider_name, result.success, response_time, now=now)
 
                 if result.success:
-                    result.provider_used = provider_name
-                    result.response_time = response_time
+                    result = replace(result, provider_used=provider_name, response_time=response_time)
                     self._handle_provider_success(provider_name, response_time)
                     backoff_tracker.reset(provider_name)
                     return result
 
                 last_result = result
-                error_type = self._classify_error(result.error_message, result.status_code)
-                self._handle_provider_failure(
+                error_type = self._handle_provider_failure(
                     provider_name,
                     result.error_message,
                     result.status_code,
+                    now=now,
                 )
 
-                if error_type not in ("rate_limit", "auth_error", "quota_exceeded"):
+                if error_type not in _KEY_ERRORS:
                     break
             except Exception as e:
-                response_time = time.time() - start_time
-                self._update_stats(provider_name, False, response_time)
-                self._handle_provider_failure(provider_name, str(e), 0, None)
+                now = self._now()
+                response_time = now - start_time
+                self._update_stats(provider_name, False, response_time, now=now)
+                self._handle_provider_failure(provider_name, str(e), 0, None, now=now)
                 last_result = RequestResult(
                     success=False,
                     error_message=str(e),
@@ -1385,9 +1698,8 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 break
 
         if last_result:
-            last_result.provider_used = provider_name
             backoff_tracker.record_attempt(provider_name)
-            return last_result
+            return replace(last_result, provider_used=provider_name)
 
         return RequestResult(
             success=False,
@@ -1424,12 +1736,22 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             ... )
             >>> print(result.content)
         """
-        start_time = time.time()  # Track total request time
+        start_time = self._now()  # Track total request time (monotonic)
         preferred_provider = kwargs.get('preferred_provider') or kwargs.get('provider')
         force_provider = kwargs.get('force_provider', False) or bool(kwargs.get('provider'))
         use_cache = kwargs.get('use_cache', True)  # Option to bypass cache
         request_kwargs = {k: v for k, v in kwargs.items() if k not in _CHAT_ROUTING_KWARGS}
 
+        # Deterministic calls are answered from the in-process LRU before any routing
+        result_cache_key = (
+            self._result_cache_key(messages, model, preferred_provider, request_kwargs)
+            if use_cache and not force_provider else None
+        )
+        if result_cache_key is not None:
+            cached_result = self._result_cache.get(result_cache_key)
+            if cached_result is not None:
+                return cached_result
+
         # Check cache first (if enabled)
         if use_cache and not force_provider:
             try:
@@ -1437,7 +1759,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 cached = response_cache.get(messages, model or "auto", preferred_provider)
                 if cached:
                     if self.verbose:
-                        verbose_print("📦 Cache hit - returning cached response", self.verbose)
+                        logger.debug("📦 Cache hit - returning cached response")
                     return RequestResult(
                         success=True,
                         content=cached.get("content", ""),
@@ -1457,10 +1779,10 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 model = model_part
                 force_provider = True  # Force the specified provider
                 if self.verbose:
-                    verbose_print(f"🎯 Parsed provider-specific request: {provider_part}/{model_part}", self.verbose)
+                    logger.debug("🎯 Parsed provider-specific request: %s/%s", provider_part, model_part)
             else:
                 if self.verbose:
-                    verbose_print(f"⚠️ Unknown provider in '{original_model}', treating as model name", self.verbose)
+                    logger.debug("⚠️ Unknown provider in '%s', treating as model name", original_model)
 
         # If force_provider is True and preferred_provider is specified, only use that provider
         if force_provider and preferred_provider:
@@ -1482,42 +1804,37 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             if self._is_key_flagged(preferred_provider):
                 # For forced provider, we'll try anyway but warn
                 if self.verbose:
-                    verbose_print(f"⚠️ Forcing flagged provider: {preferred_provider}", self.verbose)
+                    logger.debug("⚠️ Forcing flagged provider: %s", preferred_provider)
 
             provider_config = self.providers[preferred_provider]
 
             try:
                 if self.verbose:
-                    verbose_print(f"🔒 Force using provider: {preferred_provider} with model: {model or 'default'}", self.verbose)
+                    logger.debug("🔒 Force using provider: %s with model: %s", preferred_provider, model or 'default')
 
+                # Transient gateway errors were already retried on the pooled connection (see build_http_session)
                 result = self._request_with_key_rotation(
                     preferred_provider, provider_config, messages, model, **request_kwargs
                 )
                 self.current_provider = preferred_provider
 
                 if result.success and self.verbose:
-                    verbose_print(
-                        f"✅ Forced provider {preferred_provider} successful ({result.response_time:.2f}s)",
-                        self.verbose,
-                    )
+                    logger.debug("✅ Forced provider %s successful (%.2fs)", preferred_provider, result.response_time)
                 elif not result.success and self.verbose:
-                    verbose_print(
-                        f"❌ Forced provider {preferred_provider} failed: {result.error_message}",
-                        self.verbose,
-                    )
+                    logger.debug("❌ Forced provider %s failed: %s", preferred_provider, result.error_message)
 
                 return result
 
             except Exception as e:
                 error_msg = f"Exception with forced provider {preferred_provider}: {str(e)}"
                 if self.verbose:
-                    verbose_print(f"❌ {error_msg}", self.verbose)
+                    logger.debug("❌ %s", error_msg)
                 return RequestResult(
                     success=False,
                     error_message=error_msg,
                     error_type="provider_exception",
                     provider_used=preferred_provider,
-                    response_time=time.time() - start_time
+                    response_time=self._now() - start_time
                 )
 
         # AUTODECIDE FEATURE: If enabled and model is specified, try to find best provider
@@ -1534,13 +1851,16 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 if best_provider:
                     preferred_provider = best_provider
                     model = actual_model  # Use the exact model name from the provider
-                    verbose_print(f"🤖 Autodecide selected {best_provider} with model '{actual_model}'", self.verbose)
+                    if self.verbose:
+                        logger.debug("🤖 Autodecide selected %s with model '%s'", best_provider, actual_model)
                 else:
                     # All providers are flagged/unavailable - continue to fallback
-                    verbose_print(f"⚠️ All providers for '{model}' are flagged, falling back to any provider", self.verbose)
+                    if self.verbose:
+                        logger.debug("⚠️ All providers for '%s' are flagged, falling back to any provider", model)
             else:
                 # No providers found for the requested model - continue to fallback
-                verbose_print(f"⚠️ Model '{model}' not in cache, trying any available provider", self.verbose)
+                if self.verbose:
+                    logger.debug("⚠️ Model '%s' not in cache, trying any available provider", model)
 
         # If a preferred provider is specified, try it first
         if preferred_provider:
@@ -1549,7 +1869,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
                 try:
                     if self.verbose:
-                        verbose_print(f"🎯 Using preferred provider: {preferred_provider}", self.verbose)
+                        logger.debug("🎯 Using preferred provider: %s", preferred_provider)
 
                     result = self._request_with_key_rotation(
                         preferred_provider, provider_config, messages, model, **request_kwargs
@@ -1557,16 +1877,18 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
                     if result.success:
                         self.current_provider = preferred_provider
+                        if result_cache_key is not None and self._honors_temperature(provider_config):
+                            self._result_cache.set(result_cache_key, result)
                         return result
                     else:
                         if self.verbose:
-                            verbose_print(f"❌ Preferred provider {preferred_provider} failed: {result.error_message}", self.verbose)
+                            logger.debug("❌ Preferred provider %s failed: %s", preferred_provider, result.error_message)
                 except Exception as e:
                     if self.verbose:
-                        verbose_print(f"❌ Exception with preferred provider {preferred_provider}: {e}", self.verbose)
+                        logger.debug("❌ Exception with preferred provider %s: %s", preferred_provider, e)
             else:
                 if self.verbose:
-                    verbose_print(f"⚠️ Preferred provider {preferred_provider} not available or flagged", self.verbose)
+                    logger.debug("⚠️ Preferred provider %s not available or flagged", preferred_provider)
 
         # Fall back to normal provider rotation with recovery awareness
         available_providers = self._get_available_providers(preferred_provider)
@@ -1589,7 +1911,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         for provider_name, provider_config in available_providers:
             try:
                 if self.verbose:
-                    verbose_print(f"🔄 Trying {provider_name}...", self.verbose)
+                    logger.debug("🔄 Trying %s...", provider_name)
 
                 result = self._request_with_key_rotation(
                     provider_name, provider_config, messages, model, **request_kwargs
@@ -1598,6 +1920,9 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 if result.success:
                     self.current_provider = provider_name
 
+                    if result_cache_key is not None and self._honors_temperature(provider_config):
+                        self._result_cache.set(result_cache_key, result)
+
                     if use_cache:
                         try:
                             from response_cache import response_cache
@@ -1612,14 +1937,14 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                     return result
                 else:
                     if self.verbose:
-                        verbose_print(f"❌ {provider_name} failed: {result.error_message}", self.verbose)
+                        logger.debug("❌ %s failed: %s", provider_name, result.error_message)
                     last_errors.append(f"{provider_name}: {result.error_message}")
                     continue
 
             except Exception as e:
                 self._handle_provider_failure(provider_name, str(e), 0, None)
                 if self.verbose:
-                    verbose_print(f"💥 {provider_name} exception: {str(e)}")
+                    logger.debug("💥 %s exception: %s", provider_name, str(e))
                 last_errors.append(f"{provider_name}: {str(e)[:80]}")
                 continue
 
@@ -1631,6 +1956,145 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             error_type="all_failed"
         )
 
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        """Return the semaphore bounding concurrent async completions"""
+        if self._async_semaphore is None:
+            limit = max(1, int(self.engine_settings.get("max_concurrency", 8)))
+            self._async_semaphore = asyncio.Semaphore(limit)
+        return self._async_semaphore
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the engine's keep-alive aiohttp session for the running loop, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        session = self._aio_session
+        if session is None or session.closed or self._aio_session_loop is not loop:
+            if session is not None and not session.closed:
+                await self._close_stale_aio_session(session, self._aio_session_loop)
+            pool = self.engine_settings.get("http_pool", {})
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=32,
+                ttl_dns_cache=300,
+                keepalive_timeout=pool.get("keepalive_timeout", 75),
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=60),
+                headers={'User-Agent': 'AI-Engine/3.0'},
+            )
+            self._aio_session = session
+            self._aio_session_loop = loop
+        return session
+
+    @staticmethod
+    async def _close_stale_aio_session(session: aiohttp.ClientSession, session_loop):
+        """Close a session left behind by another event loop so its connector does not leak"""
+        if session_loop is not None and session_loop.is_running():
+            # Still serving another thread's loop; let that loop run the close
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+            return
+        try:
+            await session.close()
+        except Exception as e:
+            logger.debug("Closing stale aiohttp session failed: %s", e)
+
+    async def _close_aio_session(self):
+        session, self._aio_session, self._aio_session_loop = self._aio_session, None, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def aclose(self):
+        """Async shutdown: close the aiohttp session and any HTTP pool this engine owns"""
+        await self._close_aio_session()
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        return False
+
+    async def chat_completion_async(self, messages: List[Dict[str, str]], model: str = None,
+                                    race_k: Optional[int] = None, **kwargs) -> RequestResult:
+        """
+        Async variant of chat_completion.
+
+        Runs the full provider-failover loop off the event loop so many requests can
+        overlap their network waits. Concurrency is capped by ENGINE_SETTINGS["max_concurrency"].
+        race_k > 1 races that many top providers for this call (defaults to ENGINE_SETTINGS["hedge_k"]).
+        """
+        hedge_k = int(race_k if race_k is not None else self.engine_settings.get("hedge_k", 1))
+        async with self._get_async_semaphore():
+            if hedge_k > 1 and not _CHAT_ROUTING_KWARGS.intersection(kwargs) and not (model and '/' in model):
+                return await self._hedged_dispatch(messages, model, k=hedge_k, **kwargs)
+            return await asyncio.to_thread(self.chat_completion, messages, model, **kwargs)
+
+    # Conventional a-prefixed name, pairs with aclose()
+    achat_completion = chat_completion_async
+
+    async def _hedged_dispatch(self, messages: List[Dict[str, str]], model: str = None, k: int = 2,
+                               delay_ms: float = None, **kwargs) -> RequestResult:
+        """
+        Race the top-k available providers and return the first success.
+
+        The primary starts immediately; each backup starts after delay_ms, or at once
+        when an in-flight attempt fails. Losing attempts are abandoned once a winner
+        returns (their worker threads finish in the background).
+        """
+        if delay_ms is None:
+            delay_ms = self.engine_settings.get("hedge_delay_ms", 150)
+        candidates = self._get_available_providers()[:max(1, k)]
+        if not candidates:
+            return _NO_PROVIDERS_RESULT
+
+        def launch(provider_name: str, provider_config: Dict) -> asyncio.Task:
+            return asyncio.ensure_future(asyncio.to_thread(
+                self._request_with_key_rotation, provider_name, provider_config, messages, model, **kwargs
+            ))
+
+        pending_candidates = list(candidates)
+        in_flight = {launch(*pending_candidates.pop(0))}
+        last_errors = []
+        try:
+            while in_flight:
+                timeout = delay_ms / 1000 if pending_candidates else None
+                done, in_flight = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        # A crashed attempt counts as a failure, the race goes on
+                        last_errors.append(f"{type(e).__name__}: {e}")
+                        continue
+                    if result.success:
+                        winner = winner or result
+                    else:
+                        last_errors.append(f"{result.provider_used}: {result.error_message}")
+                if winner is not None:
+                    self.current_provider = winner.provider_used
+                    return winner
+                if pending_candidates:  # hedge delay elapsed or an attempt failed
+                    in_flight.add(launch(*pending_candidates.pop(0)))
+        finally:
+            for task in in_flight:
+                task.cancel()
+            # Reap the losers so no cancellation or exception goes unobserved
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+        return RequestResult(
+            success=False,
+            error_message=f"All {len(candidates)} hedged providers failed. Last errors: {'; '.join(last_errors[-3:])}",
+            error_type="all_failed"
+        )
+
+    async def chat_completion_many_async(self, batch: List[List[Dict[str, str]]], model: str = None, **kwargs) -> List[RequestResult]:
+        """Run several conversations concurrently; results are returned in input order"""
+        return list(await asyncio.gather(
+            *(self.chat_completion_async(messages, model, **kwargs) for messages in batch)
+        ))
+
     def test_specific_provider(self, provider_name: str, test_message: str = None) -> RequestResult:
         """
         Test a specific provider directly, bypassing priority selection
@@ -1649,7 +2113,7 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             flag_info = self.flagged_keys[provider_name]
             return RequestResult(
                 success=False,
-                error_message=f"Provider '{provider_name}' is currently flagged due to {flag_info['error_type']}. Retry available at {flag_info['flag_until'].strftime('%H:%M:%S')}",
+                error_message=f"Provider '{provider_name}' is currently flagged due to {flag_info.get('error_type', flag_info.get('reason'))}. Retry available at {self._wall_from_monotonic(flag_info['flag_until']).strftime('%H:%M:%S')}",
                 error_type="provider_flagged"
             )
 
@@ -1660,21 +2124,21 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
         messages = [{"role": "user", "content": test_message}]
 
         # Test the specific provider
-        start_time = time.time()
+        start_time = self._now()
 
         try:
             if self.verbose:
                 verbose_print(f"🧪 Testing {provider_name} specifically...", self.verbose)
 
             result = self._make_request(provider_name, provider_config, messages)
-            response_time = time.time() - start_time
+            now = self._now()
+            response_time = now - start_time
 
             # Update stats
-            self._update_stats(provider_name, result.success, response_time)
+            self._update_stats(provider_name, result.success, response_time, now=now)
 
             if result.success:
-                result.provider_used = provider_name
-                result.response_time = response_time
+                result = replace(result, provider_used=provider_name, response_time=response_time)
 
                 if self.verbose:
                     verbose_print(f"✅ {provider_name} test successful ({response_time:.2f}s)")
@@ -1682,8 +2146,8 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 # Handle errors and flagging
                 error_type = self._classify_error(result.error_message, result.status_code)
 
-                if error_type in ["rate_limit", "daily_limit", "auth_error"]:
-                    self._flag_key(provider_name, error_type)
+                if error_type in ("rate_limit", "daily_limit", "auth_error"):
+                    self._flag_key(provider_name, error_type, now=now)
 
                 if self.verbose:
                     verbose_print(f"❌ {provider_name} test failed: {result.error_message}", self.verbose)
@@ -1691,8 +2155,9 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
             return result
 
         except Exception as e:
-            response_time = time.time() - start_time
-            self._update_stats(provider_name, False, response_time)
+            now = self._now()
+            response_time = now - start_time
+            self._update_stats(provider_name, False, response_time, now=now)
 
             if self.verbose:
                 verbose_print(f"💥 {provider_name} exception: {str(e)}")
@@ -1704,6 +2169,11 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
                 response_time=response_time
             )
 
+    def count_tokens(self, text: str, model: str = None) -> int:
+        """Count tokens with the cached encoder for the model (estimate if tiktoken is absent)"""
+        from core.tokenizer import count_tokens
+        return count_tokens(text, model)
+
     def save_statistics_now(self):
         """Manually save current statistics to persistent storage"""
         save_statistics_now()
@@ -1754,6 +2224,100 @@ class AI_engine(ProviderRequestMixin, StressTestMixin, StreamingMixin):
 
         return status
 
+    def prewarm_connections(self, timeout: float = 2.0) -> int:
+        """Seed the session pool with a HEAD to each provider host; returns hosts reached"""
+        from urllib.parse import urlsplit
+
+        origins = set()
+        for config in self.providers.values():
+            parts = urlsplit(config.get("endpoint") or "")
+            if parts.scheme in ("http", "https") and parts.netloc:
+                origins.add(f"{parts.scheme}://{parts.netloc}/")
+        if not origins:
+            return 0
+
+        def warm(origin: str) -> bool:
+            try:
+                self._http_session.head(origin, timeout=timeout, allow_redirects=False)
+                return True
+            except requests.RequestException:
+                return False
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(origins))) as pool:
+            reached = sum(pool.map(warm, origins))
+        if self.verbose:
+            verbose_print(f"🔥 Pre-warmed connections to {reached}/{len(origins)} provider hosts", self.verbose)
+        return reached
+
+    def _validate_provider(self, provider_name: str, config: dict, timeout: float) -> Tuple[bool, Optional[int], Optional[str]]:
+        """Probe one provider's models endpoint; returns (ok, status_code, error)"""
+        headers = {}
+        if config.get('model_endpoint_auth', False):
+            valid_keys = [key for key in config.get('api_keys', []) if key is not None]
+            if valid_keys:
+                auth_type = config.get('auth_type', 'bearer')
+                if auth_type == 'bearer':
+                    headers['Authorization'] = f'Bearer {valid_keys[0]}'
+                elif auth_type == 'bearer_lowercase':
+                    headers['authorization'] = f'Bearer {valid_keys[0]}'
+        try:
+            response = self._http_session.get(config['model_endpoint'], headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            return False, None, str(e)
+        # Bad credentials or a broken upstream; anything else means the provider answered
+        if response.status_code in (401, 403) or response.status_code >= 500:
+            return False, response.status_code, f"HTTP {response.status_code}"
+        return True, response.status_code, None
+
+    def validate_providers(self, timeout: float = 5.0, max_workers: int = 8) -> Dict[str, bool]:
+        """Validate providers concurrently and pre-flag the ones that fail
+
+        Only providers with a model_endpoint are probed. Failures are marked
+        unhealthy in the health monitor so the first request skips them.
+        """
+        targets = {name: config for name, config in self.providers.items() if config.get('model_endpoint')}
+        if not targets:
+            return {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as pool:
+            futures = {
+                pool.submit(self._validate_provider, name, config, timeout): name
+                for name, config in targets.items()
+            }
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                ok, status_code, error = future.result()
+                self._provider_ok[name] = ok
+                if not ok:
+                    health_monitor.mark_unhealthy(name, error=error, status_code=status_code)
+                    if self.verbose:
+                        logger.debug("❌ %s failed startup validation: %s", name, error)
+
+        if self.verbose:
+            passed = sum(1 for name in targets if self._provider_ok.get(name))
+            verbose_print(f"✅ Validated {passed}/{len(targets)} providers", self.verbose)
+        return {name: self._provider_ok[name] for name in targets}
+
+    def close(self):
+        """Release pooled HTTP connections owned by this engine"""
+        session = getattr(self, "_http_session", None)
+        if getattr(self, "_owns_session", False) and session is not None:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # Only ever closes a session this engine created; shared sessions are left alone
+        try:
+            self.close()
+        except Exception:
+            pass
+
 def main():
     """CLI entry point — delegates to core.cli module."""
     import warnings
@@ -3,9 +3,14 @@ Batch processing for AI Engine
 Process multiple prompts in parallel
 """
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 from dataclasses import dataclass
 
+from core.provider_reliability import _RETRYABLE_ERRORS
+
+# Item-level outcomes worth another pass once transient provider limits clear
+_BATCH_RETRYABLE_ERRORS = _RETRYABLE_ERRORS | {"all_failed", "no_providers"}
+
 
 @dataclass
 class BatchRequest:
@@ -31,9 +36,21 @@ class BatchResult:
 class BatchProcessor:
     """Process multiple requests in parallel"""
 
-    def __init__(self, engine, max_concurrent: int = 5):
+    def __init__(self, engine, max_concurrent: int = 5, max_retries: int = 3, retry_backoff: float = 0.5,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Args:
+            engine: AI_engine used to run each request
+            max_concurrent: Requests allowed in flight at once
+            max_retries: Extra attempts for items failing with a retryable error type
+            retry_backoff: Base delay in seconds, doubled on each retry
+            on_progress: Optional callback invoked as on_progress(done, total)
+        """
         self.engine = engine
         self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.on_progress = on_progress
 
     async def process_batch(
         self,
@@ -68,13 +85,18 @@ class BatchProcessor:
                 req_model = req_data.get("model", model)
                 req_provider = req_data.get("provider", provider)
 
-                # Run in thread pool
-                result = await asyncio.to_thread(
-                    self.engine.chat_completion,
-                    messages=messages,
-                    model=req_model,
-                    preferred_provider=req_provider
-                )
+                # Run in thread pool, retrying transient failures with exponential backoff
+                for attempt in range(self.max_retries + 1):
+                    if attempt:
+                        await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                    result = await asyncio.to_thread(
+                        self.engine.chat_completion,
+                        messages=messages,
+                        model=req_model,
+                        preferred_provider=req_provider
+                    )
+                    if result.success or result.error_type not in _BATCH_RETRYABLE_ERRORS:
+                        break
 
                 return {
                     "success": result.success,
@@ -96,9 +118,17 @@ class BatchProcessor:
         # Create semaphore for concurrency limit
         semaphore = asyncio.Semaphore(self.max_concurrent)
 
+        total = len(requests)
+        done = 0
+
         async def limited_process(req_data):
+            nonlocal done
             async with semaphore:
-                return await process_single(req_data)
+                outcome = await process_single(req_data)
+            done += 1
+            if self.on_progress is not None:
+                self.on_progress(done, total)
+            return outcome
 
         # Process all requests
         tasks = [limited_process(req) for req in requests]
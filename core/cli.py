@@ -47,8 +47,8 @@ def main() -> None:
         elif provider_name == "list":
             engine = AI_engine(verbose=False)
             print("📋 Available Providers:")
-            sorted_providers = sorted(engine.providers.items(), key=lambda x: x[1]['priority'])
-            for i, (name, config) in enumerate(sorted_providers, 1):
+            for i, name in enumerate(engine._providers_by_priority(), 1):
+                config = engine.providers[name]
                 priority = config.get('priority', 999)
                 model = config.get('model', 'Unknown')[:30]
                 status = "🔑" if engine._get_current_api_key(name) else "🚫"
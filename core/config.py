@@ -1,5 +1,7 @@
 import os
-from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Tuple
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 
@@ -75,6 +77,65 @@ class EngineSettings(BaseModel):
     verbose_mode: bool = False
 
 
+@dataclass(slots=True, frozen=True)
+class FrozenProviderConfig:
+    """Immutable, slotted snapshot of one AI_CONFIGS entry for read-only hot paths"""
+    name: str
+    id: int
+    priority: int
+    endpoint: str
+    model: str
+    format: str = "openai"
+    enabled: bool = True
+    api_keys: Tuple[Optional[str], ...] = ()
+    modes: Tuple[str, ...] = ("live",)
+    timeout: int = 60
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    rpm_limit: Optional[int] = None
+    daily_limit: Optional[int] = None
+    supports_batch: bool = False
+
+    @classmethod
+    def from_dict(cls, name: str, config: Dict[str, Any]) -> "FrozenProviderConfig":
+        known = {f.name for f in fields(cls)} - {"name"}
+        values = {k: v for k, v in config.items() if k in known}
+        for key in ("api_keys", "modes"):
+            if key in values:
+                values[key] = tuple(values[key] or ())
+        return cls(name=name, **values)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "name"}
+        data["api_keys"] = list(self.api_keys)
+        data["modes"] = list(self.modes)
+        return data
+
+
+@dataclass(slots=True, frozen=True)
+class FrozenEngineSettings:
+    """Immutable, slotted snapshot of the scalar ENGINE_SETTINGS values"""
+    default_timeout: int = 60
+    max_retries: int = 3
+    enable_auto_rotation: bool = True
+    consecutive_failure_limit: int = 5
+    key_rotation_enabled: bool = True
+    provider_rotation_enabled: bool = True
+    verbose_mode: bool = False
+    max_concurrency: int = 8
+    hedge_k: int = 1
+    hedge_delay_ms: int = 150
+    rate_limit_max_wait: float = 5.0
+
+    @classmethod
+    def from_dict(cls, settings: Dict[str, Any]) -> "FrozenEngineSettings":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in settings.items() if k in known})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
 # AI Engine Configuration - Free Providers Only
 # Last verified: 2026-06-18
 #
@@ -811,6 +872,28 @@ ENGINE_SETTINGS = {
     "key_rotation_enabled": True,
     "provider_rotation_enabled": True,
     "verbose_mode": False,
+    "max_concurrency": 8,
+    "hedge_k": 1,  # >1 races that many top providers in chat_completion_async
+    "hedge_delay_ms": 150,
+    "routing": "static",  # "static" (priority) or "latency_ewma" (fastest healthy first)
+    "rate_limit_max_wait": 5.0,  # seconds to wait for a local RPM token before trying another provider
+    "provider_max_concurrent": 32,  # in-flight requests per provider unless the provider sets max_concurrent
+    "stress_test_max_workers": 16,  # thread fan-out across providers in stress_test_providers
+    "result_cache_size": 1024,  # in-process LRU of temperature == 0 chat results
+    "result_cache_ttl": 3600,
+    "retry": {
+        "base": 0.25,  # urllib3 backoff factor for the transport retries in build_http_session
+        # Gateway/overload statuses only; 429 is handled by key rotation and a
+        # plain 500 fails over immediately
+        "retry_statuses": [502, 503, 504],
+    },
+    "http_pool": {
+        "pool_connections": 22,
+        "pool_maxsize": 64,
+        "keepalive_timeout": 75,
+        "connect_timeout": 5,  # TCP/TLS connect budget; providers' "timeout" only bounds the read
+        "transport_retries": 2,  # urllib3 in-connection retries for retry_statuses and failed connects
+    },
     "stress_test_settings": {
         "min_pass_percentage": 75,
         "test_iterations": 3,
@@ -834,6 +917,21 @@ CONFIG_VERSION = "6.0.0"
 _config_last_modified = 0
 
 
+def freeze_provider_configs(configs: Dict[str, Dict[str, Any]] = None) -> Mapping[str, FrozenProviderConfig]:
+    """Snapshot AI_CONFIGS into read-only FrozenProviderConfig records.
+
+    AI_CONFIGS itself stays a plain dict because CDN sync, key filtering and the
+    admin API mutate it at runtime; rebuild the snapshot after such changes.
+    """
+    configs = AI_CONFIGS if configs is None else configs
+    return MappingProxyType({name: FrozenProviderConfig.from_dict(name, cfg) for name, cfg in configs.items()})
+
+
+def freeze_engine_settings(settings: Dict[str, Any] = None) -> FrozenEngineSettings:
+    """Snapshot ENGINE_SETTINGS into a FrozenEngineSettings record."""
+    return FrozenEngineSettings.from_dict(ENGINE_SETTINGS if settings is None else settings)
+
+
 def check_config_reload():
     global _config_last_modified, AI_CONFIGS, ENGINE_SETTINGS
     try:
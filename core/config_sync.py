@@ -58,7 +58,7 @@ class ConfigFetcher:
 
         self._ttl = int(os.getenv("CDN_CONFIG_TTL", str(DEFAULT_TTL)))
         self._enabled = True
-        logger.info(f"CDN config sync enabled: {self._url} (TTL: {self._ttl}s)")
+        logger.info("CDN config sync enabled: %s (TTL: %ss)", self._url, self._ttl)
 
     def fetch_and_apply(self) -> Optional[Dict[str, Any]]:
         """Fetch config from CDN, cache it, and return the AI_CONFIGS dict.
@@ -107,7 +107,7 @@ class ConfigFetcher:
         try:
             resp = requests.get(self._url, timeout=15, headers={"User-Agent": f"AI-Engine/{os.getenv('AI_ENGINE_VERSION', '3.0.0')}"})
             if resp.status_code != 200:
-                logger.warning(f"CDN fetch failed: HTTP {resp.status_code}")
+                logger.warning("CDN fetch failed: HTTP %s", resp.status_code)
                 return None
 
             content = resp.text
@@ -116,7 +116,7 @@ class ConfigFetcher:
                 logger.warning("CDN config parse failed — invalid syntax")
                 return None
 
-            logger.info(f"CDN fetch successful: {len(configs)} providers")
+            logger.info("CDN fetch successful: %d providers", len(configs))
             return configs
 
         except requests.exceptions.Timeout:
@@ -126,7 +126,7 @@ class ConfigFetcher:
             logger.warning("CDN fetch connection error (offline?)")
             return None
         except Exception as e:
-            logger.warning(f"CDN fetch error: {e}")
+            logger.warning("CDN fetch error: %s", e)
             return None
         finally:
             try:
@@ -199,7 +199,7 @@ class ConfigFetcher:
                 return configs
             return None
         except Exception as e:
-            logger.warning(f"CDN config parse error: {e}")
+            logger.warning("CDN config parse error: %s", e)
             return None
 
     def _save_cache(self, configs: Dict[str, Any]):
@@ -226,9 +226,9 @@ class ConfigFetcher:
                 f"import json\n"
                 f"AI_CONFIGS = json.loads({repr(cache_data)})\n"
             )
-            logger.info(f"CDN config cached to {CACHE_FILE}")
+            logger.info("CDN config cached to %s", CACHE_FILE)
         except Exception as e:
-            logger.warning(f"Failed to save CDN cache: {e}")
+            logger.warning("Failed to save CDN cache: %s", e)
 
     def _load_cache(self, ignore_ttl: bool = False) -> Optional[Dict[str, Any]]:
         """Load config from cache if valid (not expired)"""
@@ -276,7 +276,7 @@ class ConfigFetcher:
             return None
 
         except Exception as e:
-            logger.warning(f"CDN cache load error: {e}")
+            logger.warning("CDN cache load error: %s", e)
             return None
 
     def get_status(self) -> Dict[str, Any]:
@@ -0,0 +1,44 @@
+"""
+JSON adapters for the request/response hot path.
+Uses orjson when installed (pip install "ai-synapse[fast]"), otherwise the stdlib json module.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch this either way
+JSONDecodeError = json.JSONDecodeError
+
+
+if HAS_ORJSON:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize to UTF-8 JSON bytes"""
+        return orjson.dumps(obj)
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a JSON string"""
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """Parse JSON from str or bytes"""
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize to UTF-8 JSON bytes"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def dumps(obj: Any) -> str:
+        """Serialize to a JSON string"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """Parse JSON from str or bytes"""
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
@@ -4,7 +4,7 @@ Tracks uptime, response times, and auto-disables failing providers
 """
 import time
 import threading
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 
@@ -192,6 +192,12 @@ class HealthMonitor:
                 "unhealthy_list": unhealthy_list
             }
 
+    def mark_unhealthy(self, provider_name: str, error: str = None, status_code: int = None):
+        """Record a failed check and take the provider out of rotation until recovery_time passes"""
+        self.record_check(provider_name, False, error=error, status_code=status_code)
+        with self._lock:
+            self.providers[provider_name].status = "unhealthy"
+
     def reset_provider(self, provider_name: str):
         """Reset health status for a provider"""
         with self._lock:
@@ -199,5 +205,54 @@ class HealthMonitor:
                 self.providers[provider_name] = ProviderHealth(provider=provider_name)
 
 
+class HealthCache:
+    """Short-TTL cache of healthy verdicts consulted by the router before each pass
+
+    Only positive verdicts are cached. An entry is dropped as soon as the provider
+    records a new check, so a failure is never masked; unhealthy verdicts are left
+    uncached because they can flip back purely with the passage of recovery time.
+    """
+
+    def __init__(self, monitor: HealthMonitor, ttl: float = 2.0):
+        self.monitor = monitor
+        self.ttl = ttl
+        # provider -> (cached_at, health record seen, total_checks seen)
+        self._entries: Dict[str, Tuple[float, Optional[ProviderHealth], int]] = {}
+
+    def get(self, provider_name: str) -> Optional[bool]:
+        """Return the cached verdict, or None when missing, expired or superseded"""
+        entry = self._entries.get(provider_name)
+        if entry is None:
+            return None
+        cached_at, seen_health, seen_checks = entry
+        health = self.monitor.providers.get(provider_name)
+        if (time.monotonic() - cached_at >= self.ttl or health is not seen_health
+                or (health is not None and health.total_checks != seen_checks)):
+            self._entries.pop(provider_name, None)
+            return None
+        return True
+
+    def is_healthy(self, provider_name: str, use_cache: bool = True) -> bool:
+        """Cached equivalent of HealthMonitor.is_provider_healthy"""
+        if use_cache and self.get(provider_name):
+            return True
+        healthy = self.monitor.is_provider_healthy(provider_name)
+        if healthy:
+            health = self.monitor.providers.get(provider_name)
+            checks = health.total_checks if health is not None else 0
+            self._entries[provider_name] = (time.monotonic(), health, checks)
+        else:
+            self._entries.pop(provider_name, None)
+        return healthy
+
+    def invalidate(self, provider_name: str = None):
+        """Drop one provider's entry, or all entries"""
+        if provider_name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(provider_name, None)
+
+
 # Global instance
 health_monitor = HealthMonitor()
+health_cache = HealthCache(health_monitor)
@@ -3,7 +3,7 @@ Latency tracker for AI providers
 Tracks response times and adjusts provider priority
 """
 import threading
-from typing import Dict, List
+from typing import Dict, List, Optional
 from dataclasses import dataclass, field
 
 
@@ -26,6 +26,7 @@ class ProviderLatency:
     min_latency_ms: float = float('inf')
     max_latency_ms: float = 0.0
     recent_latencies: List[float] = field(default_factory=list)
+    ewma_latency_ms: Optional[float] = None  # Failures are recorded with a penalty latency
 
     # Model-specific latencies
     model_latencies: Dict[str, List[float]] = field(default_factory=dict)
@@ -34,9 +35,10 @@ class ProviderLatency:
 class LatencyTracker:
     """Tracks latency per provider and adjusts priority"""
 
-    def __init__(self, max_recent: int = 100, slow_threshold_ms: float = 5000):
+    def __init__(self, max_recent: int = 100, slow_threshold_ms: float = 5000, ewma_alpha: float = 0.2):
         self.max_recent = max_recent
         self.slow_threshold_ms = slow_threshold_ms
+        self.ewma_alpha = ewma_alpha
         self.providers: Dict[str, ProviderLatency] = {}
         self._lock = threading.Lock()
 
@@ -55,6 +57,11 @@ class LatencyTracker:
             if success:
                 stats.successful_requests += 1
 
+            if stats.ewma_latency_ms is None:
+                stats.ewma_latency_ms = latency_ms
+            else:
+                stats.ewma_latency_ms += self.ewma_alpha * (latency_ms - stats.ewma_latency_ms)
+
             # Keep recent latencies
             stats.recent_latencies.append(latency_ms)
             if len(stats.recent_latencies) > self.max_recent:
@@ -78,6 +85,11 @@ class LatencyTracker:
                 return 0.0
             return sum(stats.recent_latencies) / len(stats.recent_latencies)
 
+    def get_ewma_latency(self, provider: str) -> Optional[float]:
+        """Exponentially weighted latency in ms, or None if the provider has no samples"""
+        stats = self.providers.get(provider)
+        return stats.ewma_latency_ms if stats is not None else None
+
     def get_p95_latency(self, provider: str) -> float:
         """Get 95th percentile latency"""
         with self._lock:
@@ -2,13 +2,98 @@
 Provider request methods — extracted from ai_engine.py monolith.
 Mixin class that AI_engine inherits from to keep all methods accessible via self.
 """
-import json
 import logging
-from typing import Dict, Optional
-from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from dataclasses import dataclass, field
+from urllib.parse import quote
+
+from core import fast_json
 
 logger = logging.getLogger(__name__)
 
+_MAX_REQUEST_TEMPLATES = 256
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Prepended for providers with "prepend_system_message": True that reject a lone user turn
+_DEFAULT_SYSTEM_MESSAGE = {"role": "system", "content": "You are a helpful AI assistant."}
+
+# Provider "format" -> handler method name; resolved with getattr so instance patches still apply
+_FORMAT_HANDLERS: Dict[str, str] = {
+    "openai": "_make_openai_request",
+    "anthropic": "_make_anthropic_request",
+    "vertex_ai": "_make_vertex_ai_request",
+    "azure_openai": "_make_azure_openai_request",
+    "bedrock": "_make_bedrock_request",
+    "gemini": "_make_gemini_request",
+    "cohere": "_make_cohere_request",
+    "cloudflare": "_make_cloudflare_request",
+    "a3z_get": "_make_a3z_request",
+}
+
+
+@lru_cache(maxsize=256)
+def _auth_headers(scheme: Optional[str], key: Optional[str]) -> Dict[str, str]:
+    """
+    Shared request headers for one auth scheme and API key; callers must not mutate them.
+
+    Per-key rather than on session.headers: one pooled session serves every provider and thread.
+    """
+    if scheme == "anthropic":
+        headers = {"Content-Type": "application/json", "anthropic-version": "2023-06-01"}
+        if key:
+            headers["x-api-key"] = key
+        return headers
+    if scheme == "bearer" and key:
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {key}"}
+    return _JSON_HEADERS
+
+
+def _request_temperature(config: Dict, kwargs: Dict) -> float:
+    """Caller's temperature for this call, else the provider's configured default"""
+    temperature = kwargs.get("temperature")
+    return config.get("temperature", 0.7) if temperature is None else temperature
+
+
+def _error_snippet(resp, limit: int = 200) -> str:
+    """First `limit` characters of an error body, decoding only that prefix (no charset sniffing)"""
+    body = resp.content
+    if not body:
+        return ""
+    try:
+        return body[:limit * 4].decode(resp.encoding or "utf-8", "replace")[:limit]
+    except LookupError:  # unknown charset label from the server
+        return body[:limit * 4].decode("utf-8", "replace")[:limit]
+
+
+# Straight-line content extractors, one per response shape; a malformed body yields ""
+def _extract_openai_content(data: Dict) -> str:
+    try:
+        return data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def _extract_anthropic_content(data: Dict) -> str:
+    try:
+        return data["content"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def _extract_gemini_content(data: Dict) -> str:
+    try:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def _extract_cohere_content(data: Dict) -> str:
+    try:
+        return data["message"]["content"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
 # Circuit breaker thresholds per provider (configurable)
 _PROVIDER_CIRCUIT_THRESHOLDS: Dict[str, Dict] = {
     "default": {"failure_threshold": 5, "recovery_timeout": 60, "half_open_max": 3},
@@ -20,7 +105,7 @@ _PROVIDER_CIRCUIT_THRESHOLDS: Dict[str, Dict] = {
 }
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class RequestResult:
     """Result of an AI request"""
     success: bool
@@ -31,11 +116,22 @@ class RequestResult:
     error_type: str = "unknown"
     provider_used: str = ""
     model_used: str = ""
-    raw_response: Optional[Dict] = None
+    raw_response: Optional[Dict] = field(default=None, hash=False)  # dicts are unhashable
+
+
+# RequestResult is frozen, so constant failures are built once and shared
+_NO_API_KEY_RESULT = RequestResult(success=False, error_message="No API key available", error_type="auth_error")
 
 
 class ProviderRequestMixin:
-    """All HTTP request methods for communicating with AI providers."""
+    """All HTTP request methods for communicating with AI providers.
+
+    All calls, streaming included, go through ``self._http_session``, the engine's pooled keep-alive session.
+    """
+
+    # JSON codec for the request/response hot path; AI_engine(json_loads=..., json_dumps=...) overrides
+    _json_loads = staticmethod(fast_json.loads)
+    _json_dumps = staticmethod(fast_json.dumps_bytes)
 
     def _get_circuit_breaker(self, provider_name: str):
         """Get or create a circuit breaker for a provider."""
@@ -55,6 +151,51 @@ class ProviderRequestMixin:
         )
         return cb
 
+    def _http_timeout(self, config: Dict, default: float = 60) -> Tuple[float, float]:
+        """
+        (connect, read) timeout for a provider call.
+
+        The read budget is the provider's read_timeout or timeout; connecting is capped by
+        connect_timeout (provider or http_pool setting) so a dead host fails over in seconds.
+        """
+        read = config.get("read_timeout") or config.get("timeout", default)
+        connect = config.get("connect_timeout") or self.engine_settings.get("http_pool", {}).get("connect_timeout", 5)
+        return (min(connect, read), read)
+
+    def _serialize_body(self, payload: Dict) -> bytes:
+        """Encode an outgoing request body; handlers send it as data= with a JSON Content-Type"""
+        return self._json_dumps(payload)
+
+    @staticmethod
+    def _honors_temperature(config: Dict) -> bool:
+        """False for formats that cannot send a temperature (the GET-only a3z_get)"""
+        return config.get("format", "openai") != "a3z_get"
+
+    def _request_template(self, provider_name, config, model=None, *, bearer=True) -> Tuple[Dict, Dict]:
+        """
+        Return cached (headers, base payload) for a provider/model.
+
+        The entry is rebuilt when the current API key rotates or the provider config
+        object is replaced. Callers must copy the payload before adding messages.
+        """
+        current_key = self._get_current_api_key(provider_name)
+        cache_key = (provider_name, model)
+        entry = self._request_templates.get(cache_key)
+        if entry is not None and entry[0] == current_key and entry[1] is config:
+            return entry[2], entry[3]
+
+        headers = _auth_headers("bearer" if bearer else None, current_key)
+        payload = {
+            "model": model or config.get("model", "gpt-4"),
+            "max_tokens": config.get("max_tokens", 4096),
+            "temperature": config.get("temperature", 0.7),
+            "stream": False,
+        }
+        if len(self._request_templates) >= _MAX_REQUEST_TEMPLATES:
+            self._request_templates.clear()
+        self._request_templates[cache_key] = (current_key, config, headers, payload)
+        return headers, payload
+
     def _make_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make a request to a specific provider, with circuit breaker protection."""
         cb = self._get_circuit_breaker(provider_name)
@@ -67,28 +208,9 @@ class ProviderRequestMixin:
             )
 
         try:
-            format_type = config.get('format', 'openai')
-
-            if format_type == 'openai':
-                result = self._make_openai_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'anthropic':
-                result = self._make_anthropic_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'vertex_ai':
-                result = self._make_vertex_ai_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'azure_openai':
-                result = self._make_azure_openai_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'bedrock':
-                result = self._make_bedrock_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'gemini':
-                result = self._make_gemini_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'cohere':
-                result = self._make_cohere_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'cloudflare':
-                result = self._make_cloudflare_request(provider_name, config, messages, model, **kwargs)
-            elif format_type == 'a3z_get':
-                result = self._make_a3z_request(provider_name, config, messages, model, **kwargs)
-            else:
-                result = self._make_openai_request(provider_name, config, messages, model, **kwargs)
+            # Unknown formats are treated as OpenAI-compatible
+            handler = _FORMAT_HANDLERS.get(config.get('format', 'openai'), '_make_openai_request')
+            result = getattr(self, handler)(provider_name, config, messages, model, **kwargs)
 
             if cb:
                 if result.success:
@@ -108,35 +230,29 @@ class ProviderRequestMixin:
     def _make_azure_openai_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to Azure OpenAI provider"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "")
-        config.get("api_keys", [])
         current_key = self._get_current_api_key(provider_name)
         if not current_key:
-            return RequestResult(success=False, error_message="No API key available", error_type="auth_error")
+            return _NO_API_KEY_RESULT
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {current_key}"
-        }
+        headers = _auth_headers("bearer", current_key)
 
         payload = {
             "messages": messages,
             "max_tokens": config.get("max_tokens", 4096),
-            "temperature": config.get("temperature", 0.7),
+            "temperature": _request_temperature(config, kwargs),
             "stream": False
         }
 
         if model:
             payload["model"] = model
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(endpoint, json=payload, headers=headers, timeout=timeout)
+            resp = self._http_session.post(endpoint, data=self._serialize_body(payload), headers=headers, timeout=timeout)
             if resp.status_code == 200:
-                data = resp.json()
-                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                data = self._json_loads(resp.content)
+                content = _extract_openai_content(data)
                 return RequestResult(
                     success=True,
                     content=content,
@@ -147,7 +263,7 @@ class ProviderRequestMixin:
             else:
                 return RequestResult(
                     success=False,
-                    error_message=f"Azure error {resp.status_code}: {resp.text[:200]}",
+                    error_message=f"Azure error {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error",
                     status_code=resp.status_code
                 )
@@ -156,8 +272,6 @@ class ProviderRequestMixin:
 
     def _make_bedrock_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to AWS Bedrock provider using the Converse API."""
-        import requests as _requests
-        import json
         import hashlib
         import hmac
         import datetime
@@ -167,7 +281,7 @@ class ProviderRequestMixin:
         region = config.get("region", "us-east-1")
 
         if not current_key:
-            return RequestResult(success=False, error_message="No API key available", error_type="auth_error")
+            return _NO_API_KEY_RESULT
 
         # Extract model from endpoint or use config model
         model_id = model or config.get("model", "anthropic.claude-3-sonnet-20240229-v1:0")
@@ -197,7 +311,7 @@ class ProviderRequestMixin:
             "messages": bedrock_messages,
             "inferenceConfig": {
                 "maxTokens": config.get("max_tokens", 4096),
-                "temperature": config.get("temperature", 0.7),
+                "temperature": _request_temperature(config, kwargs),
             },
         }
 
@@ -215,7 +329,7 @@ class ProviderRequestMixin:
         secret_key = key_parts[1] if len(key_parts) > 1 else ""
 
         # Create canonical request
-        payload_bytes = json.dumps(payload).encode("utf-8")
+        payload_bytes = self._serialize_body(payload)
         payload_hash = hashlib.sha256(payload_bytes).hexdigest()
 
         headers_to_sign = {
@@ -270,12 +384,12 @@ class ProviderRequestMixin:
             "Authorization": auth_header,
         }
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(api_url, headers=request_headers, data=payload_bytes, timeout=timeout)
+            resp = self._http_session.post(api_url, headers=request_headers, data=payload_bytes, timeout=timeout)
 
             if resp.status_code == 200:
-                data = resp.json()
+                data = self._json_loads(resp.content)
                 # Extract text from Converse response
                 output = data.get("output", {})
                 message = output.get("message", {})
@@ -293,7 +407,7 @@ class ProviderRequestMixin:
             else:
                 return RequestResult(
                     success=False,
-                    error_message=f"Bedrock {resp.status_code}: {resp.text[:200]}",
+                    error_message=f"Bedrock {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error",
                     status_code=resp.status_code,
                 )
@@ -301,69 +415,38 @@ class ProviderRequestMixin:
             return RequestResult(success=False, error_message=str(e), error_type="request_exception")
 
     def _make_streaming_request(self, provider_name, config, messages, model=None, **kwargs):
-        """Make streaming request to a provider (yields chunks)"""
-        import requests as _requests
+        """Make streaming request to a provider (yields chunks parsed from SSE as they arrive)"""
 
         endpoint = config.get("endpoint", "")
-        current_key = self._get_current_api_key(provider_name)
-        headers = {"Content-Type": "application/json"}
-
-        auth_type = config.get("auth_type")
-        if auth_type in ("bearer", "bearer_lowercase") and current_key:
-            headers["Authorization"] = f"Bearer {current_key}"
-
-        payload = {
-            "messages": messages,
-            "model": model or config.get("model", "gpt-4"),
-            "max_tokens": config.get("max_tokens", 4096),
-            "temperature": config.get("temperature", 0.7),
-            "stream": True
-        }
+        headers, base_payload = self._request_template(
+            provider_name, config, model, bearer=config.get("auth_type") in ("bearer", "bearer_lowercase")
+        )
+        payload = {"messages": messages, **base_payload, "stream": True}
+        if kwargs.get("temperature") is not None:
+            payload["temperature"] = kwargs["temperature"]
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
 
         try:
-            try:
-                from core.http_client import stream_sse
-                for data_str in stream_sse(endpoint, headers=headers, json_body=payload, timeout=timeout):
-                    if data_str.strip() == '[DONE]':
-                        break
-                    try:
-                        data = json.loads(data_str)
-                        delta = data.get('choices', [{}])[0].get('delta', {})
-                        content = delta.get('content')
-                        if content:
-                            yield {'content': content}
-                    except json.JSONDecodeError:
+            with self._http_session.post(endpoint, data=self._serialize_body(payload),
+                                         headers={**headers, "Accept": "text/event-stream"},
+                                         timeout=timeout, stream=True) as resp:
+                if resp.status_code != 200:
+                    yield {'error': f'HTTP {resp.status_code}: {_error_snippet(resp)}', 'done': True}
+                    return
+
+                for line in resp.iter_lines():
+                    if not line.startswith(b'data:'):
                         continue
-                yield {'done': True}
-                return
-            except Exception:
-                # Fall back to direct requests streaming
-                pass
-
-            resp = _requests.post(endpoint, json=payload, headers=headers, timeout=timeout, stream=True)
-
-            if resp.status_code != 200:
-                yield {'error': f'HTTP {resp.status_code}: {resp.text[:200]}', 'done': True}
-                return
-
-            for line in resp.iter_lines():
-                if not line:
-                    continue
-                line = line.decode('utf-8', errors='replace')
-                if line.startswith('data: '):
-                    data_str = line[6:]
-                    if data_str.strip() == '[DONE]':
+                    data_str = line[5:].strip()
+                    if data_str == b'[DONE]':
                         break
                     try:
-                        data = json.loads(data_str)
-                        delta = data.get('choices', [{}])[0].get('delta', {})
-                        content = delta.get('content')
-                        if content:
-                            yield {'content': content}
-                    except json.JSONDecodeError:
+                        content = self._json_loads(data_str)['choices'][0]['delta'].get('content')
+                    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
                         continue
+                    if content:
+                        yield {'content': content}
 
             yield {'done': True}
 
@@ -371,8 +454,7 @@ class ProviderRequestMixin:
             yield {'error': str(e), 'done': True}
 
     def _make_ollama_streaming_request(self, provider_name, config, messages, model=None, **kwargs):
-        """Make streaming request to Ollama-compatible provider"""
-        import requests as _requests
+        """Make streaming request to Ollama-compatible provider (newline-delimited JSON)"""
 
         endpoint = config.get("endpoint", "")
         model_name = model or config.get("model", "llama3.1")
@@ -383,27 +465,27 @@ class ProviderRequestMixin:
             "stream": True
         }
 
-        timeout = config.get("timeout", 120)
+        timeout = self._http_timeout(config, 120)
 
         try:
-            resp = _requests.post(endpoint, json=payload, timeout=timeout, stream=True)
-
-            if resp.status_code != 200:
-                yield {'error': f'HTTP {resp.status_code}', 'done': True}
-                return
-
-            for line in resp.iter_lines():
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line.decode('utf-8'))
+            with self._http_session.post(endpoint, data=self._serialize_body(payload), headers=_JSON_HEADERS,
+                                         timeout=timeout, stream=True) as resp:
+                if resp.status_code != 200:
+                    yield {'error': f'HTTP {resp.status_code}: {_error_snippet(resp)}', 'done': True}
+                    return
+
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = self._json_loads(line)
+                    except ValueError:
+                        continue
                     if data.get('done'):
                         break
                     content = data.get('response', '')
                     if content:
                         yield {'content': content}
-                except json.JSONDecodeError:
-                    continue
 
             yield {'done': True}
 
@@ -413,17 +495,8 @@ class ProviderRequestMixin:
     def _make_anthropic_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to Anthropic provider"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "https://api.anthropic.com/v1/messages")
-        current_key = self._get_current_api_key(provider_name)
-
-        headers = {
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
-        }
-        if current_key:
-            headers["x-api-key"] = current_key
+        headers = _auth_headers("anthropic", self._get_current_api_key(provider_name))
 
         system_msg = ""
         user_messages = []
@@ -440,20 +513,22 @@ class ProviderRequestMixin:
         }
         if system_msg:
             payload["system"] = system_msg
+        if kwargs.get("temperature") is not None:
+            payload["temperature"] = kwargs["temperature"]
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(endpoint, json=payload, headers=headers, timeout=timeout)
+            resp = self._http_session.post(endpoint, data=self._serialize_body(payload), headers=headers, timeout=timeout)
             if resp.status_code == 200:
-                data = resp.json()
-                content = data.get("content", [{}])[0].get("text", "")
+                data = self._json_loads(resp.content)
+                content = _extract_anthropic_content(data)
                 return RequestResult(
                     success=True, content=content, provider_used=provider_name,
                     model_used=data.get("model", model), status_code=200
                 )
             else:
                 return RequestResult(
-                    success=False, error_message=f"Anthropic {resp.status_code}: {resp.text[:200]}",
+                    success=False, error_message=f"Anthropic {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error", status_code=resp.status_code
                 )
         except Exception as e:
@@ -461,14 +536,12 @@ class ProviderRequestMixin:
 
     def _make_vertex_ai_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to Vertex AI provider using the Gemini API format."""
-        import requests as _requests
-
         current_key = self._get_current_api_key(provider_name)
         project_id = config.get("project_id", "")
         location = config.get("region", "us-central1")
 
         if not current_key:
-            return RequestResult(success=False, error_message="No API key available", error_type="auth_error")
+            return _NO_API_KEY_RESULT
 
         model_id = model or config.get("model", "gemini-1.5-pro")
 
@@ -502,7 +575,7 @@ class ProviderRequestMixin:
             "contents": contents,
             "generationConfig": {
                 "maxOutputTokens": config.get("max_tokens", 4096),
-                "temperature": config.get("temperature", 0.7),
+                "temperature": _request_temperature(config, kwargs),
             },
         }
 
@@ -514,12 +587,12 @@ class ProviderRequestMixin:
             "Authorization": f"Bearer {current_key}",
         }
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(api_url, headers=headers, json=payload, timeout=timeout)
+            resp = self._http_session.post(api_url, headers=headers, data=self._serialize_body(payload), timeout=timeout)
 
             if resp.status_code == 200:
-                data = resp.json()
+                data = self._json_loads(resp.content)
                 candidates = data.get("candidates", [])
                 content = ""
                 if candidates:
@@ -537,7 +610,7 @@ class ProviderRequestMixin:
             else:
                 return RequestResult(
                     success=False,
-                    error_message=f"Vertex AI {resp.status_code}: {resp.text[:200]}",
+                    error_message=f"Vertex AI {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error",
                     status_code=resp.status_code,
                 )
@@ -547,37 +620,29 @@ class ProviderRequestMixin:
     def _make_openai_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to OpenAI-compatible provider"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "")
-        current_key = self._get_current_api_key(provider_name)
-        headers = {"Content-Type": "application/json"}
-
-        auth_type = config.get("auth_type")
-        if auth_type in ("bearer", "bearer_lowercase") and current_key:
-            headers["Authorization"] = f"Bearer {current_key}"
-
-        payload = {
-            "messages": messages,
-            "model": model or config.get("model", "gpt-4"),
-            "max_tokens": config.get("max_tokens", 4096),
-            "temperature": config.get("temperature", 0.7),
-            "stream": False
-        }
+        headers, base_payload = self._request_template(
+            provider_name, config, model, bearer=config.get("auth_type") in ("bearer", "bearer_lowercase")
+        )
+        if config.get("prepend_system_message") and len(messages) == 1 and messages[0].get("role") != "system":
+            messages = [_DEFAULT_SYSTEM_MESSAGE, messages[0]]
+        payload = {"messages": messages, **base_payload}
+        if kwargs.get("temperature") is not None:
+            payload["temperature"] = kwargs["temperature"]
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(endpoint, json=payload, headers=headers, timeout=timeout)
+            resp = self._http_session.post(endpoint, data=self._serialize_body(payload), headers=headers, timeout=timeout)
             if resp.status_code == 200:
-                data = resp.json()
-                content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                data = self._json_loads(resp.content)
+                content = _extract_openai_content(data)
                 return RequestResult(
                     success=True, content=content, provider_used=provider_name,
                     model_used=data.get("model", model), status_code=200
                 )
             else:
                 return RequestResult(
-                    success=False, error_message=f"HTTP {resp.status_code}: {resp.text[:200]}",
+                    success=False, error_message=f"HTTP {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error", status_code=resp.status_code
                 )
         except Exception as e:
@@ -586,8 +651,6 @@ class ProviderRequestMixin:
     def _make_gemini_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to Google Gemini provider"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "")
         current_key = self._get_current_api_key(provider_name)
 
@@ -605,25 +668,25 @@ class ProviderRequestMixin:
             payload["systemInstruction"] = system_instruction
         payload["generationConfig"] = {
             "maxOutputTokens": config.get("max_tokens", 4096),
-            "temperature": config.get("temperature", 0.7)
+            "temperature": _request_temperature(config, kwargs)
         }
 
         sep = "&" if "?" in endpoint else "?"
         url = f"{endpoint}{sep}key={current_key}"
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(url, json=payload, headers={"Content-Type": "application/json"}, timeout=timeout)
+            resp = self._http_session.post(url, data=self._serialize_body(payload), headers=_JSON_HEADERS, timeout=timeout)
             if resp.status_code == 200:
-                data = resp.json()
-                content = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+                data = self._json_loads(resp.content)
+                content = _extract_gemini_content(data)
                 return RequestResult(
                     success=True, content=content, provider_used=provider_name,
                     model_used=model, status_code=200
                 )
             else:
                 return RequestResult(
-                    success=False, error_message=f"Gemini {resp.status_code}: {resp.text[:200]}",
+                    success=False, error_message=f"Gemini {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error", status_code=resp.status_code
                 )
         except Exception as e:
@@ -632,14 +695,8 @@ class ProviderRequestMixin:
     def _make_cohere_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to Cohere provider"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "https://api.cohere.com/v2/chat")
-        current_key = self._get_current_api_key(provider_name)
-
-        headers = {"Content-Type": "application/json"}
-        if current_key:
-            headers["Authorization"] = f"Bearer {current_key}"
+        headers, _ = self._request_template(provider_name, config, model)
 
         chat_history = []
         preamble = ""
@@ -655,20 +712,22 @@ class ProviderRequestMixin:
         }
         if preamble:
             payload["preamble"] = preamble
+        if kwargs.get("temperature") is not None:
+            payload["temperature"] = kwargs["temperature"]
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(endpoint, json=payload, headers=headers, timeout=timeout)
+            resp = self._http_session.post(endpoint, data=self._serialize_body(payload), headers=headers, timeout=timeout)
             if resp.status_code == 200:
-                data = resp.json()
-                content = data.get("message", {}).get("content", [{}])[0].get("text", "")
+                data = self._json_loads(resp.content)
+                content = _extract_cohere_content(data)
                 return RequestResult(
                     success=True, content=content, provider_used=provider_name,
                     model_used=model, status_code=200
                 )
             else:
                 return RequestResult(
-                    success=False, error_message=f"Cohere {resp.status_code}: {resp.text[:200]}",
+                    success=False, error_message=f"Cohere {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error", status_code=resp.status_code
                 )
         except Exception as e:
@@ -677,15 +736,13 @@ class ProviderRequestMixin:
     def _make_a3z_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to A3Z-style provider (GET-based)"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "")
         user_msg = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
-        url = f"{endpoint}?message={_requests.utils.quote(user_msg)}"
+        url = f"{endpoint}?message={quote(user_msg)}"
 
-        timeout = config.get("timeout", 30)
+        timeout = self._http_timeout(config, 30)
         try:
-            resp = _requests.get(url, timeout=timeout)
+            resp = self._http_session.get(url, timeout=timeout)
             if resp.status_code == 200:
                 return RequestResult(
                     success=True, content=resp.text, provider_used=provider_name,
@@ -702,23 +759,19 @@ class ProviderRequestMixin:
     def _make_cloudflare_request(self, provider_name, config, messages, model=None, **kwargs):
         """Make request to Cloudflare Workers AI"""
 
-        import requests as _requests
-
         endpoint = config.get("endpoint", "")
-        current_key = self._get_current_api_key(provider_name)
-
-        headers = {"Content-Type": "application/json"}
-        if current_key:
-            headers["Authorization"] = f"Bearer {current_key}"
+        headers, _ = self._request_template(provider_name, config, model)
 
         user_msg = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
         payload = {"messages": [{"role": "user", "content": user_msg}], "stream": False}
+        if kwargs.get("temperature") is not None:
+            payload["temperature"] = kwargs["temperature"]
 
-        timeout = config.get("timeout", 60)
+        timeout = self._http_timeout(config, 60)
         try:
-            resp = _requests.post(endpoint, json=payload, headers=headers, timeout=timeout)
+            resp = self._http_session.post(endpoint, data=self._serialize_body(payload), headers=headers, timeout=timeout)
             if resp.status_code == 200:
-                data = resp.json()
+                data = self._json_loads(resp.content)
                 result = data.get("result", data)
                 content = result.get("response", "") or result.get("result", "")
                 return RequestResult(
@@ -727,7 +780,7 @@ class ProviderRequestMixin:
                 )
             else:
                 return RequestResult(
-                    success=False, error_message=f"Cloudflare {resp.status_code}: {resp.text[:200]}",
+                    success=False, error_message=f"Cloudflare {resp.status_code}: {_error_snippet(resp)}",
                     error_type="provider_error", status_code=resp.status_code
                 )
         except Exception as e:
@@ -4,7 +4,7 @@ Tracks rate limits and automatically recovers when limits reset
 """
 import time
 import threading
-from typing import Dict, List
+from typing import Dict, List, Optional
 from dataclasses import dataclass, field
 
 
@@ -48,12 +48,44 @@ class RateLimitInfo:
         self.retry_after = retry_after
 
 
+class TokenBucket:
+    """Thread-safe token bucket; callers block until a token is free instead of tripping a 429"""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1):
+        self.rate_per_sec = rate_per_sec
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_sec)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Take one token, waiting up to timeout seconds (forever if None); False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate_per_sec
+                if deadline is not None:
+                    if now + wait > deadline:
+                        return False
+                self._cond.wait(wait)
+
+
 class RateLimitManager:
     """Manages rate limits for all providers"""
 
     def __init__(self, default_limit: int = 60):
         self.default_limit = default_limit
         self.providers: Dict[str, RateLimitInfo] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
         self._lock = threading.Lock()
 
     def get_provider(self, provider_name: str) -> RateLimitInfo:
@@ -93,6 +125,23 @@ class RateLimitManager:
         provider = self.get_provider(provider_name)
         provider.mark_rate_limited(retry_after)
 
+    def get_bucket(self, provider_name: str, rpm_limit: int) -> TokenBucket:
+        """Get or create the shared token bucket for a provider's RPM budget"""
+        with self._lock:
+            bucket = self.buckets.get(provider_name)
+            rate = rpm_limit / 60.0
+            if bucket is None or bucket.rate_per_sec != rate:
+                # Allow roughly ten seconds' worth of requests as a burst
+                bucket = TokenBucket(rate, burst=max(1, rpm_limit // 6))
+                self.buckets[provider_name] = bucket
+            return bucket
+
+    def acquire(self, provider_name: str, rpm_limit: Optional[int], timeout: Optional[float] = None) -> bool:
+        """Wait for an RPM token; providers without rpm_limit are never throttled"""
+        if not rpm_limit:
+            return True
+        return self.get_bucket(provider_name, rpm_limit).acquire(timeout)
+
     def get_available_providers(self, provider_names: List[str]) -> List[str]:
         """Get list of available (not rate limited) providers"""
         available = []
@@ -1,7 +1,9 @@
 """Streaming chat completion mixin — extracted from AI_engine."""
 from __future__ import annotations
 
-from typing import Dict, List, Any, Optional, Iterator
+import asyncio
+import threading
+from typing import AsyncIterator, Dict, List, Any, Optional, Iterator
 
 try:
     from core.config import verbose_print
@@ -11,8 +13,13 @@ except ImportError:  # pragma: no cover
     from core.provider_reliability import get_fallback_chain, should_retry_provider
 
 
+_STREAM_END = object()
+# Pieces buffered between the stream's worker thread and a slow async consumer
+_STREAM_QUEUE_MAXSIZE = 64
+
+
 class StreamingMixin:
-    """Provides chat_completion_stream() to AI_engine."""
+    """Provides chat_completion_stream() and text-only stream helpers to AI_engine."""
 
     def chat_completion_stream(
         self,
@@ -118,3 +125,75 @@ class StreamingMixin:
                 continue
 
         yield {"error": "All providers failed for streaming", "done": True}
+
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Iterator[str]:
+        """Yield response text pieces as they arrive.
+
+        Raises:
+            RuntimeError: if every provider failed before the stream finished
+        """
+        for chunk in self.chat_completion_stream(messages, model=model, **kwargs):
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            content = chunk.get("content")
+            if content:
+                yield content
+
+    async def astream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        """Async counterpart of stream_chat_completion.
+
+        The blocking stream (with provider failover) runs in a worker thread and
+        hands pieces to the event loop as they arrive, through a bounded queue so a
+        slow consumer holds the worker back instead of buffering the whole response.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_STREAM_QUEUE_MAXSIZE)
+        stop = threading.Event()
+
+        def hand_off(item: Any) -> bool:
+            """Block until the queue has room for item; False once the consumer has gone away"""
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except TimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        return False
+
+        def produce() -> None:
+            stream = self.stream_chat_completion(messages, model=model, **kwargs)
+            try:
+                for piece in stream:
+                    if stop.is_set() or not hand_off(piece):
+                        break
+            except Exception as e:
+                hand_off(e)
+            finally:
+                stream.close()
+                hand_off(_STREAM_END)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumer stopped early or finished: stop the worker and let it close the HTTP stream
+            stop.set()
+            await asyncio.shield(producer)
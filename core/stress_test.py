@@ -1,36 +1,58 @@
+import asyncio
 import concurrent.futures
 import logging
+import math
 import re
 import time
-from typing import Any, Dict
+from operator import itemgetter
+from typing import Any, Dict, List, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
+_STRESS_TEST_PROMPT = "Hello! Please respond with exactly: 'Test successful - AI Engine v3.0 working!'"
+
+
+def _summarize_response_times(times) -> Dict[str, float]:
+    """avg/min/max/p95 (nearest-rank) from one sort of the samples; all 0 when there are none"""
+    if not times:
+        return {'avg_response_time': 0, 'min_response_time': 0, 'max_response_time': 0, 'p95_response_time': 0}
+    ordered = sorted(times)
+    n = len(ordered)
+    return {
+        'avg_response_time': math.fsum(ordered) / n,
+        'min_response_time': ordered[0],
+        'max_response_time': ordered[-1],
+        'p95_response_time': ordered[max(0, math.ceil(0.95 * n) - 1)],
+    }
+
 
 class StressTestMixin:
     """Stress testing and priority optimization methods."""
 
-    def stress_test_providers(self, test_iterations: int = 3, ask_for_priority_change: bool = True, use_threading: bool = True) -> Dict[str, Any]:
+    def stress_test_providers(self, test_iterations: int = 3, ask_for_priority_change: bool = True, use_threading: bool = True,
+                              concurrent_iterations: bool = False) -> Dict[str, Any]:
         """
         Run stress test on all providers and optionally ask user for priority changes
-        Enhanced with threading for faster execution
+        Enhanced with threading for faster execution; concurrent_iterations also overlaps
+        each provider's iterations on a thread pool
         """
         enabled_providers = {name: config for name, config in self.providers.items() if config.get('enabled', True)}
 
         print(f"🧪 Starting stress test on {len(enabled_providers)} enabled providers...")
         print(f"📝 Test iterations: {test_iterations}")
         print(f"⚡ Threading enabled: {use_threading}")
+        print(f"🔀 Concurrent iterations: {concurrent_iterations}")
         print()
 
-        test_prompt = "Hello! Please respond with exactly: 'Test successful - AI Engine v3.0 working!'"
+        test_prompt = _STRESS_TEST_PROMPT
         results = {}
 
         if use_threading and len(enabled_providers) > 1:
             # Use threading for faster stress testing
-            results = self._stress_test_threaded(enabled_providers, test_iterations, test_prompt)
+            results = self._stress_test_threaded(enabled_providers, test_iterations, test_prompt, concurrent_iterations)
         else:
             # Sequential testing (original method)
-            results = self._stress_test_sequential(enabled_providers, test_iterations, test_prompt)
+            results = self._stress_test_sequential(enabled_providers, test_iterations, test_prompt, concurrent_iterations)
 
         # Calculate overall stats
         total_providers = len(results)
@@ -73,141 +95,160 @@ class StressTestMixin:
 
         return results
 
-    def _stress_test_sequential(self, providers: Dict, test_iterations: int, test_prompt: str) -> Dict[str, Any]:
+    def _timed_stress_request(self, provider_name: str, provider_config: Dict, test_prompt: str) -> Tuple[Any, float]:
+        """One stress request; returns (result, seconds)"""
+        start_time = time.perf_counter()
+        result = self._make_request(
+            provider_name,
+            provider_config,
+            [{"role": "user", "content": test_prompt}]
+        )
+        return result, time.perf_counter() - start_time
+
+    def _stress_test_provider(self, provider_name: str, provider_config: Dict, test_iterations: int, test_prompt: str,
+                              concurrent_iterations: bool = False) -> Dict[str, Any]:
+        """Run test_iterations requests against one provider (in turn, or all at once on a thread pool) and summarise them"""
+        outcomes = []
+        if concurrent_iterations and test_iterations > 1:
+            max_workers = min(test_iterations, self.engine_settings.get('stress_test_max_workers', 16))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._timed_stress_request, provider_name, provider_config, test_prompt)
+                    for _ in range(test_iterations)
+                ]
+                # Collected in submission order so error iterations stay numbered 1..n
+                for future in futures:
+                    try:
+                        outcomes.append(future.result())
+                    except Exception as e:
+                        outcomes.append(e)
+        else:
+            for _ in range(test_iterations):
+                try:
+                    outcomes.append(self._timed_stress_request(provider_name, provider_config, test_prompt))
+                except Exception as e:
+                    outcomes.append(e)
+        return self._summarize_stress_outcomes(provider_name, test_iterations, outcomes)
+
+    async def _stress_test_provider_async(self, provider_name: str, provider_config: Dict, test_iterations: int, test_prompt: str) -> Dict[str, Any]:
+        """Run all test_iterations requests against one provider at once and summarise them"""
+        # Same thread-pool fan-out as the sync concurrent_iterations path, kept off the event loop
+        return await asyncio.to_thread(self._stress_test_provider, provider_name, provider_config,
+                                       test_iterations, test_prompt, True)
+
+    @staticmethod
+    def _summarize_stress_outcomes(provider_name: str, test_iterations: int,
+                                   outcomes: List[Union[Tuple[Any, float], BaseException]]) -> Dict[str, Any]:
+        """Fold (result, seconds) pairs or raised exceptions into the per-provider results dict"""
+        provider_results = {
+            'provider': provider_name,
+            'total_tests': test_iterations,
+            'successful_tests': 0,
+            'failed_tests': 0,
+            'errors': []
+        }
+        # Sized up front and trimmed to the successes afterwards
+        response_times = [0.0] * len(outcomes)
+        succ_idx = 0
+
+        for i, outcome in enumerate(outcomes, 1):
+            if isinstance(outcome, BaseException):
+                provider_results['failed_tests'] += 1
+                provider_results['errors'].append({
+                    'iteration': i,
+                    'error': str(outcome),
+                    'error_type': 'exception'
+                })
+                continue
+            result, response_time = outcome
+
+            if result.success:
+                response_times[succ_idx] = response_time
+                succ_idx += 1
+            else:
+                provider_results['failed_tests'] += 1
+                provider_results['errors'].append({
+                    'iteration': i,
+                    'error': result.error_message,
+                    'error_type': getattr(result, 'error_type', 'unknown')
+                })
+
+        del response_times[succ_idx:]
+        provider_results['successful_tests'] = succ_idx
+        provider_results['response_times'] = response_times
+
+        # Calculate metrics
+        success_rate = (succ_idx / test_iterations) * 100 if test_iterations else 0
+
+        provider_results.update(_summarize_response_times(response_times))
+        provider_results.update({
+            'success_rate': success_rate,
+            'passed': success_rate >= 75  # 75% success threshold
+        })
+
+        return provider_results
+
+    async def stress_test_providers_async(self, test_iterations: int = 3, test_prompt: str = None) -> Dict[str, Any]:
+        """
+        Stress test every enabled provider with all iterations in flight at once.
+
+        Wall-clock is roughly the slowest single request rather than providers x iterations.
+        Returns the same per-provider results as stress_test_providers, without printing or prompting.
+        """
+        enabled_providers = {name: config for name, config in self.providers.items() if config.get('enabled', True)}
+        test_prompt = test_prompt or _STRESS_TEST_PROMPT
+        reports = await asyncio.gather(*(
+            self._stress_test_provider_async(name, config, test_iterations, test_prompt)
+            for name, config in enabled_providers.items()
+        ))
+        return {report['provider']: report for report in reports}
+
+    def _stress_test_sequential(self, providers: Dict, test_iterations: int, test_prompt: str,
+                                concurrent_iterations: bool = False) -> Dict[str, Any]:
         """Sequential stress testing (original method)"""
         results = {}
 
         for provider_name, provider_config in providers.items():
             print(f"Testing {provider_name}...", end=" ")
 
-            provider_results = {
-                'provider': provider_name,
-                'total_tests': test_iterations,
-                'successful_tests': 0,
-                'failed_tests': 0,
-                'response_times': [],
-                'errors': []
-            }
-
-            for i in range(test_iterations):
-                start_time = time.time()
-                result = self._make_request(
-                    provider_name,
-                    provider_config,
-                    [{"role": "user", "content": test_prompt}]
-                )
-                response_time = time.time() - start_time
-
-                if result.success:
-                    provider_results['successful_tests'] += 1
-                    provider_results['response_times'].append(response_time)
-                else:
-                    provider_results['failed_tests'] += 1
-                    provider_results['errors'].append({
-                        'iteration': i + 1,
-                        'error': result.error_message,
-                        'error_type': result.error_type
-                    })
-
-            # Calculate metrics
-            success_rate = (provider_results['successful_tests'] / test_iterations) * 100
-            avg_response_time = sum(provider_results['response_times']) / len(provider_results['response_times']) if provider_results['response_times'] else 0
-
-            provider_results.update({
-                'success_rate': success_rate,
-                'avg_response_time': avg_response_time,
-                'min_response_time': min(provider_results['response_times']) if provider_results['response_times'] else 0,
-                'max_response_time': max(provider_results['response_times']) if provider_results['response_times'] else 0,
-                'passed': success_rate >= 75  # 75% success threshold
-            })
-
+            provider_results = self._stress_test_provider(provider_name, provider_config, test_iterations, test_prompt,
+                                                          concurrent_iterations)
             results[provider_name] = provider_results
 
             status = "✅ PASS" if provider_results['passed'] else "❌ FAIL"
-            print(f"{status} ({success_rate:.1f}%, {avg_response_time:.2f}s)")
+            print(f"{status} ({provider_results['success_rate']:.1f}%, {provider_results['avg_response_time']:.2f}s)")
 
         return results
 
-    def _stress_test_threaded(self, providers: Dict, test_iterations: int, test_prompt: str) -> Dict[str, Any]:
-        """Threaded stress testing for faster execution"""
+    def _stress_test_threaded(self, providers: Dict, test_iterations: int, test_prompt: str,
+                              concurrent_iterations: bool = False) -> Dict[str, Any]:
+        """Threaded stress testing: providers are independent, so wall-clock is the slowest provider, not the sum"""
         results = {}
-        max_workers = min(len(providers), 8)  # Limit concurrent tests
+        max_workers = max(1, min(len(providers), self.engine_settings.get('stress_test_max_workers', 16)))
 
         print(f"⚡ Running threaded stress test with {max_workers} workers...")
 
-        def test_provider(provider_item):
-            provider_name, provider_config = provider_item
-            provider_results = {
-                'provider': provider_name,
-                'total_tests': test_iterations,
-                'successful_tests': 0,
-                'failed_tests': 0,
-                'response_times': [],
-                'errors': []
-            }
-
+        def test_provider(provider_name, provider_config):
             print(f"🧪 Testing {provider_name}...")
-
-            for i in range(test_iterations):
-                start_time = time.time()
-                try:
-                    result = self._make_request(
-                        provider_name,
-                        provider_config,
-                        [{"role": "user", "content": test_prompt}]
-                    )
-                    response_time = time.time() - start_time
-
-                    if result.success:
-                        provider_results['successful_tests'] += 1
-                        provider_results['response_times'].append(response_time)
-                    else:
-                        provider_results['failed_tests'] += 1
-                        provider_results['errors'].append({
-                            'iteration': i + 1,
-                            'error': result.error_message,
-                            'error_type': getattr(result, 'error_type', 'unknown')
-                        })
-                except Exception as e:
-                    response_time = time.time() - start_time
-                    provider_results['failed_tests'] += 1
-                    provider_results['errors'].append({
-                        'iteration': i + 1,
-                        'error': str(e),
-                        'error_type': 'exception'
-                    })
-
-            # Calculate metrics
-            success_rate = (provider_results['successful_tests'] / test_iterations) * 100
-            avg_response_time = sum(provider_results['response_times']) / len(provider_results['response_times']) if provider_results['response_times'] else 0
-
-            provider_results.update({
-                'success_rate': success_rate,
-                'avg_response_time': avg_response_time,
-                'min_response_time': min(provider_results['response_times']) if provider_results['response_times'] else 0,
-                'max_response_time': max(provider_results['response_times']) if provider_results['response_times'] else 0,
-                'passed': success_rate >= 75  # 75% success threshold
-            })
-
+            provider_results = self._stress_test_provider(provider_name, provider_config, test_iterations, test_prompt,
+                                                          concurrent_iterations)
             status = "✅ PASS" if provider_results['passed'] else "❌ FAIL"
-            print(f"✅ {provider_name}: {status} ({success_rate:.1f}%, {avg_response_time:.2f}s)")
-
-            return provider_name, provider_results
+            print(f"✅ {provider_name}: {status} ({provider_results['success_rate']:.1f}%, {provider_results['avg_response_time']:.2f}s)")
+            return provider_results
 
         # Execute tests in parallel
-        start_time = time.time()
+        start_time = time.perf_counter()
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_provider = {
-                executor.submit(test_provider, provider_item): provider_item[0]
-                for provider_item in providers.items()
+                executor.submit(test_provider, provider_name, provider_config): provider_name
+                for provider_name, provider_config in providers.items()
             }
 
             for future in concurrent.futures.as_completed(future_to_provider):
+                provider_name = future_to_provider[future]
                 try:
-                    provider_name, provider_results = future.result(timeout=60)  # 60 second timeout per provider
-                    results[provider_name] = provider_results
+                    results[provider_name] = future.result()
                 except Exception as e:
-                    provider_name = future_to_provider[future]
                     print(f"❌ {provider_name} test failed with exception: {e}")
                     # Create a failed result
                     results[provider_name] = {
@@ -216,15 +257,16 @@ class StressTestMixin:
                         'successful_tests': 0,
                         'failed_tests': test_iterations,
                         'response_times': [],
-                        'errors': [{'iteration': 'all', 'error': str(e), 'error_type': 'timeout_exception'}],
+                        'errors': [{'iteration': 'all', 'error': str(e), 'error_type': 'exception'}],
                         'success_rate': 0,
                         'avg_response_time': 0,
                         'min_response_time': 0,
                         'max_response_time': 0,
+                        'p95_response_time': 0,
                         'passed': False
                     }
 
-        total_time = time.time() - start_time
+        total_time = time.perf_counter() - start_time
         print(f"⏱️ Threaded stress test completed in {total_time:.2f}s")
 
         return results
@@ -244,8 +286,9 @@ class StressTestMixin:
                 total_score = success_weight + speed_weight
                 provider_scores.append((provider_name, total_score, result['avg_response_time']))
 
-        # Sort by score (higher is better)
-        provider_scores.sort(key=lambda x: x[1], reverse=True)
+        # Sort by score (higher is better); two stable passes so ties go to the faster provider
+        provider_scores.sort(key=itemgetter(2))
+        provider_scores.sort(key=itemgetter(1), reverse=True)
 
         print("\n🏆 OPTIMIZED PRIORITY RANKING:")
         print(f"{'Rank':<4} {'Provider':<15} {'Score':<6} {'Time':<7} {'Old Pri':<7} {'New Pri'}")
@@ -265,6 +308,7 @@ class StressTestMixin:
                 priority_changes[provider_name] = new_priority
 
             print(f"{i:2d}   {provider_name:15} {score:5.1f}  {avg_time:5.2f}s  {old_priority:5d}   {new_priority:5d}")
+        self._invalidate_provider_order()
 
         # Save changes to config.py file
         if priority_changes:
@@ -0,0 +1,46 @@
+"""
+Token counting for AI Engine
+Encoders are built once per model and cached; tiktoken is optional and
+falls back to the ~4 characters per token estimate used across the codebase.
+"""
+from functools import lru_cache
+from typing import Callable, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4
+
+
+@lru_cache(maxsize=32)
+def get_encoder(model: Optional[str] = None) -> Callable[[str], int]:
+    """Return a cached token-count function for a model"""
+    if tiktoken is None:
+        return estimate_tokens
+    try:
+        encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+    except KeyError:
+        # Non-OpenAI model names: approximate with the default BPE
+        encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        # Encoding files unavailable (e.g. offline); keep the cheap estimate
+        return estimate_tokens
+
+    def count(text: str) -> int:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return count
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens in text for the given model"""
+    if not text:
+        return 0
+    return get_encoder(model)(text)
@@ -1,12 +1,16 @@
 """Pytest configuration for AI Synapse tests."""
 import importlib
 import os
+import tempfile
+from collections import deque
 from unittest.mock import patch
 
 import pytest
 
 # Default: never hit live providers in tests
 os.environ.setdefault("AI_ENGINE_MODE", "testing")
+# Keep the chat SQLite files (and their WAL sidecars) out of the working tree
+os.environ.setdefault("CHAT_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="ai-engine-tests-"), "chat_data.db"))
 
 try:
     import pytest_asyncio  # noqa: F401
@@ -30,6 +34,7 @@ def _reset_test_harness_state(engine) -> None:
     """Clear persisted key stats so mock-provider tests start from alpha."""
     if "test_harness" not in engine.providers:
         return
+    from core.ai_engine import _REQUEST_LOG_MAXLEN, KeyStats
 
     engine.providers["test_harness"]["api_keys"] = [
         "test-key-alpha",
@@ -38,20 +43,9 @@ def _reset_test_harness_state(engine) -> None:
     ]
     engine.provider_key_rotation["test_harness"] = 0
     engine.flagged_keys.pop("test_harness", None)
-    engine.key_usage_stats["test_harness"] = {
-        f"key_{i}": {
-            "requests": 0,
-            "successes": 0,
-            "failures": 0,
-            "last_used": None,
-            "rate_limited": False,
-            "weight": 1.0,
-            "requests_this_minute": 0,
-        }
-        for i in range(3)
-    }
-    engine.key_request_count["test_harness"] = {f"key_{i}": [] for i in range(3)}
-    engine.key_last_used["test_harness"] = {f"key_{i}": None for i in range(3)}
+    engine.key_usage_stats["test_harness"] = {i: KeyStats() for i in range(3)}
+    engine.key_request_count["test_harness"] = {i: deque(maxlen=_REQUEST_LOG_MAXLEN) for i in range(3)}
+    engine.key_last_used["test_harness"] = {i: None for i in range(3)}
 
 
 @pytest.fixture
@@ -1,11 +1,12 @@
 """Tests for ai_engine.py module"""
 import time
-from datetime import datetime, timedelta
+from collections import deque
 
 import pytest
+import requests
 from unittest.mock import patch
 
-from core.ai_engine import AI_engine, RequestResult
+from core.ai_engine import AI_engine, KeyStats, RequestResult
 
 
 def _setup_rotation_provider(engine, name="rotation_test", keys=None):
@@ -31,18 +32,9 @@ def _setup_rotation_provider(engine, name="rotation_test", keys=None):
     engine.key_last_used[name] = {}
     engine.key_request_count[name] = {}
     for i in range(len(keys)):
-        key_id = f"key_{i}"
-        engine.key_usage_stats[name][key_id] = {
-            "requests": 0,
-            "successes": 0,
-            "failures": 0,
-            "last_used": None,
-            "rate_limited": False,
-            "weight": 1.0,
-            "requests_this_minute": 0,
-        }
-        engine.key_last_used[name][key_id] = None
-        engine.key_request_count[name][key_id] = []
+        engine.key_usage_stats[name][i] = KeyStats()
+        engine.key_last_used[name][i] = None
+        engine.key_request_count[name][i] = deque()
     return name
 
 
@@ -87,6 +79,17 @@ def test_request_result_with_values():
     assert r.provider_used == "openai"
 
 
+def test_request_result_is_slotted_and_frozen():
+    from dataclasses import FrozenInstanceError, replace
+
+    r = RequestResult(success=True, raw_response={"id": "x"})
+    assert not hasattr(r, "__dict__")
+    with pytest.raises(FrozenInstanceError):
+        r.content = "changed"
+    assert replace(r, provider_used="p").provider_used == "p"
+    assert hash(r) == hash(RequestResult(success=True, raw_response={"id": "y"}))
+
+
 # === Initialization Tests ===
 
 def test_engine_init(engine):
@@ -134,10 +137,9 @@ def test_is_key_flagged_no_flag(engine):
 
 
 def test_is_key_flagged_with_flag(engine):
-    from datetime import datetime, timedelta
     engine.flagged_keys["test_provider"] = {
-        "flagged_at": datetime.now(),
-        "flag_until": datetime.now() + timedelta(hours=1),
+        "flagged_at": time.monotonic(),
+        "flag_until": time.monotonic() + 3600,
         "error_type": "rate_limit"
     }
     assert engine._is_key_flagged("test_provider") is True
@@ -145,14 +147,41 @@ def test_is_key_flagged_with_flag(engine):
 
 def test_is_key_flagged_expired(engine):
     engine.flagged_keys["test_provider"] = {
-        "flagged_at": datetime.now() - timedelta(hours=2),
-        "flag_until": datetime.now() - timedelta(hours=1),
+        "flagged_at": time.monotonic() - 7200,
+        "flag_until": time.monotonic() - 3600,
         "error_type": "rate_limit"
     }
     assert engine._is_key_flagged("test_provider") is False
     assert "test_provider" not in engine.flagged_keys
 
 
+def test_key_stats_are_slotted_records(engine):
+    provider = _setup_rotation_provider(engine)
+    stats = engine.key_usage_stats[provider][0]
+    assert isinstance(stats, KeyStats)
+    assert not hasattr(stats, "__dict__")
+    engine._update_key_stats(provider, 0, success=False)
+    assert stats.failures == 1
+    assert stats.weight > 1.0
+
+def test_expire_flags_pops_due_entries_and_skips_stale_ones(engine):
+    engine._flag_key("p_short", "unknown")   # 30 minutes
+    engine._flag_key("p_long", "rate_limit")  # 1 hour
+    engine._flag_provider("p_short", duration_minutes=120)  # re-flag outlives the first entry
+    later = time.monotonic() + 2400
+    engine._now = lambda: later
+
+    engine._expire_flags()
+
+    assert "p_short" in engine.flagged_keys
+    assert "p_long" in engine.flagged_keys
+    assert engine._unflag_heap[0][0] > later
+    engine._now = lambda: later + 7200
+    assert engine._is_key_flagged("p_long") is False
+    assert engine._is_key_flagged("p_short") is False
+    assert engine._unflag_heap == []
+
+
 def test_select_optimal_key_returns_none_without_keys(engine):
     engine.providers["empty_keys"] = {"enabled": True, "api_keys": []}
     assert engine._select_optimal_key("empty_keys") is None
@@ -164,10 +193,21 @@ def test_select_optimal_key_single_key_returns_index(engine):
     assert engine._select_optimal_key(provider) == 0
 
 
+def test_valid_key_indices_cached_until_key_list_replaced(engine):
+    provider = _setup_rotation_provider(engine, keys=["a", None, "c"])
+    keys = engine.providers[provider]["api_keys"]
+    first = engine._valid_key_indices(provider, keys)
+    assert first == (0, 2)
+    assert engine._valid_key_indices(provider, keys) is first
+
+    engine.providers[provider]["api_keys"] = [None, "b"]
+    assert engine._valid_key_indices(provider, engine.providers[provider]["api_keys"]) == (1,)
+
+
 def test_select_optimal_key_prefers_lower_load_key(engine):
     provider = _setup_rotation_provider(engine)
-    engine.key_request_count[provider]["key_0"] = [datetime.now(), datetime.now()]
-    engine.key_usage_stats[provider]["key_0"]["weight"] = 2.0
+    engine.key_request_count[provider][0] = deque([time.monotonic(), time.monotonic()])
+    engine.key_usage_stats[provider][0].weight = 2.0
     selected = engine._select_optimal_key(provider)
     assert selected in (1, 2)
     assert selected != 0
@@ -175,8 +215,8 @@ def test_select_optimal_key_prefers_lower_load_key(engine):
 
 def test_select_optimal_key_skips_recently_rate_limited_key(engine):
     provider = _setup_rotation_provider(engine)
-    engine.key_usage_stats[provider]["key_0"]["rate_limited"] = True
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].rate_limited = True
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     selected = engine._select_optimal_key(provider)
     assert selected in (1, 2)
 
@@ -189,7 +229,7 @@ def test_rotate_api_key_disabled_returns_current_key(engine):
         rotated = engine._rotate_api_key(provider)
     get_key.assert_called_once_with(provider)
     assert rotated == "second"
-    assert engine.key_usage_stats[provider]["key_0"]["rate_limited"] is False
+    assert engine.key_usage_stats[provider][0].rate_limited is False
 
 
 def test_rotate_api_key_single_key_returns_current(engine):
@@ -202,17 +242,17 @@ def test_rotate_api_key_single_key_returns_current(engine):
 def test_rotate_api_key_changes_provider_index(engine):
     provider = _setup_rotation_provider(engine)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     rotated = engine._rotate_api_key(provider)
     assert rotated in ("key-beta", "key-gamma")
     assert engine.provider_key_rotation[provider] != 0
-    assert engine.key_usage_stats[provider]["key_0"]["rate_limited"] is True
+    assert engine.key_usage_stats[provider][0].rate_limited is True
 
 
 def test_handle_provider_failure_rate_limit_rotates_key(engine):
     provider = _setup_rotation_provider(engine)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     engine._handle_provider_failure(provider, "rate limit exceeded", 429)
     assert engine.provider_key_rotation[provider] != 0
     assert provider in engine.flagged_keys
@@ -222,7 +262,7 @@ def test_handle_provider_failure_rate_limit_rotates_key(engine):
 def test_handle_provider_failure_auth_error_rotates_key(engine):
     provider = _setup_rotation_provider(engine)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     engine._handle_provider_failure(provider, "invalid api key", 401)
     assert engine.provider_key_rotation[provider] != 0
     assert engine.flagged_keys[provider]["error_type"] == "auth_error"
@@ -231,7 +271,7 @@ def test_handle_provider_failure_auth_error_rotates_key(engine):
 def test_handle_provider_failure_quota_exceeded_rotates_key(engine):
     provider = _setup_rotation_provider(engine)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     engine._handle_provider_failure(provider, "daily limit exceeded", 200)
     assert engine.provider_key_rotation[provider] != 0
     assert engine.flagged_keys[provider]["error_type"] == "quota_exceeded"
@@ -248,7 +288,7 @@ def test_handle_provider_failure_server_error_does_not_rotate_key(engine):
 def test_handle_provider_failure_unknown_rotates_after_two_failures(engine):
     provider = _setup_rotation_provider(engine)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     engine._handle_provider_failure(provider, "something weird", 418)
     assert engine.provider_key_rotation[provider] == 0
     engine._handle_provider_failure(provider, "something weird again", 418)
@@ -268,7 +308,7 @@ def test_roll_api_key_multi_key_rotates(engine):
     provider = _setup_rotation_provider(engine)
     engine.engine_settings["key_rotation_enabled"] = True
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     result = engine.roll_api_key(provider)
     assert "Rolled" in result or "rolled" in result.lower()
     assert engine.provider_key_rotation[provider] != 0
@@ -294,7 +334,7 @@ def test_roll_api_key_message_truncates_long_key_preview(engine):
         keys=["abcdefghijklmnop", "key-beta", "key-gamma"],
     )
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     result = engine.roll_api_key(provider)
     assert "abcdefgh..." in result
     assert "key #0" in result
@@ -333,7 +373,7 @@ def test_roll_api_key_successful_roll_message_format(engine):
         keys=["key-alpha", "key-beta", "key-gamma"],
     )
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     result = engine.roll_api_key(provider)
     new_index = engine.provider_key_rotation[provider]
     assert result.startswith("✅ Rolled from key #0 (key-alph...) to key #")
@@ -349,7 +389,7 @@ def test_roll_api_key_short_key_preview_no_truncation(engine):
         keys=["short01", "short02", "short03"],
     )
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     result = engine.roll_api_key(provider)
     assert "..." not in result
     assert "short01" in result
@@ -381,6 +421,17 @@ def test_handle_provider_failure_flags_after_consecutive_limit(engine):
     assert engine.consecutive_failures[provider] == 3
 
 
+def test_get_flagged_providers_reports_wall_clock_times(engine):
+    from datetime import datetime, timedelta
+
+    engine._flag_provider("test_provider", duration_minutes=30)
+    info = engine.get_flagged_providers()["test_provider"]
+    assert isinstance(info["flagged_at"], datetime)
+    assert abs(info["flagged_at"] - datetime.now()) < timedelta(seconds=5)
+    assert info["flag_until"] - info["flagged_at"] == timedelta(minutes=30)
+    assert isinstance(engine.flagged_keys["test_provider"]["flagged_at"], float)
+
+
 # === Error Classification Tests ===
 
 def test_classify_rate_limit(engine):
@@ -416,6 +467,21 @@ def test_classify_bad_request(engine):
     assert engine._classify_error("invalid request", 400) == "bad_request"
 
 
+def test_classify_category_priority_is_independent_of_text_order(engine):
+    # Auth outranks network even when the network signature appears first
+    assert engine._classify_error("Read Timeout then INVALID TOKEN", 0) == "auth_error"
+
+
+def test_classify_skips_json_stringification_when_not_needed(engine):
+    class NoStr(dict):
+        def __repr__(self):
+            raise AssertionError("response JSON was stringified")
+
+    body = NoStr(error={"message": "x" * 10_000})
+    assert engine._classify_error("slow down", 429, body) == "rate_limit"
+    assert engine._classify_error("rate limit exceeded", 500, body) == "rate_limit"
+
+
 def test_classify_unknown(engine):
     assert engine._classify_error("something weird happened", 200) == "unknown"
 
@@ -527,6 +593,51 @@ def test_streaming_non_retryable_error_is_terminal(testing_engine):
     assert stream.call_count == 1
 
 
+def test_stream_chat_completion_yields_text_and_raises_on_error(testing_engine):
+    chunks = [{"content": "Hel"}, {"content": ""}, {"content": "lo"}, {"done": True}]
+    testing_engine.chat_completion_stream = lambda messages, model=None, **kw: iter(chunks)
+    assert list(testing_engine.stream_chat_completion([{"role": "user", "content": "hi"}])) == ["Hel", "lo"]
+
+    testing_engine.chat_completion_stream = lambda messages, model=None, **kw: iter(
+        [{"error": "All providers failed for streaming", "done": True}]
+    )
+    with pytest.raises(RuntimeError, match="All providers failed"):
+        list(testing_engine.stream_chat_completion([{"role": "user", "content": "hi"}]))
+
+
+async def test_astream_chat_completion_bridges_thread_stream(testing_engine):
+    chunks = [{"content": "a"}, {"content": "b"}, {"done": True}]
+    testing_engine.chat_completion_stream = lambda messages, model=None, **kw: iter(chunks)
+    pieces = [piece async for piece in testing_engine.astream_chat_completion([{"role": "user", "content": "hi"}])]
+    assert pieces == ["a", "b"]
+
+    testing_engine.chat_completion_stream = lambda messages, model=None, **kw: iter([{"error": "boom", "done": True}])
+    with pytest.raises(RuntimeError, match="boom"):
+        async for _ in testing_engine.astream_chat_completion([{"role": "user", "content": "hi"}]):
+            pass
+
+
+async def test_astream_chat_completion_early_close_stops_producer(testing_engine):
+    from core.streaming import _STREAM_QUEUE_MAXSIZE
+
+    produced = []
+
+    def endless(messages, model=None, **kw):
+        while True:
+            produced.append(len(produced))
+            yield {"content": "x"}
+
+    testing_engine.chat_completion_stream = endless
+    stream = testing_engine.astream_chat_completion([{"role": "user", "content": "hi"}])
+    assert await stream.__anext__() == "x"
+    await stream.aclose()  # returns only once the worker thread has finished
+
+    count = len(produced)
+    time.sleep(0.2)
+    assert len(produced) == count
+    assert count <= _STREAM_QUEUE_MAXSIZE + 2
+
+
 def test_chat_completion_no_providers():
     engine = AI_engine(verbose=False)
     engine.providers = {}
@@ -576,6 +687,50 @@ def test_chat_completion_provider_model_parse(engine):
         assert result.success is True
 
 
+
+def test_deterministic_chat_results_are_served_from_lru(engine):
+    messages = [{"role": "user", "content": "hi"}]
+    ok = RequestResult(success=True, content="cached answer", provider_used="p")
+    with patch.object(engine, "_request_with_key_rotation", return_value=ok) as mock_req:
+        first = engine.chat_completion(messages=messages, model="m", temperature=0, use_cache=True)
+        second = engine.chat_completion(messages=messages, model="m", temperature=0, use_cache=True)
+        assert first.content == second.content == "cached answer"
+        assert mock_req.call_count == 1
+        assert engine.cache_stats()["hits"] == 1
+
+        engine.chat_completion(messages=messages, model="m", temperature=0.7)
+        engine.chat_completion(messages=messages, model="m", temperature=0.7)
+        engine.chat_completion(messages=messages, model="m", temperature=0, stream=True)
+        assert mock_req.call_count == 4
+
+
+def test_deterministic_results_not_cached_for_formats_without_temperature(engine):
+    messages = [{"role": "user", "content": "hi"}]
+    ok = RequestResult(success=True, content="sampled", provider_used="a3z")
+    with patch.object(engine, "_get_available_providers", return_value=[("a3z", {"format": "a3z_get"})]), \
+            patch.object(engine, "_request_with_key_rotation", return_value=ok) as mock_req:
+        engine.chat_completion(messages=messages, model="m", temperature=0)
+        engine.chat_completion(messages=messages, model="m", temperature=0)
+    assert mock_req.call_count == 2
+
+
+def test_deterministic_autodecide_results_are_cached(engine):
+    provider_name = next(iter(engine.providers))
+    messages = [{"role": "user", "content": "hi"}]
+    ok = RequestResult(success=True, content="picked", provider_used=provider_name)
+    with patch.object(engine, "_discover_model_providers", return_value=[provider_name]), \
+            patch.object(engine, "_select_best_provider", return_value=(provider_name, "m-exact")), \
+            patch.object(engine, "_is_key_flagged", return_value=False), \
+            patch.object(engine, "_request_with_key_rotation", return_value=ok) as mock_req:
+        first = engine.chat_completion(messages=messages, model="m", temperature=0)
+        second = engine.chat_completion(messages=messages, model="m", temperature=0)
+
+    assert first.content == second.content == "picked"
+    assert mock_req.call_count == 1
+    assert mock_req.call_args.args[0] == provider_name
+    assert engine.cache_stats()["hits"] == 1
+
+
 # === Stress Test Tests ===
 
 def test_stress_test_sequential_no_providers(engine):
@@ -583,6 +738,105 @@ def test_stress_test_sequential_no_providers(engine):
     assert results == {}
 
 
+def test_stress_test_threaded_overlaps_providers(engine):
+    def slow_request(provider_name, provider_config, messages, **kwargs):
+        time.sleep(0.2)
+        if provider_name == "bad":
+            raise RuntimeError("boom")
+        return RequestResult(success=True, content="ok", provider_used=provider_name)
+
+    providers = {name: {} for name in ("a", "b", "c", "bad")}
+    with patch.object(engine, "_make_request", side_effect=slow_request):
+        start = time.monotonic()
+        results = engine._stress_test_threaded(providers, 1, "test")
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.6
+    assert {name for name, r in results.items() if r["passed"]} == {"a", "b", "c"}
+    assert results["bad"]["errors"][0]["error_type"] == "exception"
+
+
+def test_test_specific_provider_times_with_engine_clock(engine, monkeypatch):
+    provider_name = next(iter(engine.providers))
+    clock = iter([100.0, 102.5])
+    monkeypatch.setattr(engine, "_now", lambda: next(clock))
+    ok = RequestResult(success=True, content="ok")
+    with patch.object(engine, "_is_key_flagged", return_value=False), \
+            patch.object(engine, "_make_request", return_value=ok), \
+            patch.object(engine, "_update_stats") as update_stats:
+        result = engine.test_specific_provider(provider_name)
+
+    assert result.response_time == 2.5
+    update_stats.assert_called_once_with(provider_name, True, 2.5, now=102.5)
+
+
+def test_test_specific_provider_reports_request_exceptions(engine, monkeypatch):
+    provider_name = next(iter(engine.providers))
+    clock = iter([100.0, 101.5])
+    monkeypatch.setattr(engine, "_now", lambda: next(clock))
+    with patch.object(engine, "_is_key_flagged", return_value=False), \
+            patch.object(engine, "_make_request", side_effect=requests.ConnectionError("refused")), \
+            patch.object(engine, "_update_stats") as update_stats:
+        result = engine.test_specific_provider(provider_name)
+
+    assert result.success is False
+    assert result.error_type == "request_exception"
+    assert result.response_time == 1.5
+    update_stats.assert_called_once_with(provider_name, False, 1.5, now=101.5)
+
+
+async def test_stress_test_providers_async_overlaps_iterations(engine):
+    def slow_request(provider_name, provider_config, messages, **kwargs):
+        time.sleep(0.2)
+        return RequestResult(success=provider_name != "down", error_message="nope", provider_used=provider_name)
+
+    engine.providers = {"up": {"enabled": True}, "down": {"enabled": True}, "off": {"enabled": False}}
+    with patch.object(engine, "_make_request", side_effect=slow_request) as make_request:
+        start = time.monotonic()
+        results = await engine.stress_test_providers_async(test_iterations=2)
+        elapsed = time.monotonic() - start
+
+    assert make_request.call_count == 4
+    assert elapsed < 0.4
+    assert set(results) == {"up", "down"}
+    assert results["up"]["passed"] and len(results["up"]["response_times"]) == 2
+    assert results["down"]["failed_tests"] == 2
+    assert [e["iteration"] for e in results["down"]["errors"]] == [1, 2]
+
+
+def test_stress_test_provider_concurrent_iterations_overlap(engine):
+    calls = iter(range(100))
+
+    def slow_request(provider_name, provider_config, messages, **kwargs):
+        n = next(calls)
+        time.sleep(0.2)
+        if n == 1:
+            raise RuntimeError("boom")
+        return RequestResult(success=True, content="ok")
+
+    with patch.object(engine, "_make_request", side_effect=slow_request):
+        start = time.monotonic()
+        report = engine._stress_test_provider("p", {}, 4, "test", concurrent_iterations=True)
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5
+    assert report["successful_tests"] == 3 and report["failed_tests"] == 1
+    assert report["errors"][0]["error_type"] == "exception"
+
+
+def test_summarize_response_times_single_sort_with_p95():
+    from core.stress_test import _summarize_response_times
+
+    summary = _summarize_response_times([float(t) for t in range(20, 0, -1)])
+    assert summary == {
+        "avg_response_time": 10.5,
+        "min_response_time": 1.0,
+        "max_response_time": 20.0,
+        "p95_response_time": 19.0,
+    }
+    assert _summarize_response_times([])["p95_response_time"] == 0
+
+
 def test_stress_test_provider_score(engine):
     test_results = {
         "p1": {"passed": True, "success_rate": 90, "avg_response_time": 1.0, "response_times": [1.0]},
@@ -595,6 +849,19 @@ def test_stress_test_provider_score(engine):
     engine._optimize_priorities(test_results)
 
 
+def test_optimize_priorities_breaks_score_ties_on_speed(engine):
+    # Both score 60 + 40 * max(0, 100 - 20 * t) with t >= 5 -> 60.0
+    test_results = {
+        "slow": {"passed": True, "success_rate": 100, "avg_response_time": 6.0},
+        "fast": {"passed": True, "success_rate": 100, "avg_response_time": 5.0},
+    }
+    engine.providers = {"slow": {"priority": 1}, "fast": {"priority": 2}}
+    with patch.object(engine, "_save_priority_changes_to_config"):
+        engine._optimize_priorities(test_results)
+    assert engine.providers["fast"]["priority"] == 1
+    assert engine.providers["slow"]["priority"] == 2
+
+
 # === Roll API Key Tests ===
 
 def test_roll_api_key_single_key(engine):
@@ -618,17 +885,28 @@ def test_make_request_unknown_format(engine):
     assert result.error_type in ("unsupported_format", "request_exception", "provider_exception")
 
 
+def test_key_usage_report_converts_monotonic_last_used_to_datetime(engine):
+    from datetime import datetime
+
+    provider = _setup_rotation_provider(engine)
+    engine.stats_manager = None
+    engine.key_usage_stats[provider][0].last_used = time.monotonic() - 30
+    report = engine.get_key_usage_report(provider)
+    last_used = report["Key #1"]["last_used"]
+    assert isinstance(last_used, datetime)
+    assert 25 < (datetime.now() - last_used).total_seconds() < 35
+
+
 # === Cleanup Request Counts ===
 
 def test_cleanup_request_counts(engine):
-    from datetime import datetime, timedelta
     provider_name = list(engine.providers.keys())[0]
     # Initialize the structure first
     engine.key_request_count[provider_name] = {
-        "key_0": [datetime.now() - timedelta(minutes=3), datetime.now()]
+        0: deque([time.monotonic() - 180, time.monotonic() - 90, time.monotonic()])
     }
     engine._cleanup_request_counts(provider_name)
-    assert len(engine.key_request_count[provider_name]["key_0"]) == 1
+    assert len(engine.key_request_count[provider_name][0]) == 1
 
 
 def test_cleanup_request_counts_empty(engine):
@@ -656,3 +934,297 @@ def test_check_provider_recovery_flagged(engine):
 def test_check_provider_recovery_recent_failure(engine):
     provider_name = list(engine.providers.keys())[0]
     assert engine._check_provider_recovery(provider_name) is True
+
+
+# === Async completion ===
+
+async def test_chat_completion_async_bounded_by_max_concurrency(engine):
+    import threading
+
+    engine.engine_settings["max_concurrency"] = 2
+    engine._async_semaphore = None
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def fake_completion(messages, model=None, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return RequestResult(success=True, content=messages[0]["content"])
+
+    try:
+        with patch.object(engine, "chat_completion", side_effect=fake_completion):
+            batch = [[{"role": "user", "content": str(i)}] for i in range(6)]
+            results = await engine.chat_completion_many_async(batch)
+    finally:
+        engine.engine_settings["max_concurrency"] = 8
+
+    assert [r.content for r in results] == [str(i) for i in range(6)]
+    assert active["peak"] == 2
+
+
+async def test_chat_completion_async_race_k_overrides_hedge_setting(engine):
+    winner = RequestResult(success=True, content="fast", provider_used="fast")
+    with patch.object(engine, "_hedged_dispatch", return_value=winner) as hedged, \
+            patch.object(engine, "chat_completion") as sync_completion:
+        result = await engine.chat_completion_async([{"role": "user", "content": "hi"}], race_k=3)
+        await engine.chat_completion_async([{"role": "user", "content": "hi"}], race_k=1)
+
+    assert result is winner
+    assert hedged.call_args.kwargs["k"] == 3
+    assert hedged.call_count == 1
+    assert sync_completion.call_count == 1
+
+
+async def test_aiohttp_session_is_reused_until_aclose():
+    eng = AI_engine(verbose=False)
+    first = await eng._get_session()
+    assert await eng._get_session() is first
+    assert eng.achat_completion == eng.chat_completion_async
+
+    await eng.aclose()
+    assert first.closed
+    second = await eng._get_session()
+    assert second is not first
+    await eng.aclose()
+
+
+def test_aiohttp_session_from_a_finished_loop_is_closed():
+    import asyncio
+
+    eng = AI_engine(verbose=False)
+    stale = asyncio.run(eng._get_session())  # its loop is closed once run() returns
+    assert not stale.closed
+
+    async def reuse():
+        fresh = await eng._get_session()
+        await eng.aclose()
+        return fresh
+
+    assert asyncio.run(reuse()) is not stale
+    assert stale.closed
+
+
+# === HTTP session ownership ===
+
+def test_injected_session_is_shared_and_not_closed():
+    import requests
+    from unittest.mock import MagicMock
+
+    shared = MagicMock(spec=requests.Session)
+    with AI_engine(verbose=False, session=shared) as eng:
+        assert eng._http_session is shared
+    shared.close.assert_not_called()
+
+
+def test_owned_session_uses_pool_settings():
+    eng = AI_engine(verbose=False)
+    adapter = eng._http_session.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == eng.engine_settings["http_pool"]["pool_maxsize"]
+    eng.close()
+
+
+def test_owned_session_retries_gateway_errors_in_connection():
+    eng = AI_engine(verbose=False)
+    retries = eng._http_session.get_adapter("https://example.com").max_retries
+    assert retries.total == eng.engine_settings["http_pool"]["transport_retries"]
+    assert set(retries.status_forcelist) == set(eng.engine_settings["retry"]["retry_statuses"])
+    assert 429 not in retries.status_forcelist
+    assert "POST" in retries.allowed_methods
+    assert retries.respect_retry_after_header is True
+    eng.close()
+
+
+def test_owned_session_does_not_retry_read_timeouts():
+    import socket
+    import threading
+
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    accepted = []
+
+    def accept_and_stall():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            accepted.append(conn)  # never respond
+
+    threading.Thread(target=accept_and_stall, daemon=True).start()
+    eng = AI_engine(verbose=False)
+    try:
+        with pytest.raises(requests.Timeout):
+            eng._http_session.post(f"http://127.0.0.1:{server.getsockname()[1]}/v1", json={}, timeout=(1, 0.2))
+        assert len(accepted) == 1
+    finally:
+        eng.close()
+        server.close()
+        for conn in accepted:
+            conn.close()
+
+
+async def test_hedged_dispatch_returns_first_success(engine):
+    def fake_request(provider_name, provider_config, messages, model=None, **kwargs):
+        if provider_name == "slow":
+            time.sleep(0.3)
+        return RequestResult(success=True, content=provider_name, provider_used=provider_name)
+
+    candidates = [("slow", {}), ("fast", {})]
+    with patch.object(engine, "_get_available_providers", return_value=candidates), \
+            patch.object(engine, "_request_with_key_rotation", side_effect=fake_request):
+        result = await engine._hedged_dispatch([{"role": "user", "content": "hi"}], k=2, delay_ms=10)
+
+    assert result.success is True
+    assert result.provider_used == "fast"
+
+
+async def test_hedged_dispatch_starts_backup_when_primary_fails(engine):
+    calls = []
+
+    def fake_request(provider_name, provider_config, messages, model=None, **kwargs):
+        calls.append(provider_name)
+        if provider_name == "broken":
+            return RequestResult(success=False, error_message="boom", provider_used=provider_name)
+        return RequestResult(success=True, content="ok", provider_used=provider_name)
+
+    candidates = [("broken", {}), ("backup", {})]
+    with patch.object(engine, "_get_available_providers", return_value=candidates), \
+            patch.object(engine, "_request_with_key_rotation", side_effect=fake_request):
+        result = await engine._hedged_dispatch([{"role": "user", "content": "hi"}], k=2, delay_ms=5000)
+
+    assert result.provider_used == "backup"
+    assert calls == ["broken", "backup"]
+
+
+async def test_hedged_dispatch_survives_crashing_attempt(engine):
+    def fake_request(provider_name, provider_config, messages, model=None, **kwargs):
+        if provider_name == "crashing":
+            raise ValueError("bad payload")
+        return RequestResult(success=True, content="ok", provider_used=provider_name)
+
+    candidates = [("crashing", {}), ("backup", {})]
+    with patch.object(engine, "_get_available_providers", return_value=candidates), \
+            patch.object(engine, "_request_with_key_rotation", side_effect=fake_request):
+        result = await engine._hedged_dispatch([{"role": "user", "content": "hi"}], k=2, delay_ms=5000)
+
+    assert result.provider_used == "backup"
+
+
+def test_prewarm_connections_heads_each_provider_origin_once(engine):
+    from unittest.mock import MagicMock
+
+    engine.providers = {
+        "a": {"endpoint": "https://api.one.test/v1/chat/completions"},
+        "b": {"endpoint": "https://api.one.test/v1/other"},
+        "c": {"endpoint": "http://127.0.0.1:9/v1/chat"},
+        "d": {"endpoint": ""},
+    }
+    engine._http_session = MagicMock()
+
+    assert engine.prewarm_connections(timeout=0.1) == 2
+    heads = sorted(call.args[0] for call in engine._http_session.head.call_args_list)
+    assert heads == ["http://127.0.0.1:9/", "https://api.one.test/"]
+
+
+def test_validate_providers_flags_failures_in_health_monitor(engine):
+    from unittest.mock import MagicMock
+    from core.health_monitor import health_monitor
+
+    def fake_get(url, headers=None, timeout=None):
+        if "down" in url:
+            raise requests.ConnectionError("refused")
+        return MagicMock(status_code=401 if "badkey" in url else 200)
+
+    engine.providers = {
+        "ok": {"model_endpoint": "https://ok.test/models"},
+        "down": {"model_endpoint": "https://down.test/models"},
+        "badkey": {"model_endpoint": "https://badkey.test/models"},
+        "no_models": {"endpoint": "https://x.test/chat"},
+    }
+    engine._http_session = MagicMock()
+    engine._http_session.get.side_effect = fake_get
+    try:
+        assert engine.validate_providers(timeout=0.1) == {"ok": True, "down": False, "badkey": False}
+        assert health_monitor.is_provider_healthy("ok")
+        assert not health_monitor.is_provider_healthy("down")
+        assert not health_monitor.is_provider_healthy("badkey")
+    finally:
+        for name in ("ok", "down", "badkey"):
+            health_monitor.reset_provider(name)
+
+
+def test_close_releases_owned_session_and_is_idempotent():
+    from unittest.mock import MagicMock
+
+    eng = AI_engine(verbose=False)
+    owned = MagicMock()
+    eng._http_session = owned
+    eng.close()
+    eng.close()
+    assert owned.close.call_count == 2
+
+
+def test_provider_order_uses_cached_priority_sort(engine):
+    engine.providers = {
+        "c": {"enabled": True, "priority": 3},
+        "a": {"enabled": True, "priority": 1},
+        "b1": {"enabled": True, "priority": 2},
+        "b2": {"enabled": True, "priority": 2},
+        "off": {"enabled": False, "priority": 0},
+    }
+    assert engine._get_preferred_provider_order() == ["a", "b1", "b2", "c"]
+    # Preferred provider leads its priority tier
+    assert engine._get_preferred_provider_order("b2") == ["a", "b2", "b1", "c"]
+    assert engine._providers_by_priority() is engine._providers_by_priority()
+
+    engine.providers["c"]["priority"] = 0
+    engine._invalidate_provider_order()
+    assert engine._get_preferred_provider_order()[0] == "c"
+
+
+def test_latency_ewma_routing_prefers_fastest_provider(engine):
+    from core.latency_tracker import LatencyTracker
+
+    tracker = LatencyTracker()
+    tracker.record("slow_p", 4000, success=True)
+    tracker.record("fast_p", 200, success=True)
+    engine.providers = {
+        "slow_p": {"enabled": True, "priority": 1},
+        "fast_p": {"enabled": True, "priority": 2},
+    }
+    engine.engine_settings["routing"] = "latency_ewma"
+    try:
+        with patch("core.ai_engine.latency_tracker", tracker), \
+                patch.object(engine, "_check_provider_recovery", return_value=True):
+            assert engine._get_preferred_provider_order() == ["fast_p", "slow_p"]
+            engine.engine_settings["routing"] = "static"
+            assert engine._get_preferred_provider_order() == ["slow_p", "fast_p"]
+    finally:
+        engine.engine_settings["routing"] = "static"
+
+
+def test_classify_error_status_table_keeps_text_precedence(engine):
+    assert engine._classify_error("", 401) == "auth_error"
+    assert engine._classify_error("", 502) == "server_error"
+    assert engine._classify_error("", 503) == "service_unavailable"
+    assert engine._classify_error("", 400) == "bad_request"
+    # Higher-priority message text still beats the status code's own category
+    assert engine._classify_error("rate limit hit", 401) == "rate_limit"
+    assert engine._classify_error("insufficient_quota", 502) == "quota_exceeded"
+    assert engine._classify_error("read timeout", 400) == "network_error"
+
+
+def test_load_enabled_providers_keeps_clean_key_lists_without_copying(engine, monkeypatch):
+    clean = ["k1", "k2"]
+    monkeypatch.setattr("core.ai_engine.AI_CONFIGS", {
+        "clean": {"auth_type": "bearer", "api_keys": clean, "modes": ["live", "testing"]},
+        "sparse": {"auth_type": "bearer", "api_keys": [None, "k3"], "modes": ["live", "testing"]},
+    })
+    providers = engine._load_enabled_providers()
+    assert providers["clean"]["api_keys"] is clean
+    assert providers["sparse"]["api_keys"] == ["k3"]
@@ -168,6 +168,56 @@ def test_batch_processor_max_requests():
     assert len(result) == 100  # Should be capped at 100
 
 
+def test_batch_processor_retries_transient_failures():
+    import asyncio
+    from core.batch import BatchProcessor
+    from unittest.mock import MagicMock
+
+    engine = MagicMock()
+    engine.chat_completion.side_effect = [
+        MagicMock(success=False, error_type="rate_limit", error_message="429"),
+        MagicMock(success=True, content="ok", provider_used="test", model_used="test", response_time=0.1),
+    ]
+
+    processor = BatchProcessor(engine, retry_backoff=0)
+    result = asyncio.run(processor.process_batch([{"messages": [{"role": "user", "content": "Hi"}]}]))
+
+    assert result[0]["success"] is True
+    assert engine.chat_completion.call_count == 2
+
+
+def test_batch_processor_does_not_retry_bad_request():
+    import asyncio
+    from core.batch import BatchProcessor
+    from unittest.mock import MagicMock
+
+    engine = MagicMock()
+    engine.chat_completion.return_value = MagicMock(success=False, error_type="bad_request", error_message="bad")
+
+    processor = BatchProcessor(engine, retry_backoff=0)
+    result = asyncio.run(processor.process_batch([{"messages": [{"role": "user", "content": "Hi"}]}]))
+
+    assert result[0]["success"] is False
+    assert engine.chat_completion.call_count == 1
+
+
+def test_batch_processor_reports_progress():
+    import asyncio
+    from core.batch import BatchProcessor
+    from unittest.mock import MagicMock
+
+    engine = MagicMock()
+    engine.chat_completion.return_value = MagicMock(
+        success=True, content="Response", provider_used="test", model_used="test", response_time=0.1
+    )
+    progress = []
+
+    processor = BatchProcessor(engine, on_progress=lambda done, total: progress.append((done, total)))
+    asyncio.run(processor.process_batch([{"messages": []} for _ in range(3)]))
+
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
 # === Model Search Tests ===
 
 def test_model_search_filter_provider():
@@ -1,4 +1,5 @@
 """Unit tests for Bedrock and Vertex AI request handlers."""
+import json
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -25,17 +26,17 @@ class TestBedrockHandler:
     def test_success_response(self, engine):
         mock_resp = MagicMock()
         mock_resp.status_code = 200
-        mock_resp.json.return_value = {
+        mock_resp.content = json.dumps({
             "output": {"message": {"content": [{"text": "Hello from Bedrock"}]}},
             "usage": {"inputTokens": 5, "outputTokens": 3},
-        }
+        }).encode()
         config = {
             "endpoint": "https://bedrock-runtime.us-east-1.amazonaws.com",
             "model": "anthropic.claude-3-haiku-20240307-v1:0",
             "region": "us-east-1",
             "timeout": 30,
         }
-        with patch("requests.post", return_value=mock_resp):
+        with patch.object(engine._http_session, "post", return_value=mock_resp):
             result = engine._make_bedrock_request(
                 "bedrock", config, [{"role": "user", "content": "hi"}]
             )
@@ -52,7 +53,7 @@ class TestBedrockHandler:
             "model": "anthropic.claude-3-haiku-20240307-v1:0",
             "region": "us-east-1",
         }
-        with patch("requests.post", return_value=mock_resp):
+        with patch.object(engine._http_session, "post", return_value=mock_resp):
             result = engine._make_bedrock_request(
                 "bedrock", config, [{"role": "user", "content": "hi"}]
             )
@@ -63,9 +64,9 @@ class TestBedrockHandler:
     def test_system_prompt_conversion(self, engine):
         mock_resp = MagicMock()
         mock_resp.status_code = 200
-        mock_resp.json.return_value = {
+        mock_resp.content = json.dumps({
             "output": {"message": {"content": [{"text": "ok"}]}},
-        }
+        }).encode()
         config = {
             "endpoint": "https://bedrock-runtime.us-east-1.amazonaws.com",
             "model": "anthropic.claude-3-haiku-20240307-v1:0",
@@ -75,7 +76,7 @@ class TestBedrockHandler:
             {"role": "system", "content": "Be brief."},
             {"role": "user", "content": "hi"},
         ]
-        with patch("requests.post", return_value=mock_resp) as mock_post:
+        with patch.object(engine._http_session, "post", return_value=mock_resp) as mock_post:
             result = engine._make_bedrock_request("bedrock", config, messages)
         assert result.success is True
         # Ensure POST was called with system block in payload
@@ -98,19 +99,19 @@ class TestVertexAIHandler:
         engine._get_current_api_key = MagicMock(return_value="ya29.token")
         mock_resp = MagicMock()
         mock_resp.status_code = 200
-        mock_resp.json.return_value = {
+        mock_resp.content = json.dumps({
             "candidates": [
                 {"content": {"parts": [{"text": "Hello from Vertex"}]}}
             ],
             "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 4},
-        }
+        }).encode()
         config = {
             "project_id": "my-project",
             "region": "us-central1",
             "model": "gemini-1.5-pro",
             "timeout": 30,
         }
-        with patch("requests.post", return_value=mock_resp):
+        with patch.object(engine._http_session, "post", return_value=mock_resp):
             result = engine._make_vertex_ai_request(
                 "vertex", config, [{"role": "user", "content": "hi"}]
             )
@@ -127,7 +128,7 @@ class TestVertexAIHandler:
             "region": "us-central1",
             "model": "gemini-1.5-pro",
         }
-        with patch("requests.post", return_value=mock_resp):
+        with patch.object(engine._http_session, "post", return_value=mock_resp):
             result = engine._make_vertex_ai_request(
                 "vertex", config, [{"role": "user", "content": "hi"}]
             )
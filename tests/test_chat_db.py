@@ -1,4 +1,5 @@
 """Tests for chat_module/db.py"""
+import json
 import os
 import pytest
 
@@ -28,6 +29,14 @@ def test_db_tables_exist(chat_db):
         assert "messages" in table_names
 
 
+def test_db_uses_wal_and_tuned_pragmas(chat_db):
+    conn = chat_db._conn()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+
 # === Chat Operations ===
 
 def test_create_chat(chat_db):
@@ -81,6 +90,44 @@ def test_get_chats_include_temporary(chat_db):
     assert len(chats) == 2
 
 
+def test_get_chats_last_message_and_count(chat_db):
+    busy = chat_db.create_chat(title="Busy")
+    empty = chat_db.create_chat(title="Empty")
+    for i in range(3):
+        chat_db.add_message(chat_id=busy, role="user", content=f"Msg {i}")
+    chats = {c["id"]: c for c in chat_db.get_chats()}
+    assert chats[busy]["message_count"] == 3
+    assert chats[busy]["last_message"] == "Msg 2"
+    assert chats[empty]["message_count"] == 0
+    assert chats[empty]["last_message"] is None
+
+
+def test_chat_message_stats_follow_deletes(chat_db):
+    chat_id = chat_db.create_chat(title="Busy")
+    first = chat_db.add_message(chat_id=chat_id, role="user", content="first")
+    chat_db.add_message(chat_id=chat_id, role="assistant", content="second")
+    chat_db.delete_messages_after(chat_id, first)
+    chat = chat_db.get_chats()[0]
+    assert (chat["message_count"], chat["last_message_id"], chat["last_message"]) == (1, first, "first")
+
+
+def test_chat_message_stats_backfilled_on_upgrade(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "legacy.db")
+    legacy = ChatDB(db_path=db_path)
+    chat_id = legacy.create_chat(title="Old")
+    legacy.add_messages(chat_id, [("user", "a", None, 0, None), ("assistant", "b", None, 0, None)])
+    legacy.close()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TRIGGER chats_msg_ai")
+        conn.execute("DROP TRIGGER chats_msg_ad")
+        conn.execute("ALTER TABLE chats DROP COLUMN last_message_id")
+        conn.execute("ALTER TABLE chats DROP COLUMN message_count")
+
+    chat = ChatDB(db_path=db_path).get_chats()[0]
+    assert (chat["message_count"], chat["last_message"]) == (2, "b")
+
+
 def test_delete_chat(chat_db):
     chat_id = chat_db.create_chat(title="To Delete")
     assert chat_db.delete_chat(chat_id) is True
@@ -109,6 +156,13 @@ def test_update_chat_invalid_fields(chat_db):
     assert chat_db.update_chat(chat_id, invalid_field="value") is False
 
 
+def test_update_chat_leaves_other_fields_and_can_clear(chat_db):
+    chat_id = chat_db.create_chat(title="T", model="m1", system_prompt="be brief")
+    chat_db.update_chat(chat_id, model="m2", system_prompt=None, ignored="x")
+    chat = chat_db.get_chat(chat_id)
+    assert (chat["title"], chat["model"], chat["system_prompt"]) == ("T", "m2", None)
+
+
 # === Message Operations ===
 
 def test_add_message(chat_db):
@@ -126,6 +180,38 @@ def test_add_message_chat_not_found(chat_db):
         chat_db.add_message(chat_id=99999, role="user", content="Hi")
 
 
+def test_add_messages_bulk(chat_db):
+    chat_id = chat_db.create_chat(title="Test")
+    user_id = chat_db.add_message(chat_id=chat_id, role="user", content="Hello")
+    inserted = chat_db.add_messages(chat_id, [
+        ("assistant", "Part 1", {"chunk": 1}, 3, user_id),
+        ("assistant", "Part 2", None, None, user_id),
+    ])
+    assert inserted == 2
+    messages = chat_db.get_messages(chat_id)
+    assert [m["content"] for m in messages] == ["Hello", "Part 1", "Part 2"]
+    assert messages[1]["metadata"] == {"chunk": 1}
+    assert messages[2]["metadata"] == {}
+    assert messages[1]["tokens"] == 3 and messages[2]["tokens"] > 0  # counted when not given
+    assert messages[2]["response_to"] == user_id
+
+
+def test_add_messages_returning_ids(chat_db):
+    chat_id = chat_db.create_chat(title="Test")
+    ids = chat_db.add_messages_returning(chat_id, [
+        ("user", f"Chunk {i}", None, 0, None) for i in range(5)
+    ])
+    assert len(ids) == 5 and ids == sorted(ids)
+    assert [chat_db.get_message(i)["content"] for i in ids] == [f"Chunk {i}" for i in range(5)]
+    with pytest.raises(ValueError, match="does not exist"):
+        chat_db.add_messages_returning(99999, [("user", "Hi", None, 0, None)])
+
+
+def test_add_messages_chat_not_found(chat_db):
+    with pytest.raises(ValueError, match="does not exist"):
+        chat_db.add_messages(99999, [("user", "Hi", None, 0, None)])
+
+
 def test_get_messages(chat_db):
     chat_id = chat_db.create_chat(title="Test")
     chat_db.add_message(chat_id=chat_id, role="user", content="Hello")
@@ -150,6 +236,15 @@ def test_get_messages_after_id(chat_db):
     assert len(messages) == 1
 
 
+def test_get_messages_in_insertion_order(chat_db):
+    import sqlite3
+    chat_id = chat_db.create_chat(title="Test")
+    ids = [chat_db.add_message(chat_id=chat_id, role="user", content=f"Msg {i}") for i in range(3)]
+    with sqlite3.connect(chat_db.db_path) as conn:
+        conn.execute("UPDATE messages SET created_at = '2030-01-01 00:00:00' WHERE id = ?", (ids[0],))
+    assert [m["id"] for m in chat_db.get_messages(chat_id)] == ids
+
+
 def test_get_context_messages(chat_db):
     chat_id = chat_db.create_chat(title="Test")
     chat_db.add_message(chat_id=chat_id, role="user", content="Hello", tokens=10)
@@ -166,6 +261,65 @@ def test_get_context_messages_token_limit(chat_db):
     assert len(context) < 20
 
 
+def test_get_context_messages_keeps_newest_prefix(chat_db):
+    chat_id = chat_db.create_chat(title="Test")
+    for content, tokens in (("old", 10), ("big", 100), ("recent", 10), ("newest", 10)):
+        chat_db.add_message(chat_id=chat_id, role="user", content=content, tokens=tokens)
+    context = chat_db.get_context_messages(chat_id, max_tokens=50)
+    assert [m["content"] for m in context] == ["recent", "newest"]
+
+
+def test_get_context_messages_budgets_from_covering_index(chat_db):
+    plan = chat_db._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT id, tokens FROM messages WHERE chat_id = ? ORDER BY id DESC", (1,)
+    ).fetchall()
+    assert [row[3] for row in plan] == ["SEARCH messages USING COVERING INDEX idx_messages_chat_tokens (chat_id=?)"]
+
+
+def test_get_context_messages_stops_at_budget(chat_db):
+    chat_id = chat_db.create_chat(title="Long")
+    chat_db.add_messages(chat_id, [("user", f"Msg {i}", None, 10, None) for i in range(50)])
+    seen = []
+    original = chat_db._iter_message_tokens_reverse
+
+    def tracking(conn, cid):
+        for item in original(conn, cid):
+            seen.append(item)
+            yield item
+
+    chat_db._iter_message_tokens_reverse = tracking
+    context = chat_db.get_context_messages(chat_id, max_tokens=35)
+    assert [m["content"] for m in context] == ["Msg 47", "Msg 48", "Msg 49"]
+    assert len(seen) == 4
+
+
+def test_legacy_zero_token_rows_backfilled(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "legacy.db")
+    legacy = ChatDB(db_path=db_path)
+    chat_id = legacy.create_chat(title="Old")
+    legacy.add_message(chat_id, "user", "x" * 400, tokens=5)
+    legacy.close()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE messages SET tokens = 0")
+        conn.execute("PRAGMA user_version = 0")
+
+    db = ChatDB(db_path=db_path)
+    assert db.get_messages(chat_id)[0]["tokens"] == 100
+    assert db.get_context_messages(chat_id, max_tokens=99) == []
+
+
+def test_add_message_counts_tokens_once(chat_db):
+    from core.tokenizer import count_tokens
+
+    chat_id = chat_db.create_chat(title="Test")
+    content = "A fairly ordinary sentence to count tokens for."
+    chat_db.add_message(chat_id=chat_id, role="user", content=content)
+    chat_db.add_message(chat_id=chat_id, role="user", content="explicit", tokens=7)
+    stored = [m["tokens"] for m in chat_db.get_messages(chat_id)]
+    assert stored == [count_tokens(content), 7]
+
+
 def test_message_with_metadata(chat_db):
     chat_id = chat_db.create_chat(title="Test")
     metadata = {"provider": "openai", "model": "gpt-4"}
@@ -179,6 +333,40 @@ def test_message_with_metadata(chat_db):
     assert messages[0]["metadata"]["provider"] == "openai"
 
 
+def test_metadata_round_trips_non_ascii(chat_db):
+    chat_id = chat_db.create_chat(title="Test")
+    metadata = {"note": "héllo ✓", "nested": {"n": [1, 2.5, None, True]}}
+    chat_db.add_message(chat_id=chat_id, role="user", content="Hi", metadata=metadata)
+    assert chat_db.get_messages(chat_id)[0]["metadata"] == metadata
+
+
+def test_binary_metadata_round_trip(tmp_path):
+    pytest.importorskip("msgpack")
+    db = ChatDB(db_path=str(tmp_path / "binary.db"), binary_metadata=True)
+    chat_id = db.create_chat(title="Test")
+    db.add_message(chat_id=chat_id, role="user", content="Hi", metadata={"k": [1, "v"]})
+    assert isinstance(db.get_messages(chat_id, parse_metadata=False)[0]["metadata"], bytes)
+    assert db.get_messages(chat_id)[0]["metadata"] == {"k": [1, "v"]}
+
+
+def test_binary_metadata_requires_msgpack(tmp_path, monkeypatch):
+    from ai_engine.server.chat_module import db as db_module
+
+    monkeypatch.setattr(db_module, "msgpack", None)
+    with pytest.raises(ImportError, match="msgpack"):
+        ChatDB(db_path=str(tmp_path / "binary.db"), binary_metadata=True)
+    assert db_module._decode_metadata(b"\x81\xa1k\x01") == {}
+
+
+def test_metadata_parsing_can_be_skipped(chat_db):
+    chat_id = chat_db.create_chat(title="Test")
+    chat_db.add_message(chat_id=chat_id, role="user", content="Hello", metadata={"k": 1})
+    raw = chat_db.get_messages(chat_id, parse_metadata=False)[0]["metadata"]
+    assert isinstance(raw, str) and json.loads(raw) == {"k": 1}
+    assert isinstance(chat_db.get_context_messages(chat_id)[0]["metadata"], str)
+    assert chat_db.get_messages(chat_id)[0]["metadata"] == {"k": 1}
+
+
 def test_message_with_response_to(chat_db):
     chat_id = chat_db.create_chat(title="Test")
     user_msg_id = chat_db.add_message(chat_id=chat_id, role="user", content="Hello")
@@ -193,6 +381,114 @@ def test_message_with_response_to(chat_db):
     assert assistant_msg["response_to"] == user_msg_id
 
 
+# === Search ===
+
+def test_search_messages_full_text(chat_db):
+    assert chat_db.fts_enabled
+    chat_id = chat_db.create_chat(title="Search")
+    other_id = chat_db.create_chat(title="Other")
+    chat_db.add_message(chat_id, "user", "Hello world")
+    chat_db.add_message(chat_id, "user", "world world, the whole world")
+    chat_db.add_message(chat_id, "user", "Something else")
+    chat_db.add_message(other_id, "user", "Another world")
+
+    results = chat_db.search_messages("world")
+    assert len(results) == 3
+    assert results[0]["content"] == "world world, the whole world"  # best BM25 match first
+    assert results[0]["chat_title"] == "Search"
+    assert len(chat_db.search_messages("wor", chat_id=chat_id)) == 2  # prefix terms
+    assert chat_db.search_messages('"; DROP TABLE messages; --') == []
+
+
+def test_search_index_follows_edits_and_deletes(chat_db):
+    chat_id = chat_db.create_chat(title="Sync")
+    msg_id = chat_db.add_message(chat_id, "user", "original text")
+    chat_db.edit_message(msg_id, "rewritten text")
+    assert chat_db.search_messages("original") == []
+    assert len(chat_db.search_messages("rewritten")) == 1
+
+    chat_db.delete_chat(chat_id)
+    assert chat_db.search_messages("rewritten") == []
+
+
+def test_search_index_backfills_existing_messages(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "legacy.db")
+    legacy = ChatDB(db_path=db_path)
+    legacy.add_message(legacy.create_chat(title="Old"), "user", "legacy message")
+    legacy.close()
+    with sqlite3.connect(db_path) as conn:
+        for trigger in ("messages_fts_ai", "messages_fts_ad", "messages_fts_au"):
+            conn.execute(f"DROP TRIGGER {trigger}")
+        conn.execute("DROP TABLE messages_fts")
+
+    assert len(ChatDB(db_path=db_path).search_messages("legacy")) == 1
+
+
+def test_search_messages_without_word_characters_scans(chat_db):
+    chat_id = chat_db.create_chat(title="Symbols")
+    chat_db.add_message(chat_id, "user", "100% sure?!")
+    assert len(chat_db.search_messages("?!")) == 1
+
+
+# === Result Caches ===
+
+def test_get_chat_cached_until_written(chat_db):
+    chat_id = chat_db.create_chat(title="Cached")
+    first = chat_db.get_chat(chat_id)
+    first["title"] = "mutated by caller"
+    assert chat_db.get_chat(chat_id)["title"] == "Cached"
+
+    chat_db.add_message(chat_id, "user", "hi")
+    assert chat_db.get_chat(chat_id)["message_count"] == 1
+    chat_db.update_chat(chat_id, title="Renamed")
+    assert chat_db.get_chat(chat_id)["title"] == "Renamed"
+    chat_db.delete_chat(chat_id)
+    assert chat_db.get_chat(chat_id) is None
+
+
+def test_context_cache_follows_new_and_edited_messages(chat_db):
+    chat_id = chat_db.create_chat(title="Ctx")
+    msg_id = chat_db.add_message(chat_id, "user", "first")
+    assert [m["content"] for m in chat_db.get_context_messages(chat_id)] == ["first"]
+
+    other = ChatDB(db_path=chat_db.db_path)  # a writer this instance does not see
+    other.add_message(chat_id, "assistant", "second")
+    assert [m["content"] for m in chat_db.get_context_messages(chat_id)] == ["first", "second"]
+
+    chat_db.edit_message(msg_id, "edited")
+    assert chat_db.get_context_messages(chat_id)[0]["content"] == "edited"
+
+
+def test_context_cache_returns_copies(chat_db):
+    chat_id = chat_db.create_chat(title="Ctx")
+    chat_db.add_message(chat_id, "user", "first")
+    chat_db.get_context_messages(chat_id)[0]["content"] = "mutated by caller"
+    chat_db.get_context_messages(chat_id)[0]["content"] = "mutated again"
+    assert chat_db.get_context_messages(chat_id)[0]["content"] == "first"
+
+
+def test_chat_list_cached_until_written(chat_db):
+    first = chat_db.create_chat(title="First")
+    listed = chat_db.get_chats()
+    assert [c["id"] for c in listed] == [first]
+    listed[0]["title"] = "mutated by caller"
+    assert chat_db.get_chats()[0]["title"] == "First"
+
+    second = chat_db.create_chat(title="Second")
+    assert [c["id"] for c in chat_db.get_chats()] == [second, first]
+
+    def last_message():
+        return {c["id"]: c["last_message"] for c in chat_db.get_chats()}[first]
+
+    msg_id = chat_db.add_message(first, "user", "hi")
+    assert last_message() == "hi"
+    chat_db.edit_message(msg_id, "edited")
+    assert last_message() == "edited"
+    chat_db.delete_chat(first)
+    assert [c["id"] for c in chat_db.get_chats()] == [second]
+
+
 # === Temporary Chat Operations ===
 
 def test_create_temporary_chat(chat_db):
@@ -257,6 +553,40 @@ def test_cleanup_temporary_chats(chat_db):
     assert chat_db.get_chat(chat_id) is None
 
 
+def test_cleanup_temporary_chats_keeps_recent(chat_db):
+    import sqlite3
+    recent = chat_db.create_chat(title="Recent Temp", is_temporary=True)
+    old = chat_db.create_chat(title="Old Temp", is_temporary=True)
+    with sqlite3.connect(chat_db.db_path) as conn:
+        conn.execute("UPDATE chats SET created_at = datetime('now', '-23 hours') WHERE id = ?", (recent,))
+        conn.execute("UPDATE chats SET created_at = datetime('now', '-25 hours') WHERE id = ?", (old,))
+    assert chat_db.cleanup_temporary_chats(max_age_hours=24) == 1
+    assert chat_db.get_chat(recent) is not None
+
+
+def test_cleanup_temporary_chats_fractional_hours(chat_db):
+    import sqlite3
+    recent = chat_db.create_chat(title="Recent Temp", is_temporary=True)
+    old = chat_db.create_chat(title="Old Temp", is_temporary=True)
+    with sqlite3.connect(chat_db.db_path) as conn:
+        conn.execute("UPDATE chats SET created_at = datetime('now', '-20 minutes') WHERE id = ?", (recent,))
+        conn.execute("UPDATE chats SET created_at = datetime('now', '-40 minutes') WHERE id = ?", (old,))
+    assert chat_db.cleanup_temporary_chats(max_age_hours=0.5) == 1
+    assert chat_db.get_chat(recent) is not None
+    assert chat_db.get_chat(old) is None
+
+
+def test_cleanup_temporary_chats_avoids_full_scan(chat_db):
+    permanent = chat_db.create_chat(title="Keep")
+    plan = chat_db._conn().execute(
+        "EXPLAIN QUERY PLAN DELETE FROM chats WHERE is_temporary = 1 AND created_at < ?",
+        ("2000-01-01 00:00:00",)
+    ).fetchall()
+    assert not any(row[3].startswith("SCAN chats") for row in plan)
+    assert chat_db.cleanup_temporary_chats(max_age_hours=0) == 0
+    assert chat_db.get_chat(permanent) is not None
+
+
 # === Statistics ===
 
 def test_get_chat_stats(chat_db):
@@ -275,9 +605,56 @@ def test_get_chat_stats(chat_db):
     assert stats["assistant_messages"] == 1
 
 
+def test_get_chat_stats_empty(chat_db):
+    assert set(chat_db.get_chat_stats().values()) == {0}
+
+
+def test_one_shot_queries_use_short_lived_connections(chat_db):
+    chat_db.get_chat_stats()
+    chat_db.cleanup_temporary_chats()
+    assert chat_db._connections == []
+
+
 # === Connection ===
 
+def test_reads_return_plain_dicts_and_keep_row_factory(chat_db):
+    import sqlite3
+    chat_id = chat_db.create_chat(title="Rows")
+    chat_db.add_message(chat_id, "user", "hi")
+    assert type(chat_db.get_chat(chat_id)) is dict
+    assert type(chat_db.get_messages(chat_id)[0]) is dict
+    assert chat_db._conn().row_factory is sqlite3.Row
+
+
+def test_init_analyzes_and_optimize_runs(chat_db):
+    conn = chat_db._conn()
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    chat_db.optimize()
+    chat_db.close()
+
+
 def test_get_connection(chat_db):
     conn = chat_db.get_connection()
     assert conn is not None
     conn.close()
+
+
+def test_methods_reuse_one_connection_per_thread(chat_db):
+    import sqlite3
+    import threading
+
+    conn = chat_db._conn()
+    chat_id = chat_db.create_chat(title="Reuse")
+    chat_db.add_message(chat_id, "user", "hi")
+    assert chat_db._conn() is conn
+
+    other = []
+    worker = threading.Thread(target=lambda: other.append(chat_db._conn()))
+    worker.start()
+    worker.join()
+    assert other[0] is not conn
+
+    chat_db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    assert chat_db.get_chat(chat_id)["title"] == "Reuse"  # reopens lazily
@@ -7,18 +7,24 @@ from chat_module.router import router
 
 
 @pytest.fixture
-def client(tmp_path):
+def client(tmp_path, monkeypatch):
     from fastapi import FastAPI
+    from chat_module.db import ChatDB
+    from ai_engine.server.chat_module import router as router_module
+
+    db = ChatDB(db_path=str(tmp_path / "chat.db"))
+    monkeypatch.setattr(router_module, "chat_db", db)
     app = FastAPI()
     app.include_router(router)
-    return TestClient(app)
+    yield TestClient(app)
+    db.close()
 
 
 @pytest.fixture
 def chat_db(client):
     """Create a fresh database for each test"""
-    from chat_module.router import chat_db as db
-    return db
+    from ai_engine.server.chat_module import router as router_module
+    return router_module.chat_db
 
 
 # === Chat CRUD Tests ===
@@ -62,6 +68,14 @@ def test_get_chats(client):
     assert len(chats) >= 2
 
 
+def test_get_chats_returns_typed_rows(client):
+    client.post("/api/chat/chats", json={"title": "Typed", "is_temporary": True})
+    chat = client.get("/api/chat/chats?include_temporary=true&limit=1").json()[0]
+    assert chat["is_temporary"] is True
+    assert chat["force_provider"] is False
+    assert "last_message_id" not in chat
+
+
 def test_get_chats_with_limit(client):
     for i in range(5):
         client.post("/api/chat/chats", json={"title": f"Chat {i}"})
@@ -165,6 +179,9 @@ def test_get_messages(client):
     response = client.get(f"/api/chat/chats/{chat_id}/messages")
     assert response.status_code == 200
     assert len(response.json()) >= 1
+    message = response.json()[0]
+    assert message["metadata"] == {}
+    assert set(message) == {"id", "chat_id", "role", "content", "metadata", "tokens", "created_at", "response_to"}
 
 
 def test_get_messages_with_after_id(client):
@@ -214,3 +231,149 @@ def test_get_stats(client):
     assert response.status_code == 200
     assert response.json()["success"] is True
     assert "stats" in response.json()
+
+
+# === WebSocket ===
+
+def test_websocket_ping_pong_is_json_text(client):
+    chat_id = client.post("/api/chat/chats", json={"title": "WS"}).json()["chat_id"]
+    with client.websocket_connect(f"/api/chat/chats/{chat_id}/stream") as ws:
+        ws.send_text('{"type": "ping"}')
+        assert ws.receive_json() == {"type": "pong"}
+
+
+def test_websocket_streams_response_in_few_frames(client, monkeypatch):
+    from types import SimpleNamespace
+    from ai_engine.server.chat_module import router as router_module
+
+    content = "word " * 400
+    engine = SimpleNamespace(chat_completion=lambda **kwargs: SimpleNamespace(
+        success=True, content=content, provider_used="p", model_used="m"))
+    monkeypatch.setattr(router_module, "_global_engine", engine)
+
+    chat_id = client.post("/api/chat/chats", json={"title": "WS"}).json()["chat_id"]
+    with client.websocket_connect(f"/api/chat/chats/{chat_id}/stream") as ws:
+        ws.send_json({"type": "user_message", "content": "hello"})
+        frames = []
+        while not frames or frames[-1]["type"] != "ai_complete":
+            frames.append(ws.receive_json())
+
+    chunks = [f for f in frames if f["type"] == "ai_chunk"]
+    assert "".join(f["content"] for f in chunks) == content
+    assert chunks[-1]["is_final"] is True
+    assert len(chunks) <= 34
+
+    stored = client.get(f"/api/chat/chats/{chat_id}/messages").json()[-1]
+    assert stored["id"] == frames[-1]["message_id"]
+    assert stored["content"] == content
+
+
+def test_websocket_keepalives_and_timeout(client, monkeypatch):
+    import time
+    from types import SimpleNamespace
+    from ai_engine.server.chat_module import router as router_module
+
+    def slow_completion(**kwargs):
+        time.sleep(0.3)
+        return SimpleNamespace(success=True, content="late", provider_used="p", model_used="m")
+
+    monkeypatch.setattr(router_module, "_global_engine", SimpleNamespace(chat_completion=slow_completion))
+    monkeypatch.setattr(router_module, "_KEEPALIVE_INTERVAL", 0.02)
+    monkeypatch.setattr(router_module, "_AI_RESPONSE_TIMEOUT", 0.15)
+
+    chat_id = client.post("/api/chat/chats", json={"title": "WS"}).json()["chat_id"]
+    with client.websocket_connect(f"/api/chat/chats/{chat_id}/stream") as ws:
+        ws.send_json({"type": "user_message", "content": "hello"})
+        frames = []
+        while not frames or frames[-1]["type"] != "ai_error":
+            frames.append(ws.receive_json())
+
+    assert any(f["type"] == "ai_typing_keepalive" for f in frames)
+    assert "timed out" in frames[-1]["content"]
+
+
+def test_identical_concurrent_completions_share_one_call():
+    import asyncio
+    import time
+    from types import SimpleNamespace
+    from ai_engine.server.chat_module import router as router_module
+
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs["messages"][-1]["content"])
+        time.sleep(0.05)
+        return SimpleNamespace(success=True, content=kwargs["messages"][-1]["content"])
+
+    engine = SimpleNamespace(chat_completion=completion)
+    same = [{"role": "user", "content": "hi"}]
+    other = [{"role": "user", "content": "bye"}]
+
+    async def run():
+        return await asyncio.gather(
+            router_module._shared_chat_completion(engine, messages=same, model=None),
+            router_module._shared_chat_completion(engine, messages=list(same), model=None),
+            router_module._shared_chat_completion(engine, messages=other, model=None),
+        )
+
+    results = asyncio.run(run())
+    assert [r.content for r in results] == ["hi", "hi", "bye"]
+    assert sorted(calls) == ["bye", "hi"]
+    assert router_module._inflight_completions == {}
+
+
+def test_websocket_message_reads_chat_once(client, monkeypatch):
+    from types import SimpleNamespace
+    from ai_engine.server.chat_module import router as router_module
+
+    engine = SimpleNamespace(chat_completion=lambda **kwargs: SimpleNamespace(
+        success=True, content="ok", provider_used="p", model_used="m"))
+    monkeypatch.setattr(router_module, "_global_engine", engine)
+
+    chat_id = client.post("/api/chat/chats", json={"title": "WS"}).json()["chat_id"]
+    with client.websocket_connect(f"/api/chat/chats/{chat_id}/stream") as ws:
+        reads = []
+        get_chat = router_module.chat_db.get_chat
+        monkeypatch.setattr(router_module.chat_db, "get_chat", lambda cid: reads.append(cid) or get_chat(cid))
+        ws.send_json({"type": "user_message", "content": "hello"})
+        while ws.receive_json()["type"] != "ai_complete":
+            pass
+
+    assert reads == [chat_id]
+
+
+def test_fallback_engine_is_built_once(monkeypatch):
+    import sys
+    import core.ai_engine
+    from ai_engine.server.chat_module import router as router_module
+
+    built = []
+    monkeypatch.setattr(core.ai_engine, "AI_engine", lambda: built.append(object()) or built[-1])
+    monkeypatch.setattr(router_module, "_global_engine", None)
+    path_before = list(sys.path)
+
+    assert router_module.get_global_engine() is router_module.get_global_engine()
+    assert len(built) == 1
+    assert sys.path == path_before
+
+
+def test_stream_disconnect_mid_replay_keeps_only_the_reply(client, monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from ai_engine.server.chat_module import router as router_module
+
+    engine = SimpleNamespace(chat_completion=lambda **kwargs: SimpleNamespace(
+        success=True, content="the answer", provider_used="p", model_used="m"))
+    monkeypatch.setattr(router_module, "_global_engine", engine)
+
+    class GoneWebSocket:
+        async def send_text(self, frame):
+            if '"ai_chunk"' in frame:
+                raise RuntimeError("client gone")
+
+    chat_id = client.post("/api/chat/chats", json={"title": "WS"}).json()["chat_id"]
+    user_id = router_module.chat_db.add_message(chat_id, "user", "hello")
+    asyncio.run(router_module.process_ai_response_stream(GoneWebSocket(), chat_id, user_id))
+
+    messages = client.get(f"/api/chat/chats/{chat_id}/messages").json()
+    assert [(m["role"], m["content"]) for m in messages] == [("user", "hello"), ("assistant", "the answer")]
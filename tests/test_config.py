@@ -135,3 +135,28 @@ def test_test_harness_provider_exists():
     assert harness["api_keys"] == ["test-key-alpha", "test-key-beta", "test-key-gamma"]
     assert "127.0.0.1:18765" in harness["endpoint"]
     assert "127.0.0.1:18765" in harness["model_endpoint"]
+
+
+def test_freeze_provider_configs_is_read_only_snapshot():
+    import dataclasses
+    from core.config import freeze_provider_configs
+
+    frozen = freeze_provider_configs({"alpha": {"id": 1, "priority": 2, "endpoint": "http://x", "model": "m",
+                                                "api_keys": ["k1", None], "rpm_limit": 30, "unknown": 1}})
+    record = frozen["alpha"]
+    assert record.rpm_limit == 30
+    assert record.api_keys == ("k1", None)
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        record.priority = 5
+    with pytest.raises(TypeError):
+        frozen["beta"] = record
+    assert record.as_dict()["api_keys"] == ["k1", None]
+
+
+def test_freeze_engine_settings_round_trip():
+    from core.config import ENGINE_SETTINGS, freeze_engine_settings
+
+    snapshot = freeze_engine_settings()
+    assert snapshot.consecutive_failure_limit == ENGINE_SETTINGS["consecutive_failure_limit"]
+    assert snapshot.as_dict()["max_concurrency"] == ENGINE_SETTINGS["max_concurrency"]
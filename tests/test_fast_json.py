@@ -0,0 +1,33 @@
+"""Tests for the fast_json adapters."""
+import json
+
+import pytest
+
+from core import fast_json
+
+
+def test_round_trip_str_and_bytes():
+    payload = {"messages": [{"role": "user", "content": "héllo"}], "n": 1}
+    assert fast_json.loads(fast_json.dumps(payload)) == payload
+    assert fast_json.loads(fast_json.dumps_bytes(payload)) == payload
+    assert isinstance(fast_json.dumps(payload), str)
+    assert isinstance(fast_json.dumps_bytes(payload), bytes)
+
+
+def test_decode_error_is_stdlib_compatible():
+    with pytest.raises(json.JSONDecodeError):
+        fast_json.loads(b"{not json")
+
+
+def test_engine_accepts_json_codec_override():
+    from core.ai_engine import AI_engine
+
+    calls = []
+
+    def loads(data):
+        calls.append(data)
+        return json.loads(data)
+
+    engine = AI_engine(verbose=False, json_loads=loads)
+    assert engine._json_loads("[1]") == [1]
+    assert calls == ["[1]"]
@@ -252,3 +252,38 @@ def test_single_check_health(monitor):
     health = monitor.get_provider_health("provider1")
     assert health["total_checks"] == 1
     assert health["uptime_percent"] == 100.0
+
+
+# === Health Cache Tests ===
+
+def test_health_cache_serves_healthy_verdict_within_ttl(monitor):
+    from unittest.mock import patch
+    from core.health_monitor import HealthCache
+
+    cache = HealthCache(monitor, ttl=60)
+    monitor.record_check("provider1", success=True)
+    assert cache.is_healthy("provider1") is True
+
+    with patch.object(monitor, "is_provider_healthy") as probe:
+        assert cache.is_healthy("provider1") is True
+        probe.assert_not_called()
+
+
+def test_health_cache_invalidated_by_new_check(monitor):
+    from core.health_monitor import HealthCache
+
+    cache = HealthCache(monitor, ttl=60)
+    assert cache.is_healthy("provider1") is True
+    for _ in range(3):
+        monitor.record_check("provider1", success=False)
+    assert cache.get("provider1") is None
+    assert cache.is_healthy("provider1") is False
+
+
+def test_health_cache_expires_after_ttl(monitor):
+    from core.health_monitor import HealthCache
+
+    cache = HealthCache(monitor, ttl=0.01)
+    cache.is_healthy("provider1")
+    time.sleep(0.02)
+    assert cache.get("provider1") is None
@@ -1,6 +1,9 @@
 """Unit tests for key-rotation internals (_request_with_key_rotation, edge cases)."""
-from datetime import datetime, timedelta
-from unittest.mock import patch
+import logging
+import time
+from unittest.mock import ANY, patch
+
+import pytest
 
 from core.provider_requests import RequestResult
 
@@ -14,7 +17,7 @@ def test_rotate_api_key_defaults_enabled_when_setting_absent(engine):
     provider = _setup_rotation_provider(engine)
     engine.engine_settings.pop("key_rotation_enabled", None)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     rotated = engine._rotate_api_key(provider)
     assert rotated in ("key-beta", "key-gamma")
     assert engine.provider_key_rotation[provider] != 0
@@ -37,10 +40,10 @@ def test_rotate_api_key_returns_none_when_select_optimal_key_returns_none(engine
 
 def test_select_optimal_key_resets_expired_rate_limit_flag(engine):
     provider = _setup_rotation_provider(engine)
-    engine.key_usage_stats[provider]["key_0"]["rate_limited"] = True
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now() - timedelta(seconds=120)
+    engine.key_usage_stats[provider][0].rate_limited = True
+    engine.key_usage_stats[provider][0].last_used = time.monotonic() - 120
     selected = engine._select_optimal_key(provider)
-    assert engine.key_usage_stats[provider]["key_0"]["rate_limited"] is False
+    assert engine.key_usage_stats[provider][0].rate_limited is False
     assert selected == 0
 
 
@@ -75,7 +78,7 @@ def test_roll_api_key_disabled_when_rotate_returns_none(engine):
 def test_roll_api_key_handles_out_of_range_current_index(engine):
     provider = _setup_rotation_provider(engine, keys=["a", "b", "c"])
     engine.provider_key_rotation[provider] = 99
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     result = engine.roll_api_key(provider)
     assert "Rolled" in result or "rolled" in result.lower()
 
@@ -98,7 +101,7 @@ def test_handle_provider_failure_network_error_flags_provider(engine):
 def test_handle_provider_failure_uses_response_json_for_classification(engine):
     provider = _setup_rotation_provider(engine)
     engine.provider_key_rotation[provider] = 0
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = datetime.now()
+    engine.key_usage_stats[provider][0].last_used = time.monotonic()
     engine._handle_provider_failure(
         provider,
         "error",
@@ -257,13 +260,13 @@ def test_handle_provider_failure_marks_rate_limit_with_retry_after(engine):
 
 def test_select_optimal_key_returns_none_when_all_keys_in_cooldown(engine):
     provider = _setup_rotation_provider(engine)
-    now = datetime.now()
+    now = time.monotonic()
     for key_id in engine.key_usage_stats[provider]:
-        engine.key_usage_stats[provider][key_id]["rate_limited"] = True
-        engine.key_usage_stats[provider][key_id]["last_used"] = now
+        engine.key_usage_stats[provider][key_id].rate_limited = True
+        engine.key_usage_stats[provider][key_id].last_used = now
 
     assert engine._select_optimal_key(provider) is None
-    assert all(stats["rate_limited"] for stats in engine.key_usage_stats[provider].values())
+    assert all(stats.rate_limited for stats in engine.key_usage_stats[provider].values())
 
 
 def test_request_with_key_rotation_passes_model_and_records_success_stats(engine):
@@ -302,18 +305,15 @@ def test_handle_provider_failure_flags_service_errors_for_ten_minutes(engine):
     with patch.object(engine, "_flag_provider") as flag_provider:
         engine._handle_provider_failure(provider, "service unavailable", 503)
 
-    flag_provider.assert_called_once_with(provider, duration_minutes=10)
+    flag_provider.assert_called_once_with(provider, duration_minutes=10, now=ANY)
 
 
-def test_handle_provider_failure_verbose_logs_error_classification(engine_verbose):
+def test_handle_provider_failure_verbose_logs_error_classification(engine_verbose, caplog):
     provider = _setup_rotation_provider(engine_verbose)
-    with patch("core.ai_engine.verbose_print") as verbose_print_mock:
+    with caplog.at_level(logging.DEBUG, logger="AI_engine"):
         engine_verbose._handle_provider_failure(provider, "internal server error", 500)
 
-    assert any(
-        args[0] == f"🔍 {provider} error classified as: server_error" and args[1] is True
-        for args, _kwargs in verbose_print_mock.call_args_list
-    )
+    assert f"🔍 {provider} error classified as: server_error" in caplog.messages
 
 
 def test_rotate_api_key_single_valid_key_does_not_mark_rate_limited(engine):
@@ -380,7 +380,7 @@ def test_request_with_key_rotation_passes_failure_status_to_handler(engine):
         result = engine._request_with_key_rotation(provider, config, [{"role": "user", "content": "hi"}], max_attempts=1)
 
     assert result.success is False
-    handle_failure.assert_called_once_with(provider, "quota", 429)
+    handle_failure.assert_called_once_with(provider, "quota", 429, now=ANY)
 
 
 def test_request_with_key_rotation_retries_quota_exceeded(engine):
@@ -410,7 +410,7 @@ def test_handle_provider_failure_default_consecutive_failure_limit_is_five(engin
         engine._handle_provider_failure(provider, "internal server error", 500)
 
     assert engine.consecutive_failures[provider] == 5
-    flag_provider.assert_any_call(provider, duration_minutes=30)
+    flag_provider.assert_any_call(provider, duration_minutes=30, now=ANY)
 
 
 def test_roll_api_key_default_current_index_zero_in_message(engine):
@@ -453,7 +453,7 @@ def test_request_with_key_rotation_exception_updates_failure_stats_and_handler(e
     assert update_stats.call_args.args[0] == provider
     assert update_stats.call_args.args[1] is False
     assert 0 <= update_stats.call_args.args[2] < 5
-    handle_failure.assert_called_once_with(provider, "boom", 0, None)
+    handle_failure.assert_called_once_with(provider, "boom", 0, None, now=update_stats.call_args.kwargs["now"])
 
 
 def test_handle_provider_failure_defaults_rotation_enabled_for_rate_limits(engine):
@@ -468,7 +468,7 @@ def test_handle_provider_failure_defaults_rotation_enabled_for_rate_limits(engin
         engine._handle_provider_failure(provider, "rate limit", 429)
 
     rotate.assert_called_once_with(provider)
-    flag_key.assert_called_once_with(provider, "rate_limit")
+    flag_key.assert_called_once_with(provider, "rate_limit", now=ANY)
     flag_provider.assert_not_called()
 
 
@@ -485,21 +485,18 @@ def test_handle_provider_failure_disabled_rotation_flags_provider_for_fifteen_mi
 
     rotate.assert_not_called()
     flag_key.assert_not_called()
-    flag_provider.assert_called_once_with(provider, duration_minutes=15)
+    flag_provider.assert_called_once_with(provider, duration_minutes=15, now=ANY)
 
 
-def test_handle_provider_failure_verbose_logs_rotation_message(engine_verbose):
+def test_handle_provider_failure_verbose_logs_rotation_message(engine_verbose, caplog):
     provider = _setup_rotation_provider(engine_verbose)
     with (
         patch.object(engine_verbose, "_rotate_api_key", return_value="key-beta"),
-        patch("core.ai_engine.verbose_print") as verbose_print_mock,
+        caplog.at_level(logging.DEBUG, logger="AI_engine"),
     ):
         engine_verbose._handle_provider_failure(provider, "rate limit", 429)
 
-    assert any(
-        args[0] == f"🔑 Rotated {provider} API key due to rate_limit" and args[1] is True
-        for args, _kwargs in verbose_print_mock.call_args_list
-    )
+    assert f"🔑 Rotated {provider} API key due to rate_limit" in caplog.messages
 
 
 def test_rotate_api_key_two_valid_keys_rotates(engine):
@@ -529,39 +526,37 @@ def test_rotate_api_key_default_current_index_zero_when_missing(engine):
 
 def test_select_optimal_key_resets_key_at_exact_cooldown_boundary(engine):
     provider = _setup_rotation_provider(engine)
-    boundary = datetime.now() - timedelta(seconds=60)
-    engine.key_usage_stats[provider]["key_0"]["rate_limited"] = True
-    engine.key_usage_stats[provider]["key_0"]["last_used"] = boundary
-    engine.key_usage_stats[provider]["key_1"]["rate_limited"] = True
-    engine.key_usage_stats[provider]["key_1"]["last_used"] = datetime.now()
-    engine.key_usage_stats[provider]["key_2"]["rate_limited"] = True
-    engine.key_usage_stats[provider]["key_2"]["last_used"] = datetime.now()
+    boundary = time.monotonic() - 60
+    engine.key_usage_stats[provider][0].rate_limited = True
+    engine.key_usage_stats[provider][0].last_used = boundary
+    engine.key_usage_stats[provider][1].rate_limited = True
+    engine.key_usage_stats[provider][1].last_used = time.monotonic()
+    engine.key_usage_stats[provider][2].rate_limited = True
+    engine.key_usage_stats[provider][2].last_used = time.monotonic()
 
     assert engine._select_optimal_key(provider) == 0
-    assert engine.key_usage_stats[provider]["key_0"]["rate_limited"] is False
+    assert engine.key_usage_stats[provider][0].rate_limited is False
 
 
-def test_select_optimal_key_verbose_logs_selected_key(engine_verbose):
+def test_select_optimal_key_verbose_logs_selected_key(engine_verbose, caplog):
     provider = _setup_rotation_provider(engine_verbose)
 
-    with patch("core.ai_engine.verbose_print") as verbose_print_mock:
+    with caplog.at_level(logging.DEBUG, logger="AI_engine"):
         selected = engine_verbose._select_optimal_key(provider)
 
     assert selected == 0
-    verbose_print_mock.assert_called_once()
-    args, _kwargs = verbose_print_mock.call_args
-    assert args[0].startswith(f"🔑 Selected key #1 for {provider} (load score:")
-    assert args[1] is True
+    assert len(caplog.messages) == 1
+    assert caplog.messages[0].startswith(f"🔑 Selected key #1 for {provider} (load score:")
 
 
-def test_select_optimal_key_no_verbose_when_not_verbose(engine):
+def test_select_optimal_key_no_verbose_when_not_verbose(engine, caplog):
     provider = _setup_rotation_provider(engine)
 
-    with patch("core.ai_engine.verbose_print") as verbose_print_mock:
+    with caplog.at_level(logging.DEBUG, logger="AI_engine"):
         selected = engine._select_optimal_key(provider)
 
     assert selected == 0
-    verbose_print_mock.assert_not_called()
+    assert caplog.messages == []
 
 
 def test_request_with_key_rotation_zero_attempts_returns_structured_failure(engine):
@@ -597,21 +592,18 @@ def test_handle_provider_failure_uses_custom_consecutive_failure_limit(engine):
     with patch.object(engine, "_flag_provider") as flag_provider:
         engine._handle_provider_failure(provider, "bad request", 400)
 
-    flag_provider.assert_called_once_with(provider, duration_minutes=30)
+    flag_provider.assert_called_once_with(provider, duration_minutes=30, now=ANY)
 
 
-def test_handle_provider_failure_verbose_logs_consecutive_failure_flag(engine_verbose):
+def test_handle_provider_failure_verbose_logs_consecutive_failure_flag(engine_verbose, caplog):
     provider = _setup_rotation_provider(engine_verbose)
     engine_verbose.engine_settings["consecutive_failure_limit"] = 3
     engine_verbose.consecutive_failures[provider] = 2
 
-    with patch("core.ai_engine.verbose_print") as verbose_print_mock:
+    with caplog.at_level(logging.DEBUG, logger="AI_engine"):
         engine_verbose._handle_provider_failure(provider, "bad request", 400)
 
-    assert any(
-        args[0] == f"⚠️  {provider} flagged for 30min after 3 consecutive failures" and args[1] is True
-        for args, _kwargs in verbose_print_mock.call_args_list
-    )
+    assert f"⚠️  {provider} flagged for 30min after 3 consecutive failures" in caplog.messages
 
 
 def test_handle_provider_failure_unknown_errors_rotate_after_two_by_default(engine):
@@ -634,3 +626,60 @@ def test_handle_provider_failure_unknown_errors_respect_disabled_rotation(engine
         engine._handle_provider_failure(provider, "mystery failure", 418)
 
     rotate.assert_not_called()
+
+
+def test_request_with_key_rotation_fails_fast_when_provider_slots_exhausted(engine, monkeypatch):
+    provider = _setup_rotation_provider(engine)
+    engine.providers[provider]["max_concurrent"] = 1
+    monkeypatch.setitem(engine.engine_settings, "rate_limit_max_wait", 0.01)
+    slot = engine._provider_slot(provider, engine.providers[provider])
+    assert slot.acquire(timeout=0)
+    try:
+        with patch.object(engine, "_make_request") as make_request:
+            result = engine._request_with_key_rotation(provider, engine.providers[provider], [])
+        make_request.assert_not_called()
+        assert result.error_type == "rate_limit"
+    finally:
+        slot.release()
+
+
+def test_select_optimal_key_avoids_key_at_per_key_rpm_limit(engine):
+    provider = _setup_rotation_provider(engine)
+    engine.providers[provider]["key_rpm_limit"] = 2
+    now = time.monotonic()
+    engine.key_request_count[provider][0].extend([now, now])
+    engine.key_request_count[provider][1].extend([now, now, now])
+    assert engine._select_optimal_key(provider) == 2
+
+
+def test_select_key_vectorized_matches_scalar_scores(engine, monkeypatch):
+    pytest.importorskip("numpy")
+    keys = [f"key-{i}" for i in range(40)]
+    provider = _setup_rotation_provider(engine, name="many_keys", keys=keys)
+    engine.providers[provider]["key_rpm_limit"] = 3
+    now = time.monotonic()
+    for i in range(40):
+        stats = engine.key_usage_stats[provider][i]
+        stats.requests = i % 7
+        stats.successes = i % 5 if i % 7 else 0
+        stats.weight = 0.5 + (i % 4) * 0.4
+        stats.last_used = None if i % 6 == 0 else now - (i * 3)
+        stats.rate_limited = i % 9 == 0
+        engine.key_request_count[provider][i].extend([now] * (i % 4))
+    engine._now = lambda: now
+
+    best, score = engine._select_key_vectorized(provider, tuple(range(40)), now, key_rpm_limit=3)
+    monkeypatch.setattr("core.ai_engine.np", None)
+    assert engine._select_optimal_key(provider) == best
+    assert score == pytest.approx(engine._calculate_key_load_score(provider, best))
+
+
+def test_handle_provider_failure_threads_caller_timestamp_into_flags(engine):
+    provider = _setup_rotation_provider(engine)
+    now = time.monotonic() + 1000.0
+
+    error_type = engine._handle_provider_failure(provider, "service unavailable", 503, now=now)
+
+    assert error_type == "service_unavailable"
+    assert engine.flagged_keys[provider]["flagged_at"] == now
+    assert engine.flagged_keys[provider]["flag_until"] == now + 600
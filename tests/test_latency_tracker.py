@@ -99,3 +99,13 @@ def test_model_tracking():
     stats = tracker.get_stats("provider1")
     assert "gpt-4" in stats["models"]
     assert "claude-3" in stats["models"]
+
+
+def test_ewma_latency_tracks_recent_samples():
+    from core.latency_tracker import LatencyTracker
+
+    tracker = LatencyTracker(ewma_alpha=0.5)
+    assert tracker.get_ewma_latency("p") is None
+    tracker.record("p", 100, success=True)
+    tracker.record("p", 300, success=True)
+    assert tracker.get_ewma_latency("p") == 200
@@ -1,9 +1,11 @@
 """HTTP provider adapter tests (mocked requests)."""
 
+import json
 from unittest.mock import MagicMock, patch
 
 import pytest
 
+from core.provider_requests import _FORMAT_HANDLERS, RequestResult
 
 
 @pytest.fixture
@@ -21,12 +23,12 @@ def test_make_request_unknown_format_falls_back_to_openai(engine):
     }
     mock_resp = MagicMock()
     mock_resp.status_code = 200
-    mock_resp.json.return_value = {
+    mock_resp.content = json.dumps({
         "choices": [{"message": {"content": "hi"}}],
         "model": "m1",
-    }
+    }).encode()
     with patch.object(engine, "_get_current_api_key", return_value="k1"):
-        with patch("requests.post", return_value=mock_resp) as post:
+        with patch.object(engine._http_session, "post", return_value=mock_resp) as post:
             result = engine._make_request(
                 "test_harness",
                 config,
@@ -38,6 +40,15 @@ def test_make_request_unknown_format_falls_back_to_openai(engine):
     post.assert_called_once()
 
 
+@pytest.mark.parametrize("format_type", sorted(_FORMAT_HANDLERS))
+def test_make_request_dispatches_each_format(engine, format_type):
+    sentinel = RequestResult(success=True, content=format_type)
+    with patch.object(engine, _FORMAT_HANDLERS[format_type], return_value=sentinel) as handler:
+        result = engine._make_request("p", {"format": format_type}, [{"role": "user", "content": "x"}])
+    assert result is sentinel
+    handler.assert_called_once()
+
+
 def test_make_request_provider_exception_returns_typed_error(engine):
     config = {"format": "openai", "endpoint": "https://x", "api_keys": ["k"]}
     with patch.object(engine, "_make_openai_request", side_effect=RuntimeError("boom")):
@@ -57,6 +68,9 @@ def test_azure_openai_no_api_key(engine):
         )
     assert result.success is False
     assert result.error_type == "auth_error"
+    with patch.object(engine, "_get_current_api_key", return_value=None):
+        again = engine._make_vertex_ai_request("vertex", {}, [{"role": "user", "content": "x"}])
+    assert again is result  # shared frozen sentinel, no per-call allocation
 
 
 def test_bedrock_no_auth(engine):
@@ -69,6 +83,27 @@ def test_bedrock_no_auth(engine):
     assert result.error_type == "auth_error"
 
 
+class _StreamResponse:
+    """Minimal stand-in for a streamed requests.Response"""
+
+    def __init__(self, lines, status_code=200, content=b""):
+        self._lines = lines
+        self.status_code = status_code
+        self.content = content
+        self.encoding = None
+        self.closed = False
+
+    def iter_lines(self):
+        yield from self._lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+        return False
+
+
 def test_streaming_request_yields_content(engine):
     config = {
         "endpoint": "https://example.com/stream",
@@ -78,25 +113,17 @@ def test_streaming_request_yields_content(engine):
         "timeout": 5,
     }
 
-    class FakeIter:
-        def __init__(self, lines):
-            self._lines = lines
-
-        def iter_lines(self):
-            for line in self._lines:
-                yield line
-
-        status_code = 200
-        text = ""
-
-    fake = FakeIter(
+    fake = _StreamResponse(
         [
+            b": keep-alive",
+            b'data: {"choices":[{"delta":{"role":"assistant"}}]}',
             b'data: {"choices":[{"delta":{"content":"Hello"}}]}',
+            b"data: not-json",
             b"data: [DONE]",
         ]
     )
     with patch.object(engine, "_get_current_api_key", return_value="k"):
-        with patch("requests.post", return_value=fake):
+        with patch.object(engine._http_session, "post", return_value=fake) as post:
             chunks = list(
                 engine._make_streaming_request(
                     "p",
@@ -104,39 +131,57 @@ def test_streaming_request_yields_content(engine):
                     [{"role": "user", "content": "hi"}],
                 )
             )
-    assert any(c.get("content") == "Hello" for c in chunks)
-    assert chunks[-1].get("done") is True
+    assert chunks == [{"content": "Hello"}, {"done": True}]
+    assert fake.closed
+    assert post.call_count == 1
+    assert post.call_args.kwargs["stream"] is True
+    assert post.call_args.kwargs["headers"]["Accept"] == "text/event-stream"
+    assert post.call_args.kwargs["headers"]["Authorization"] == "Bearer k"
+    assert json.loads(post.call_args.kwargs["data"])["stream"] is True
+
+
+def test_streaming_request_non_200_yields_error_once(engine):
+    fake = _StreamResponse([], status_code=503, content=b"upstream down")
+    with patch.object(engine, "_get_current_api_key", return_value=None):
+        with patch.object(engine._http_session, "post", return_value=fake) as post:
+            chunks = list(engine._make_streaming_request("p", {"endpoint": "https://x"}, [{"role": "user", "content": "hi"}]))
+    assert chunks == [{"error": "HTTP 503: upstream down", "done": True}]
+    assert post.call_count == 1
 
 
 def _response(payload, status_code=200, text=""):
     response = MagicMock()
     response.status_code = status_code
     response.text = text
-    response.json.return_value = payload
+    response.encoding = None
+    response.content = text.encode() if text else json.dumps(payload).encode()
     return response
 
 
+def _sent_json(call):
+    return json.loads(call.kwargs["data"])
+
+
 def test_azure_openai_success_posts_compatible_payload(engine):
     response = _response({"choices": [{"message": {"content": "azure answer"}}], "model": "deployment"})
     config = {"endpoint": "https://azure.example/chat", "max_tokens": 100, "temperature": 0.2, "timeout": 9}
     with patch.object(engine, "_get_current_api_key", return_value="azure-key"):
-        with patch("requests.post", return_value=response) as post:
+        with patch.object(engine._http_session, "post", return_value=response) as post:
             result = engine._make_azure_openai_request(
                 "azure", config, [{"role": "user", "content": "hello"}], model="deployment"
             )
     assert result.success and result.content == "azure answer"
-    post.assert_called_once_with(
-        config["endpoint"],
-        json={
-            "messages": [{"role": "user", "content": "hello"}],
-            "max_tokens": 100,
-            "temperature": 0.2,
-            "stream": False,
-            "model": "deployment",
-        },
-        headers={"Content-Type": "application/json", "Authorization": "Bearer azure-key"},
-        timeout=9,
-    )
+    post.assert_called_once()
+    assert post.call_args.args == (config["endpoint"],)
+    assert _sent_json(post.call_args) == {
+        "messages": [{"role": "user", "content": "hello"}],
+        "max_tokens": 100,
+        "temperature": 0.2,
+        "stream": False,
+        "model": "deployment",
+    }
+    assert post.call_args.kwargs["headers"] == {"Content-Type": "application/json", "Authorization": "Bearer azure-key"}
+    assert post.call_args.kwargs["timeout"] == (5, 9)
 
 
 def test_anthropic_maps_system_message_and_content(engine):
@@ -147,11 +192,11 @@ def test_anthropic_maps_system_message_and_content(engine):
         {"role": "user", "content": "hello"},
     ]
     with patch.object(engine, "_get_current_api_key", return_value="anthropic-key"):
-        with patch("requests.post", return_value=response) as post:
+        with patch.object(engine._http_session, "post", return_value=response) as post:
             result = engine._make_anthropic_request("anthropic", config, messages, model="claude")
     assert result.success and result.content == "anthropic answer"
     assert post.call_args.kwargs["headers"]["x-api-key"] == "anthropic-key"
-    assert post.call_args.kwargs["json"] == {
+    assert _sent_json(post.call_args) == {
         "model": "claude",
         "max_tokens": 55,
         "messages": [{"role": "user", "content": "hello"}],
@@ -159,6 +204,21 @@ def test_anthropic_maps_system_message_and_content(engine):
     }
 
 
+def test_auth_headers_shared_per_key_and_kept_off_the_session(engine):
+    response = _response({"content": [{"text": "ok"}]})
+    keys = iter(["a1", "a1", "a2"])
+    with patch.object(engine, "_get_current_api_key", side_effect=lambda name: next(keys)):
+        with patch.object(engine._http_session, "post", return_value=response) as post:
+            for _ in range(3):
+                engine._make_anthropic_request("anthropic", {"endpoint": "https://x"}, [{"role": "user", "content": "q"}])
+
+    first, second, third = (call.kwargs["headers"] for call in post.call_args_list)
+    assert first is second
+    assert third["x-api-key"] == "a2" and first["x-api-key"] == "a1"
+    assert "x-api-key" not in engine._http_session.headers
+    assert "Authorization" not in engine._http_session.headers
+
+
 def test_gemini_maps_roles_and_query_key(engine):
     response = _response({"candidates": [{"content": {"parts": [{"text": "gemini answer"}]}}]})
     config = {"endpoint": "https://gemini.example/generate", "max_tokens": 80, "temperature": 0.4}
@@ -168,11 +228,11 @@ def test_gemini_maps_roles_and_query_key(engine):
         {"role": "assistant", "content": "Previous"},
     ]
     with patch.object(engine, "_get_current_api_key", return_value="gem-key"):
-        with patch("requests.post", return_value=response) as post:
+        with patch.object(engine._http_session, "post", return_value=response) as post:
             result = engine._make_gemini_request("gemini", config, messages, model="gem-model")
     assert result.success and result.content == "gemini answer"
     assert post.call_args.args[0].endswith("?key=gem-key")
-    assert post.call_args.kwargs["json"]["contents"] == [
+    assert _sent_json(post.call_args)["contents"] == [
         {"role": "user", "parts": [{"text": "Question"}]},
         {"role": "model", "parts": [{"text": "Previous"}]},
     ]
@@ -185,40 +245,79 @@ def test_cohere_maps_preamble_and_history(engine):
         {"role": "user", "content": "Question"},
     ]
     with patch.object(engine, "_get_current_api_key", return_value="cohere-key"):
-        with patch("requests.post", return_value=response) as post:
+        with patch.object(engine._http_session, "post", return_value=response) as post:
             result = engine._make_cohere_request("cohere", {"endpoint": "https://cohere.example"}, messages)
     assert result.success and result.content == "cohere answer"
     assert post.call_args.kwargs["headers"]["Authorization"] == "Bearer cohere-key"
-    assert post.call_args.kwargs["json"]["preamble"] == "Preamble"
-    assert post.call_args.kwargs["json"]["messages"] == [{"role": "user", "message": "Question"}]
+    assert _sent_json(post.call_args)["preamble"] == "Preamble"
+    assert _sent_json(post.call_args)["messages"] == [{"role": "user", "message": "Question"}]
 
 
 def test_a3z_uses_get_and_quotes_user_message(engine):
     response = _response({}, text="a3z answer")
-    with patch("requests.get", return_value=response) as get:
+    with patch.object(engine._http_session, "get", return_value=response) as get:
         result = engine._make_a3z_request(
             "a3z", {"endpoint": "https://a3z.example/chat", "timeout": 4},
             [{"role": "user", "content": "hello world"}], model="a3z-model"
         )
     assert result.success and result.content == "a3z answer"
     assert get.call_args.args[0] == "https://a3z.example/chat?message=hello%20world"
-    assert get.call_args.kwargs["timeout"] == 4
+    assert get.call_args.kwargs["timeout"] == (4, 4)
+
+
+def test_http_timeout_splits_connect_from_read(engine):
+    assert engine._http_timeout({}) == (5, 60)
+    assert engine._http_timeout({"timeout": 30}, 120) == (5, 30)
+    assert engine._http_timeout({"timeout": 30, "read_timeout": 90, "connect_timeout": 2}) == (2, 90)
+    assert engine._http_timeout({"timeout": 3}) == (3, 3)
 
 
 def test_cloudflare_unwraps_result_response(engine):
     response = _response({"result": {"response": "cloudflare answer"}})
     config = {"endpoint": "https://cloudflare.example/run", "timeout": 8}
     with patch.object(engine, "_get_current_api_key", return_value="cf-key"):
-        with patch("requests.post", return_value=response) as post:
+        with patch.object(engine._http_session, "post", return_value=response) as post:
             result = engine._make_cloudflare_request(
                 "cloudflare", config, [{"role": "user", "content": "hello"}], model="cf-model"
             )
     assert result.success and result.content == "cloudflare answer"
-    assert post.call_args.kwargs["json"] == {
+    assert _sent_json(post.call_args) == {
         "messages": [{"role": "user", "content": "hello"}], "stream": False
     }
 
 
+def test_openai_request_template_reused_until_key_rotates(engine):
+    response = _response({"choices": [{"message": {"content": "ok"}}], "model": "m"})
+    config = {"endpoint": "https://example.com/v1/chat", "auth_type": "bearer", "max_tokens": 10}
+    keys = iter(["k1", "k1", "k2"])
+    with patch.object(engine, "_get_current_api_key", side_effect=lambda name: next(keys)):
+        with patch.object(engine._http_session, "post", return_value=response) as post:
+            for content in ("a", "b", "c"):
+                engine._make_openai_request("tmpl", config, [{"role": "user", "content": content}], model="m")
+
+    first, second, third = post.call_args_list
+    assert first.kwargs["headers"] is second.kwargs["headers"]
+    assert third.kwargs["headers"]["Authorization"] == "Bearer k2"
+    assert [_sent_json(c)["messages"][0]["content"] for c in (first, second, third)] == ["a", "b", "c"]
+    assert _sent_json(first) == {
+        "messages": [{"role": "user", "content": "a"}],
+        "model": "m", "max_tokens": 10, "temperature": 0.7, "stream": False,
+    }
+
+
+def test_openai_prepend_system_message_flag(engine):
+    response = _response({"choices": [{"message": {"content": "ok"}}]})
+    config = {"endpoint": "https://example.com", "prepend_system_message": True}
+    with patch.object(engine, "_get_current_api_key", return_value=None):
+        with patch.object(engine._http_session, "post", return_value=response) as post:
+            engine._make_openai_request("quirky", config, [{"role": "user", "content": "x"}])
+            engine._make_openai_request("plain", {"endpoint": "https://example.com"}, [{"role": "user", "content": "x"}])
+
+    flagged, plain = (_sent_json(call)["messages"] for call in post.call_args_list)
+    assert [m["role"] for m in flagged] == ["system", "user"]
+    assert [m["role"] for m in plain] == ["user"]
+
+
 @pytest.mark.parametrize(
     "method, config",
     [
@@ -232,29 +331,81 @@ def test_cloudflare_unwraps_result_response(engine):
 def test_provider_non_200_returns_typed_provider_error(engine, method, config):
     response = _response({}, status_code=429, text="rate limited")
     with patch.object(engine, "_get_current_api_key", return_value="key"):
-        with patch("requests.post", return_value=response):
+        with patch.object(engine._http_session, "post", return_value=response):
             result = getattr(engine, method)("provider", config, [{"role": "user", "content": "x"}])
     assert result.success is False
     assert result.error_type == "provider_error"
     assert result.status_code == 429
+    assert result.error_message.endswith(": rate limited")
 
 
-def test_ollama_streaming_parses_ndjson(engine):
-    class FakeOllama:
-        status_code = 200
-        text = ""
+@pytest.mark.parametrize(
+    "method, sent_temperature",
+    [
+        ("_make_openai_request", lambda body: body["temperature"]),
+        ("_make_azure_openai_request", lambda body: body["temperature"]),
+        ("_make_anthropic_request", lambda body: body["temperature"]),
+        ("_make_bedrock_request", lambda body: body["inferenceConfig"]["temperature"]),
+        ("_make_vertex_ai_request", lambda body: body["generationConfig"]["temperature"]),
+        ("_make_gemini_request", lambda body: body["generationConfig"]["temperature"]),
+        ("_make_cohere_request", lambda body: body["temperature"]),
+        ("_make_cloudflare_request", lambda body: body["temperature"]),
+    ],
+)
+def test_caller_temperature_reaches_the_request_body(engine, method, sent_temperature):
+    config = {"endpoint": "https://example.com", "temperature": 0.9}
+    with patch.object(engine, "_get_current_api_key", return_value="access:secret"):
+        with patch.object(engine._http_session, "post", return_value=_response({})) as post:
+            getattr(engine, method)("provider", config, [{"role": "user", "content": "x"}], temperature=0)
+    assert sent_temperature(_sent_json(post.call_args)) == 0
 
-        @staticmethod
-        def iter_lines():
-            yield b'{"response":"one","done":false}'
-            yield b'{"response":"two","done":false}'
-            yield b'{"done":true}'
 
-    with patch("requests.post", return_value=FakeOllama()) as post:
+def test_ollama_streaming_parses_ndjson(engine):
+    fake = _StreamResponse([
+        b'{"response":"one","done":false}',
+        b'{"response":"two","done":false}',
+        b'{"done":true}',
+    ])
+    with patch.object(engine._http_session, "post", return_value=fake) as post:
         chunks = list(engine._make_ollama_streaming_request(
             "ollama", {"endpoint": "http://localhost:11434/api/generate", "timeout": 12},
             [{"role": "user", "content": "hello"}], model="llama"
         ))
     assert [chunk["content"] for chunk in chunks if "content" in chunk] == ["one", "two"]
     assert chunks[-1] == {"done": True}
-    assert post.call_args.kwargs["json"] == {"model": "llama", "prompt": "hello", "stream": True}
+    assert _sent_json(post.call_args) == {"model": "llama", "prompt": "hello", "stream": True}
+
+
+def test_serialize_body_uses_engine_codec(engine):
+    body = engine._serialize_body({"messages": [{"role": "user", "content": "h\u00e9llo \"quoted\""}]})
+    assert isinstance(body, bytes)
+    assert json.loads(body) == {"messages": [{"role": "user", "content": "h\u00e9llo \"quoted\""}]}
+
+
+def test_error_snippet_decodes_only_a_bounded_prefix():
+    from core.provider_requests import _error_snippet
+
+    response = _response({}, text="<html>" + "x" * 100_000 + "</html>")
+    assert _error_snippet(response) == ("<html>" + "x" * 194)
+    response.encoding = "not-a-codec"
+    assert len(_error_snippet(response, limit=10)) == 10
+    response.content = b""
+    assert _error_snippet(response) == ""
+
+
+@pytest.mark.parametrize(
+    "method, body",
+    [
+        ("_make_openai_request", {"choices": []}),
+        ("_make_anthropic_request", {"content": None}),
+        ("_make_gemini_request", {"candidates": [{"content": {}}]}),
+        ("_make_cohere_request", {"message": {"content": []}}),
+    ],
+)
+def test_malformed_success_body_yields_empty_content(engine, method, body):
+    with patch.object(engine, "_get_current_api_key", return_value="key"):
+        with patch.object(engine._http_session, "post", return_value=_response(body)):
+            result = getattr(engine, method)("provider", {"endpoint": "https://example.com"},
+                                             [{"role": "user", "content": "x"}])
+    assert result.success is True
+    assert result.content == ""
@@ -83,3 +83,40 @@ def test_rate_limit_window_reset():
 
     provider.reset_window()
     assert provider.requests_made == 0
+
+
+# === Token Bucket Tests ===
+
+def test_token_bucket_allows_burst_then_times_out():
+    from core.rate_limit_manager import TokenBucket
+
+    bucket = TokenBucket(rate_per_sec=1, burst=2)
+    assert bucket.acquire(timeout=0) is True
+    assert bucket.acquire(timeout=0) is True
+    assert bucket.acquire(timeout=0.01) is False
+
+
+def test_token_bucket_waits_for_refill():
+    import time
+    from core.rate_limit_manager import TokenBucket
+
+    bucket = TokenBucket(rate_per_sec=50, burst=1)
+    assert bucket.acquire() is True
+    start = time.monotonic()
+    assert bucket.acquire(timeout=1) is True
+    assert time.monotonic() - start >= 0.01
+
+
+def test_manager_acquire_without_rpm_limit_never_throttles():
+    from core.rate_limit_manager import RateLimitManager
+
+    manager = RateLimitManager()
+    assert all(manager.acquire("free", None, timeout=0) for _ in range(100))
+    assert "free" not in manager.buckets
+
+
+def test_manager_shares_bucket_per_provider():
+    from core.rate_limit_manager import RateLimitManager
+
+    manager = RateLimitManager()
+    assert manager.get_bucket("groq", 30) is manager.get_bucket("groq", 30)
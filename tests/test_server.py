@@ -182,6 +182,21 @@ def test_sla_status_endpoint(server_client):
     assert response.status_code == 200
 
 
+def test_status_reports_flag_times_as_datetimes(server_client):
+    from datetime import datetime
+    from tests.conftest import server_app_module
+
+    engine = server_app_module().engine
+    engine._flag_provider("status_probe", duration_minutes=30)
+    try:
+        response = server_client.get("/api/status")
+    finally:
+        engine.flagged_keys.pop("status_probe", None)
+    assert response.status_code == 200
+    detail = next(d for d in response.json()["flagged_details"] if d["provider"] == "status_probe")
+    assert datetime.fromisoformat(detail["reason"]["flagged_at"]).year == datetime.now().year
+
+
 def test_errors_endpoint(server_client):
     response = server_client.get("/api/errors")
     assert response.status_code == 200
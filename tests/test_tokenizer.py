@@ -0,0 +1,22 @@
+"""Tests for cached token counting."""
+from unittest.mock import patch
+
+from core import tokenizer
+
+
+def test_count_tokens_empty():
+    assert tokenizer.count_tokens("") == 0
+
+
+def test_fallback_estimate_without_tiktoken():
+    tokenizer.get_encoder.cache_clear()
+    try:
+        with patch.object(tokenizer, "tiktoken", None):
+            assert tokenizer.get_encoder("gpt-4") is tokenizer.estimate_tokens
+            assert tokenizer.count_tokens("abcdefgh", "gpt-4") == 2
+    finally:
+        tokenizer.get_encoder.cache_clear()
+
+
+def test_encoder_is_cached_per_model():
+    assert tokenizer.get_encoder("some-model") is tokenizer.get_encoder("some-model")